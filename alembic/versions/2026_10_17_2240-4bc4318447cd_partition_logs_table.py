@@ -0,0 +1,115 @@
+"""partition logs table by day
+
+Revision ID: 4bc4318447cd
+Revises: affa7bf0fdad
+Create Date: 2026-10-17 22:40:12.311604
+
+"""
+
+from datetime import date, datetime, timedelta, timezone
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = "4bc4318447cd"
+down_revision = "affa7bf0fdad"
+branch_labels = None
+depends_on = None
+
+# the maintenance task creates the following ones, see LogPartitionsRepository
+PREMAKE_DAYS = 7
+
+
+def upgrade() -> None:
+    drop_logs_indexes()
+    op.rename_table("logs", "logs_unpartitioned")
+    op.execute(
+        "alter table logs_unpartitioned rename constraint logs_pkey to logs_unpartitioned_pkey"
+    )
+    create_logs_table(partitioned=True)
+
+    oldest_log = op.get_bind().scalar(
+        sa.text(
+            "select (min(created_at) at time zone 'UTC')::date from logs_unpartitioned"
+        )
+    )
+    today = datetime.now(tz=timezone.utc).date()
+    day = min(oldest_log or today, today)
+    while day <= today + timedelta(days=PREMAKE_DAYS):
+        create_partition(day)
+        day += timedelta(days=1)
+
+    op.execute(
+        "insert into logs (id, tag, level, message, extra, created_at, updated_at)"
+        " select id, tag, level, message, extra, created_at, updated_at from logs_unpartitioned"
+    )
+    op.drop_table("logs_unpartitioned")
+
+
+def downgrade() -> None:
+    drop_logs_indexes()
+    op.rename_table("logs", "logs_partitioned")
+    op.execute(
+        "alter table logs_partitioned rename constraint logs_pkey to logs_partitioned_pkey"
+    )
+    create_logs_table(partitioned=False)
+    op.execute(
+        "insert into logs (id, tag, level, message, extra, created_at, updated_at)"
+        " select id, tag, level, message, extra, created_at, updated_at from logs_partitioned"
+    )
+    # dropping the partitioned table drops its partitions
+    op.drop_table("logs_partitioned")
+
+
+def create_logs_table(partitioned: bool) -> None:
+    # postgres requires the partition key to be part of the primary key
+    primary_key = ["id", "created_at"] if partitioned else ["id"]
+    partition_by = {"postgresql_partition_by": "RANGE (created_at)"}
+    op.create_table(
+        "logs",
+        sa.Column("id", sa.UUID(), nullable=False),
+        sa.Column("tag", sa.String(), nullable=False),
+        sa.Column(
+            "level",
+            postgresql.ENUM(
+                "ERROR", "WARNING", "INFO", "DEBUG", name="loglevel", create_type=False
+            ),
+            nullable=False,
+        ),
+        sa.Column("message", sa.String(), nullable=True),
+        sa.Column("extra", sa.JSON(), nullable=True),
+        sa.Column(
+            "created_at",
+            sa.TIMESTAMP(timezone=True),
+            server_default=sa.text("now()"),
+            nullable=False,
+        ),
+        sa.Column(
+            "updated_at",
+            sa.TIMESTAMP(timezone=True),
+            server_default=sa.text("now()"),
+            nullable=False,
+        ),
+        sa.PrimaryKeyConstraint(*primary_key, name="logs_pkey"),
+        **(partition_by if partitioned else {}),
+    )
+    op.create_index(op.f("ix_logs_created_at"), "logs", ["created_at"], unique=False)
+    op.create_index(op.f("ix_logs_id"), "logs", ["id"], unique=False)
+    op.create_index(op.f("ix_logs_tag"), "logs", ["tag"], unique=False)
+
+
+def drop_logs_indexes() -> None:
+    op.drop_index(op.f("ix_logs_tag"), table_name="logs")
+    op.drop_index(op.f("ix_logs_id"), table_name="logs")
+    op.drop_index(op.f("ix_logs_created_at"), table_name="logs")
+
+
+def create_partition(day: date) -> None:
+    op.execute(
+        f"create table logs_p{day:%Y%m%d} partition of logs"
+        f" for values from ('{day.isoformat()} 00:00:00+00')"
+        f" to ('{(day + timedelta(days=1)).isoformat()} 00:00:00+00')"
+    )
@@ -0,0 +1,54 @@
+"""store logs extra as jsonb and index its triage keys
+
+Revision ID: bfd0db741fe2
+Revises: 4bc4318447cd
+Create Date: 2026-10-17 22:50:41.204917
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = "bfd0db741fe2"
+down_revision = "4bc4318447cd"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.alter_column(
+        "logs",
+        "extra",
+        existing_type=sa.JSON(),
+        type_=postgresql.JSONB(astext_type=sa.Text()),
+        existing_nullable=True,
+        postgresql_using="extra::jsonb",
+    )
+    op.create_index(
+        "ix_logs_extra_media_id",
+        "logs",
+        [sa.text("(extra ->> 'media_id')"), "created_at"],
+        unique=False,
+    )
+    op.create_index(
+        "ix_logs_extra_exception_type",
+        "logs",
+        [sa.text("(extra ->> 'exception_type')"), "created_at"],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_logs_extra_exception_type", table_name="logs")
+    op.drop_index("ix_logs_extra_media_id", table_name="logs")
+    op.alter_column(
+        "logs",
+        "extra",
+        existing_type=postgresql.JSONB(astext_type=sa.Text()),
+        type_=sa.JSON(),
+        existing_nullable=True,
+        postgresql_using="extra::json",
+    )
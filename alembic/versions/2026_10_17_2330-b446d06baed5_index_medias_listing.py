@@ -0,0 +1,68 @@
+"""index the medias listing
+
+Revision ID: b446d06baed5
+Revises: 49c6256f4679
+Create Date: 2026-10-17 23:30:26.947087
+
+"""
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = "b446d06baed5"
+down_revision = "49c6256f4679"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # built concurrently, so the medias writes aren't blocked while they build
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_medias_created_at_id",
+            "medias",
+            ["created_at", "id"],
+            unique=False,
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        op.create_index(
+            "ix_medias_status_created_at_id",
+            "medias",
+            ["status", "created_at", "id"],
+            unique=False,
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        op.create_index(
+            "ix_medias_prompt_pattern",
+            "medias",
+            ["prompt"],
+            unique=False,
+            postgresql_ops={"prompt": "text_pattern_ops"},
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            "ix_medias_prompt_pattern",
+            table_name="medias",
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
+        op.drop_index(
+            "ix_medias_status_created_at_id",
+            table_name="medias",
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
+        op.drop_index(
+            "ix_medias_created_at_id",
+            table_name="medias",
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
@@ -0,0 +1,88 @@
+"""audit medias indexes
+
+Revision ID: d10ab0ea8509
+Revises: b446d06baed5
+Create Date: 2026-10-17 23:40:55.854509
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "d10ab0ea8509"
+down_revision = "b446d06baed5"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # built and dropped concurrently, so the medias writes aren't blocked meanwhile
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_medias_active_status_next_run",
+            "medias",
+            ["status", "next_run"],
+            unique=False,
+            postgresql_where=sa.text("status IN ('IN_QUEUE', 'PROCESSING')"),
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        op.create_index(
+            "ix_medias_processing_updated_at",
+            "medias",
+            ["updated_at"],
+            unique=False,
+            postgresql_where=sa.text("status = 'PROCESSING'"),
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        # duplicates of medias_pkey, job_id_unique and ix_medias_created_at_id
+        for index_name in ("ix_medias_id", "ix_medias_job_id", "ix_medias_created_at"):
+            op.drop_index(
+                index_name,
+                table_name="medias",
+                postgresql_concurrently=True,
+                if_exists=True,
+            )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_medias_created_at",
+            "medias",
+            ["created_at"],
+            unique=False,
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        op.create_index(
+            "ix_medias_job_id",
+            "medias",
+            ["job_id"],
+            unique=False,
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        op.create_index(
+            "ix_medias_id",
+            "medias",
+            ["id"],
+            unique=False,
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        op.drop_index(
+            "ix_medias_processing_updated_at",
+            table_name="medias",
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
+        op.drop_index(
+            "ix_medias_active_status_next_run",
+            table_name="medias",
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
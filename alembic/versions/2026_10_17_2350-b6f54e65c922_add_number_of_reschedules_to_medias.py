@@ -0,0 +1,31 @@
+"""add number_of_reschedules to medias
+
+Revision ID: b6f54e65c922
+Revises: d10ab0ea8509
+Create Date: 2026-10-17 23:50:56.308365
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "b6f54e65c922"
+down_revision = "d10ab0ea8509"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # a constant default, the existing rows aren't rewritten
+    op.add_column(
+        "medias",
+        sa.Column(
+            "number_of_reschedules", sa.Integer(), server_default="0", nullable=False
+        ),
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("medias", "number_of_reschedules")
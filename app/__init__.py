@@ -1,5 +1,6 @@
 from fastapi import APIRouter
 
+from app.logs.api.logs_router import logs_router
 from app.media.api.media_router import media_router
 from app.tools.tools_router import tools_router
 
@@ -7,4 +8,5 @@ from app.tools.tools_router import tools_router
 
 api_router = APIRouter()
 api_router.include_router(media_router, prefix="/media", tags=["media"])
+api_router.include_router(logs_router, prefix="/logs", tags=["logs"])
 api_router.include_router(tools_router, prefix="/tools", tags=["tools"])
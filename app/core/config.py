@@ -1,9 +1,11 @@
 import os
+import tempfile
 from pathlib import Path
 from typing import Annotated, Any, Literal
 
 from pydantic import (
     AnyUrl,
+    BaseModel,
     BeforeValidator,
     HttpUrl,
     PostgresDsn,
@@ -25,6 +27,11 @@ def parse_cors(v: Any) -> list[str] | str:
     raise ValueError(v)
 
 
+class ModelRateLimit(BaseModel):
+    rate_per_second: float
+    burst: int = 1
+
+
 class Settings(BaseSettings):
     ENVIRONMENT: Literal["local", "staging", "production"] = "local"
     PROJECT_ROOT_DIR: Path = Path(
@@ -36,9 +43,9 @@ class Settings(BaseSettings):
         extra="ignore",
     )
 
-    BACKEND_CORS_ORIGINS: Annotated[
-        list[AnyUrl] | str, BeforeValidator(parse_cors)
-    ] = Field(default_factory=list)
+    BACKEND_CORS_ORIGINS: Annotated[list[AnyUrl] | str, BeforeValidator(parse_cors)] = (
+        Field(default_factory=list)
+    )
 
     PROJECT_NAME: str = "Media Processing API"
     SENTRY_DSN: HttpUrl | None = None
@@ -47,6 +54,27 @@ class Settings(BaseSettings):
     POSTGRES_USER: str
     POSTGRES_PASSWORD: str
     POSTGRES_DB: str = ""
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: int = 30
+    DB_POOL_RECYCLE: int = 1800
+    # each celery worker process owns its own pool, so keep it small:
+    # total connections = worker processes * (pool size + max overflow).
+    # in asyncio execution mode, the in-flight generations of a process share it
+    WORKER_DB_POOL_SIZE: int = 2
+    WORKER_DB_MAX_OVERFLOW: int = 2
+    # blocking: each task waits for its generation, one generation per celery process
+    # asyncio: tasks hand the generation to the process event loop and return, up to WORKER_MAX_IN_FLIGHT at once
+    WORKER_EXECUTION_MODE: Literal["blocking", "asyncio"] = "blocking"
+    WORKER_MAX_IN_FLIGHT: int = 20
+    WORKER_SHUTDOWN_TIMEOUT_SECONDS: int = 60
+    # the stage durations of the generations are added to the hourly histograms of postgres at this interval
+    STAGE_DURATIONS_FLUSH_INTERVAL_SECONDS: int = 60
+    # prometheus exporter of the worker main process, None to disable
+    WORKER_METRICS_PORT: int | None = 9540
+    # the dummy model run by the workers, a fifth of its errors are GenerateMediaServiceError
+    DUMMY_MODEL_DELAY_SECONDS: float = 5
+    DUMMY_MODEL_ERROR_RATE: float = 0.3
 
     @computed_field  # type: ignore[misc]
     @property
@@ -72,13 +100,68 @@ class Settings(BaseSettings):
             path=self.POSTGRES_DB,
         )
 
+    LOG_SINK_ENABLED: bool = True
+    LOG_SINK_BATCH_SIZE: int = 100
+    LOG_SINK_FLUSH_INTERVAL_SECONDS: float = 1
+    LOG_SINK_MAX_QUEUE_SIZE: int = 10_000
+    LOG_SINK_OVERFLOW_POLICY: Literal["drop", "block", "spill"] = "drop"
+    LOG_SINK_SPILL_DIR: Path = Path(tempfile.gettempdir()) / "media_logs_spill"
+    # logs are stored in daily partitions: partitions are created LOG_PARTITIONS_PREMAKE_DAYS ahead and dropped once
+    # they are older than LOG_RETENTION_DAYS
+    LOG_RETENTION_DAYS: int = 30
+    LOG_PARTITIONS_PREMAKE_DAYS: int = 7
+    LOG_PARTITIONS_MAINTENANCE_INTERVAL_SECONDS: int = 3600
+    LOGS_SEARCH_MAX_LIMIT: int = 500
+
     REDIS_URL: RedisDsn
+    MEDIA_BATCH_MAX_SIZE: int = 500
+    MEDIA_STATUS_CACHE_TTL_SECONDS: int = 10
+    MEDIA_STATUS_CACHE_TERMINAL_TTL_SECONDS: int = 3600
+    MEDIA_STATUS_CHANNEL: str = "media_status"
+    MEDIA_STATUS_STREAM_HEARTBEAT_SECONDS: int = 15
+    MEDIA_STATUS_STREAM_MAX_JOBS: int = 100
+    MEDIA_STATUS_BULK_MAX_IDS: int = 500
+    MEDIA_SEARCH_MAX_LIMIT: int = 500
+    # reuses the media of a previous generation of the same prompt instead of running the model again
+    PROMPT_RESULT_CACHE_ENABLED: bool = False
+    PROMPT_RESULT_CACHE_TTL_SECONDS: int = 24 * 3600
+    # concurrent generations of the same prompt run the model once, the leader shares its media with the followers
+    SINGLE_FLIGHT_ENABLED: bool = False
+    SINGLE_FLIGHT_LEASE_SECONDS: int = 30
+    SINGLE_FLIGHT_WAIT_TIMEOUT_SECONDS: int = 300
+    SINGLE_FLIGHT_RESULT_TTL_SECONDS: int = 60
+    # calls to a model provider, by MediaGeneratorModel class name, shared by every worker. ex:
+    # MODEL_RATE_LIMITS='{"ReplicateMediaGeneratorModel": {"rate_per_second": 2, "burst": 5}}'
+    MODEL_RATE_LIMITS: dict[str, ModelRateLimit] = Field(default_factory=dict)
+    # how long a generation waits for a call token before being rescheduled
+    MODEL_RATE_LIMIT_WAIT_SECONDS: float = 5
+    MODEL_RATE_LIMIT_RESCHEDULE_SECONDS: int = 10
+    # generations deferred by the rate limits or the circuit breaker don't count a try, up to this many times
+    MEDIA_MAX_RESCHEDULES: int = 20
+    # consecutive provider errors, across every worker, after which generations are deferred for
+    # CIRCUIT_BREAKER_OPEN_SECONDS instead of calling the provider
+    CIRCUIT_BREAKER_ENABLED: bool = True
+    CIRCUIT_BREAKER_FAILURE_THRESHOLD: int = 5
+    CIRCUIT_BREAKER_OPEN_SECONDS: int = 30
     BUCKET_NAME: str = "media-processing"
     AWS_ACCESS_KEY_ID: str
     AWS_SECRET_ACCESS_KEY: str
     AWS_DEFAULT_REGION: str
     AWS_ENDPOINT_URL: str
     S3_ENDPOINT_URL: str
+    S3_MULTIPART_PART_SIZE: int = 8 * 1024 * 1024
+    # keys new objects by the sha256 of their bytes, so identical medias are stored once
+    S3_CONTENT_ADDRESSED: bool = False
+    S3_MAX_POOL_CONNECTIONS: int = 50
+    S3_CONNECT_TIMEOUT_SECONDS: int = 5
+    S3_READ_TIMEOUT_SECONDS: int = 60
+    MEDIA_URL_EXPIRATION_SECONDS: int = 3600
+    # buffer size of the media content streamed through the api
+    MEDIA_CONTENT_CHUNK_SIZE: int = 64 * 1024
+    MEDIA_URL_CACHE_MAX_SIZE: int = 10_000
+    # cached urls are only served while they are valid for at least this long
+    MEDIA_URL_CACHE_SAFETY_MARGIN_SECONDS: int = 300
+    MEDIA_URL_CACHE_REDIS_ENABLED: bool = True
 
 
 settings = Settings()  # type: ignore
@@ -16,6 +16,7 @@ from sqlalchemy.ext.asyncio import (
 from sqlalchemy.orm import as_declarative
 
 from app.core.config import settings
+from app.core.metrics import instrument_pool
 
 
 @as_declarative()
@@ -54,9 +55,20 @@ async_engine = None
 AsyncSessionLocal = None
 
 
-def setup_database():
+def setup_database(
+    pool_size: int = settings.DB_POOL_SIZE,
+    max_overflow: int = settings.DB_MAX_OVERFLOW,
+):
     global async_engine, AsyncSessionLocal
-    async_engine = create_async_engine(f"{settings.ASYNC_SQLALCHEMY_DATABASE_URI}")
+    async_engine = create_async_engine(
+        f"{settings.ASYNC_SQLALCHEMY_DATABASE_URI}",
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+        pool_recycle=settings.DB_POOL_RECYCLE,
+        pool_pre_ping=True,
+    )
+    instrument_pool(async_engine.sync_engine.pool, pool_size + max_overflow)
     AsyncSessionLocal = async_sessionmaker(
         async_engine,
         expire_on_commit=False,
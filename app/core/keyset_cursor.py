@@ -0,0 +1,28 @@
+import base64
+import binascii
+from datetime import datetime
+from uuid import UUID
+
+from pydantic import ValidationError
+
+from app.core.model import BasicModel
+
+
+class KeysetCursor(BasicModel):
+    """
+    position of the last row of a page ordered by (created_at, id). the next page starts right after it, so paging
+    costs an index seek whatever the depth, unlike offset pagination.
+    """
+
+    created_at: datetime
+    id: UUID
+
+    def encode(self) -> str:
+        return base64.urlsafe_b64encode(self.model_dump_json().encode()).decode()
+
+    @classmethod
+    def decode(cls, cursor: str) -> "KeysetCursor":
+        try:
+            return cls.model_validate_json(base64.urlsafe_b64decode(cursor))
+        except (binascii.Error, ValueError, ValidationError) as error:
+            raise ValueError("invalid cursor") from error
@@ -0,0 +1,152 @@
+"""
+Prometheus metrics of the api and the workers.
+
+Processes share their metrics through the directory of the PROMETHEUS_MULTIPROC_DIR env var, which must be set before
+they start: the api workers of uvicorn, and the celery processes forked by the worker main process that exports them.
+Without it, every process only exports its own metrics.
+"""
+
+import logging
+import os
+
+from prometheus_client import (
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+    start_http_server,
+)
+from prometheus_client.core import GaugeMetricFamily
+from prometheus_client.registry import Collector
+from sqlalchemy import event
+from sqlalchemy.pool import Pool
+
+logger = logging.getLogger(__name__)
+
+MULTIPROCESS_DIR = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+if MULTIPROCESS_DIR:
+    os.makedirs(MULTIPROCESS_DIR, exist_ok=True)
+
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds",
+    "Latency of the api requests, by route template",
+    ["method", "route", "status_code"],
+)
+MEDIA_STATUS_CHANGES = Counter(
+    "media_status_changes_total",
+    "Medias created or changed, by the status they moved to",
+    ["status"],
+)
+MEDIA_GENERATION_RETRIES = Counter(
+    "media_generation_retries_total",
+    "Media generations put back in queue, by reason",
+    ["reason"],
+)
+MEDIA_GENERATION_TRIES = Histogram(
+    "media_generation_tries",
+    "number_of_tries of the medias reaching a terminal status",
+    ["status"],
+    buckets=(0, 1, 2, 3, 4, 5, 6, 8, 10),
+)
+STAGE_DURATION_BUCKETS_SECONDS = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1,
+    2.5,
+    5,
+    10,
+    30,
+    60,
+    120,
+)
+MEDIA_GENERATION_STAGE_DURATION = Histogram(
+    "media_generation_stage_duration_seconds",
+    "Duration of the stages of a media generation",
+    ["stage"],
+    buckets=STAGE_DURATION_BUCKETS_SECONDS,
+)
+DB_POOL_CONNECTIONS = Gauge(
+    "db_pool_connections",
+    "Database connections that the pools can open",
+    multiprocess_mode="livesum",
+)
+DB_POOL_CONNECTIONS_IN_USE = Gauge(
+    "db_pool_connections_in_use",
+    "Database connections checked out of the pools",
+    multiprocess_mode="livesum",
+)
+S3_CLIENT_CONNECTIONS = Gauge(
+    "s3_client_connections",
+    "Connections that the s3 clients can open",
+    multiprocess_mode="livesum",
+)
+S3_CLIENT_OPERATIONS_IN_FLIGHT = Gauge(
+    "s3_client_operations_in_flight",
+    "Storage operations using an s3 client",
+    multiprocess_mode="livesum",
+)
+
+
+def instrument_pool(pool: Pool, connections: int):
+    DB_POOL_CONNECTIONS.set(connections)
+
+    @event.listens_for(pool, "checkout")
+    def on_checkout(*args):
+        DB_POOL_CONNECTIONS_IN_USE.inc()
+
+    @event.listens_for(pool, "checkin")
+    def on_checkin(*args):
+        DB_POOL_CONNECTIONS_IN_USE.dec()
+
+
+class QueueDepthCollector(Collector):
+    def __init__(self, queue_depths: dict[str, int]):
+        self.queue_depths = queue_depths
+
+    def collect(self):
+        metric = GaugeMetricFamily(
+            "celery_queue_depth", "Tasks waiting in each celery queue", labels=["queue"]
+        )
+        for queue, depth in self.queue_depths.items():
+            metric.add_metric([queue], depth)
+        yield metric
+
+
+def metrics_registry() -> CollectorRegistry:
+    if not MULTIPROCESS_DIR:
+        return REGISTRY
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
+
+
+def render_metrics(queue_depths: dict[str, int] | None = None) -> bytes:
+    """
+    the queue depths are global to the fleet, they're exported by the api only
+    """
+    output = generate_latest(metrics_registry())
+    if queue_depths is not None:
+        queues_registry = CollectorRegistry()
+        queues_registry.register(QueueDepthCollector(queue_depths))
+        output += generate_latest(queues_registry)
+    return output
+
+
+def start_metrics_server(port: int):
+    try:
+        start_http_server(port, registry=metrics_registry())
+    except OSError as error:
+        logger.warning(f"unable to export metrics on port {port}", exc_info=error)
+
+
+def mark_process_dead(pid: int):
+    if MULTIPROCESS_DIR:
+        multiprocess.mark_process_dead(pid)
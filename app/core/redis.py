@@ -0,0 +1,24 @@
+from redis.asyncio import Redis
+
+from app.core.config import settings
+
+redis_client: Redis | None = None
+
+
+def setup_redis() -> Redis:
+    global redis_client
+    redis_client = Redis.from_url(str(settings.REDIS_URL))
+    return redis_client
+
+
+async def close_redis():
+    global redis_client
+    if redis_client is not None:
+        await redis_client.aclose()
+    redis_client = None
+
+
+def get_redis() -> Redis:
+    if redis_client is None:
+        raise ValueError("you must call setup_redis function before using redis")
+    return redis_client
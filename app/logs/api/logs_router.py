@@ -0,0 +1,42 @@
+from typing import Annotated
+
+from fastapi import APIRouter, HTTPException, Query
+from starlette import status
+
+from app.core.keyset_cursor import KeysetCursor
+from app.logs.api.schemas import LogSearchParams, LogsPageOut
+from app.logs.log_crud import LogRepositoryDep
+
+logs_router = APIRouter()
+
+
+@logs_router.get("", response_model=LogsPageOut)
+async def search_logs(
+    params: Annotated[LogSearchParams, Query()],
+    logs_repository: LogRepositoryDep,
+):
+    """
+    newest logs first, use next_cursor as cursor to get the next page
+    """
+    try:
+        after = KeysetCursor.decode(params.cursor) if params.cursor else None
+    except ValueError as error:
+        raise HTTPException(status.HTTP_400_BAD_REQUEST, str(error)) from error
+    logs = await logs_repository.search(
+        tag=params.tag,
+        level=params.level,
+        since=params.since,
+        until=params.until,
+        media_id=str(params.media_id) if params.media_id else None,
+        exception_type=params.exception_type,
+        after=after,
+        limit=params.limit + 1,
+    )
+    next_cursor = None
+    if len(logs) > params.limit:
+        logs = logs[: params.limit]
+        last_log = logs[-1]
+        next_cursor = KeysetCursor(
+            created_at=last_log.created_at, id=last_log.id
+        ).encode()
+    return LogsPageOut(items=logs, next_cursor=next_cursor)
@@ -0,0 +1,25 @@
+from datetime import datetime
+
+from pydantic import Field
+
+from app.core.config import settings
+from app.core.model import BasicModel
+from app.logs.log import Log
+from app.logs.log_level import LogLevel
+from app.media.media_id import MediaId
+
+
+class LogSearchParams(BasicModel):
+    tag: str | None = None
+    level: LogLevel | None = None
+    since: datetime | None = None
+    until: datetime | None = None
+    media_id: MediaId | None = None
+    exception_type: str | None = None
+    cursor: str | None = None
+    limit: int = Field(100, ge=1, le=settings.LOGS_SEARCH_MAX_LIMIT)
+
+
+class LogsPageOut(BasicModel):
+    items: list[Log]
+    next_cursor: str | None = None
@@ -1,6 +1,8 @@
 import uuid
+from datetime import datetime
 
-from sqlalchemy import JSON, Enum, String, UUID
+from sqlalchemy import TIMESTAMP, Enum, Index, String, UUID, func, text
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import Mapped, mapped_column
 
 from app.core.database import Base
@@ -8,11 +10,33 @@ from app.logs.log_level import LogLevel
 
 
 class Logs(Base):
+    """
+    range partitioned by created_at, see LogPartitionsRepository.
+    postgres requires the partition key to be part of the primary key.
+    """
+
     __tablename__ = "logs"
+    __table_args__ = (
+        # the extra keys used to triage incidents, see LogsRepository.search
+        Index("ix_logs_extra_media_id", text("(extra ->> 'media_id')"), "created_at"),
+        Index(
+            "ix_logs_extra_exception_type",
+            text("(extra ->> 'exception_type')"),
+            "created_at",
+        ),
+        {"postgresql_partition_by": "RANGE (created_at)"},
+    )
     id: Mapped[uuid.UUID] = mapped_column(
         UUID(as_uuid=True), primary_key=True, index=True, default=uuid.uuid4
     )
+    created_at: Mapped[datetime] = mapped_column(
+        TIMESTAMP(timezone=True),
+        primary_key=True,
+        server_default=func.now(),
+        nullable=False,
+        index=True,
+    )
     tag: Mapped[str] = mapped_column(String, index=True, nullable=False)
     level: Mapped[LogLevel] = mapped_column(Enum(LogLevel), default=LogLevel.DEBUG)
     message: Mapped[str | None] = mapped_column(String, nullable=True)
-    extra: Mapped[dict | None] = mapped_column(JSON, nullable=True)
+    extra: Mapped[dict | None] = mapped_column(JSONB, nullable=True)
@@ -1,14 +1,15 @@
+from datetime import datetime
+from typing import Any
 from uuid import UUID
 
-from pydantic import Json
-
 from app.core.model import Model
 from app.logs.log_level import LogLevel
 
 
 class Log(Model):
     id: UUID
+    created_at: datetime
     tag: str
     level: LogLevel
-    extra: Json
-    message: str
+    extra: dict[str, Any] | None = None
+    message: str | None = None
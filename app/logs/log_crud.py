@@ -1,15 +1,24 @@
+from datetime import datetime, timezone
 from typing import Annotated
 
 from fastapi import Depends
+from sqlalchemy import ColumnElement, literal_column, select, tuple_
 
+from app.core.database import AsyncSessionDep
+from app.core.keyset_cursor import KeysetCursor
 from app.core.repository_base import BaseRepository
 from app.logs.db_logs import Logs
 from app.logs.json_serializable import make_json_serializable
 from app.logs.log import Log
 from app.logs.log_level import LogLevel
+from app.logs.log_sink import LogSinkDep
 
 
 class LogsRepository(BaseRepository[Logs, Log]):
+    def __init__(self, async_session: AsyncSessionDep, sink: LogSinkDep = None):
+        super().__init__(async_session)
+        self.sink = sink
+
     async def log(
         self,
         tag: str,
@@ -17,15 +26,69 @@ class LogsRepository(BaseRepository[Logs, Log]):
         message: str | None = None,
         extra: dict | None = None,
     ) -> None:
+        """
+        with a sink, the log is buffered and written in the background, this method doesn't wait on the database
+        """
+        row = {
+            Logs.tag.key: tag,
+            Logs.level.key: level,
+            Logs.extra.key: make_json_serializable(extra),
+            Logs.message.key: message,
+            Logs.created_at.key: datetime.now(tz=timezone.utc),
+        }
+        if self.sink is not None:
+            await self.sink.put(row)
+            return
         async with self._async_session() as session:
-            logs = Logs(
-                tag=tag,
-                level=level,
-                extra=make_json_serializable(extra),
-                message=message,
-            )
-            session.add(logs)
+            session.add(Logs(**row))
             await session.commit()
 
+    async def search(
+        self,
+        tag: str | None = None,
+        level: LogLevel | None = None,
+        since: datetime | None = None,
+        until: datetime | None = None,
+        media_id: str | None = None,
+        exception_type: str | None = None,
+        after: KeysetCursor | None = None,
+        limit: int = 100,
+    ) -> list[Log]:
+        """
+        newest logs first. the time range prunes the partitions to scan and media_id and exception_type are served by
+        the expression indexes on extra.
+        :param after: cursor of the last log of the previous page
+        """
+        statement = select(Logs)
+        if tag is not None:
+            statement = statement.where(Logs.tag == tag)
+        if level is not None:
+            statement = statement.where(Logs.level == level)
+        if since is not None:
+            statement = statement.where(Logs.created_at >= since)
+        if until is not None:
+            statement = statement.where(Logs.created_at < until)
+        if media_id is not None:
+            statement = statement.where(_extra_value("media_id") == media_id)
+        if exception_type is not None:
+            statement = statement.where(
+                _extra_value("exception_type") == exception_type
+            )
+        if after is not None:
+            statement = statement.where(
+                tuple_(Logs.created_at, Logs.id) < tuple_(after.created_at, after.id)
+            )
+        statement = statement.order_by(Logs.created_at.desc(), Logs.id.desc()).limit(
+            limit
+        )
+        async with self._async_session() as session:
+            result = await session.execute(statement)
+            return [self._map_model(log) for log in result.scalars()]
+
+
+def _extra_value(key: str) -> ColumnElement[str]:
+    # the key is rendered as a literal, so the expression matches the one of the ix_logs_extra_* indexes
+    return Logs.extra.op("->>")(literal_column(f"'{key}'"))
+
 
 LogRepositoryDep = Annotated[LogsRepository, Depends()]
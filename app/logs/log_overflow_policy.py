@@ -0,0 +1,7 @@
+from enum import StrEnum
+
+
+class LogOverflowPolicy(StrEnum):
+    DROP = "drop"
+    BLOCK = "block"
+    SPILL = "spill"
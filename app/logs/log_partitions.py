@@ -0,0 +1,111 @@
+import logging
+import re
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta, timezone
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.core.config import settings
+from app.logs.db_logs import Logs
+
+logger = logging.getLogger(__name__)
+
+LOG_PARTITION_PREFIX = f"{Logs.__tablename__}_p"
+_LOG_PARTITION_NAME = re.compile(rf"^{LOG_PARTITION_PREFIX}(\d{{8}})$")
+# serializes maintenance between api and worker processes
+_MAINTENANCE_LOCK_ID = 0x6C6F6773
+
+
+def log_partition_name(day: date) -> str:
+    return f"{LOG_PARTITION_PREFIX}{day:%Y%m%d}"
+
+
+def log_partition_day(partition_name: str) -> date | None:
+    match = _LOG_PARTITION_NAME.match(partition_name)
+    if match is None:
+        return None
+    return datetime.strptime(match.group(1), "%Y%m%d").date()
+
+
+@dataclass
+class LogPartitionsMaintenance:
+    created: list[str] = field(default_factory=list)
+    dropped: list[str] = field(default_factory=list)
+
+
+class LogPartitionsRepository:
+    """
+    The logs table is range partitioned by created_at, one partition per UTC day. Partitions are created ahead of
+    time, so inserts never miss one, and expired logs go away by dropping their partition instead of deleting rows.
+    """
+
+    def __init__(
+        self,
+        async_session: async_sessionmaker[AsyncSession],
+        retention_days: int = settings.LOG_RETENTION_DAYS,
+        premake_days: int = settings.LOG_PARTITIONS_PREMAKE_DAYS,
+    ):
+        if retention_days < 1:
+            raise ValueError("logs retention must be at least one day")
+        self._async_session = async_session
+        self.retention_days = retention_days
+        self.premake_days = premake_days
+
+    async def list_partitions(self) -> list[str]:
+        async with self._async_session() as session:
+            return sorted(await self._partitions(session))
+
+    async def maintain(self, today: date | None = None) -> LogPartitionsMaintenance:
+        """
+        creates the partitions from today to today + premake_days and drops the ones whose day is older than the
+        retention. safe to run concurrently and as often as needed.
+        """
+        today = today or datetime.now(tz=timezone.utc).date()
+        oldest_kept_day = today - timedelta(days=self.retention_days - 1)
+        maintenance = LogPartitionsMaintenance()
+        async with self._async_session() as session:
+            await session.execute(
+                text("select pg_advisory_xact_lock(:lock_id)"),
+                {"lock_id": _MAINTENANCE_LOCK_ID},
+            )
+            existing = set(await self._partitions(session))
+            for offset in range(self.premake_days + 1):
+                day = today + timedelta(days=offset)
+                name = log_partition_name(day)
+                if name not in existing:
+                    await self._create_partition(session, name, day)
+                    maintenance.created.append(name)
+            for name in sorted(existing):
+                day = log_partition_day(name)
+                if day is not None and day < oldest_kept_day:
+                    await session.execute(text(f'drop table "{name}"'))
+                    maintenance.dropped.append(name)
+            await session.commit()
+        if maintenance.created or maintenance.dropped:
+            logger.info(
+                f"logs partitions created: {maintenance.created}, dropped: {maintenance.dropped}"
+            )
+        return maintenance
+
+    async def _partitions(self, session: AsyncSession) -> list[str]:
+        result = await session.execute(
+            text(
+                "select child.relname from pg_inherits"
+                " join pg_class parent on parent.oid = pg_inherits.inhparent"
+                " join pg_class child on child.oid = pg_inherits.inhrelid"
+                " where parent.relname = :table_name"
+            ),
+            {"table_name": Logs.__tablename__},
+        )
+        return list(result.scalars())
+
+    async def _create_partition(self, session: AsyncSession, name: str, day: date):
+        # bounds are literals, postgres doesn't accept bind parameters in partition bounds
+        await session.execute(
+            text(
+                f'create table if not exists "{name}" partition of {Logs.__tablename__}'
+                f" for values from ('{day.isoformat()} 00:00:00+00')"
+                f" to ('{(day + timedelta(days=1)).isoformat()} 00:00:00+00')"
+            )
+        )
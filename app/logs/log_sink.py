@@ -0,0 +1,183 @@
+import asyncio
+import json
+import logging
+import os
+from datetime import datetime
+from pathlib import Path
+from typing import Annotated, Any
+
+import aiofiles
+from fastapi import Depends
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.core.config import settings
+from app.logs.db_logs import Logs
+from app.logs.log_overflow_policy import LogOverflowPolicy
+
+logger = logging.getLogger(__name__)
+
+
+class LogSink:
+    """
+    Buffers logs in memory and writes them with multi-row inserts from a background task, so logging never waits on
+    postgres. A batch is written once it has batch_size logs or flush_interval_seconds after it started.
+
+    When the buffer is full, new logs are dropped, wait for free space or are spilled to a local file that is written
+    to the database once the buffer is drained, depending on the overflow policy.
+    """
+
+    def __init__(
+        self,
+        async_session: async_sessionmaker[AsyncSession],
+        batch_size: int = 100,
+        flush_interval_seconds: float = 1,
+        max_queue_size: int = 10_000,
+        overflow_policy: LogOverflowPolicy = LogOverflowPolicy.DROP,
+        spill_path: Path | None = None,
+    ):
+        if overflow_policy is LogOverflowPolicy.SPILL and spill_path is None:
+            raise ValueError("spill path is required by the spill overflow policy")
+        self._async_session = async_session
+        self.batch_size = batch_size
+        self.flush_interval_seconds = flush_interval_seconds
+        self.overflow_policy = overflow_policy
+        self.spill_path = spill_path
+        self.dropped = 0
+        self.spilled = 0
+        self._queue: asyncio.Queue[dict[str, Any]] = asyncio.Queue(max_queue_size)
+        self._stopping = asyncio.Event()
+        self._spill_lock = asyncio.Lock()
+        self._task: asyncio.Task | None = None
+
+    def start(self):
+        if self._task is None:
+            self._stopping.clear()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """
+        writes every buffered and spilled log before returning
+        """
+        if self._task is not None:
+            self._stopping.set()
+            await self._task
+            self._task = None
+        await self._write_spilled()
+
+    async def put(self, row: dict[str, Any]):
+        try:
+            self._queue.put_nowait(row)
+            return
+        except asyncio.QueueFull:
+            pass
+        if self.overflow_policy is LogOverflowPolicy.BLOCK:
+            await self._queue.put(row)
+        elif self.overflow_policy is LogOverflowPolicy.SPILL:
+            await self._spill([row])
+        else:
+            self.dropped += 1
+
+    async def _run(self):
+        while not self._stopping.is_set() or not self._queue.empty():
+            batch = await self._next_batch()
+            if batch:
+                await self._write(batch)
+            if self._queue.empty():
+                await self._write_spilled()
+
+    async def _next_batch(self) -> list[dict[str, Any]]:
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.flush_interval_seconds
+        batch = []
+        while len(batch) < self.batch_size:
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            timeout = deadline - loop.time()
+            if timeout <= 0 or self._stopping.is_set():
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except TimeoutError:
+                break
+        return batch
+
+    async def _write(self, batch: list[dict[str, Any]]):
+        try:
+            async with self._async_session() as session:
+                await session.execute(insert(Logs), batch)
+                await session.commit()
+        except Exception as error:
+            logger.error(f"unable to write {len(batch)} logs", exc_info=error)
+            if self.overflow_policy is LogOverflowPolicy.SPILL:
+                await self._spill(batch)
+            else:
+                self.dropped += len(batch)
+
+    async def _spill(self, rows: list[dict[str, Any]]):
+        async with self._spill_lock:
+            async with aiofiles.open(self.spill_path, "a") as spill_file:
+                await spill_file.write(
+                    "".join(json.dumps(row, default=str) + "\n" for row in rows)
+                )
+        self.spilled += len(rows)
+
+    async def _write_spilled(self):
+        if self.spill_path is None:
+            return
+        async with self._spill_lock:
+            if not self.spill_path.exists():
+                return
+            async with aiofiles.open(self.spill_path) as spill_file:
+                lines = await spill_file.readlines()
+            self.spill_path.unlink()
+        rows = [json.loads(line) for line in lines if line.strip()]
+        for row in rows:
+            row["created_at"] = datetime.fromisoformat(row["created_at"])
+        for index in range(0, len(rows), self.batch_size):
+            await self._write(rows[index : index + self.batch_size])
+
+
+log_sink: LogSink | None = None
+
+
+def setup_log_sink(async_session: async_sessionmaker[AsyncSession]) -> LogSink | None:
+    """
+    must be called from the event loop the sink will run on
+    """
+    global log_sink
+    if not settings.LOG_SINK_ENABLED:
+        return None
+    overflow_policy = LogOverflowPolicy(settings.LOG_SINK_OVERFLOW_POLICY)
+    spill_path = None
+    if overflow_policy is LogOverflowPolicy.SPILL:
+        spill_path = settings.LOG_SINK_SPILL_DIR / f"logs_spill_{os.getpid()}.jsonl"
+        spill_path.parent.mkdir(parents=True, exist_ok=True)
+    log_sink = LogSink(
+        async_session,
+        batch_size=settings.LOG_SINK_BATCH_SIZE,
+        flush_interval_seconds=settings.LOG_SINK_FLUSH_INTERVAL_SECONDS,
+        max_queue_size=settings.LOG_SINK_MAX_QUEUE_SIZE,
+        overflow_policy=overflow_policy,
+        spill_path=spill_path,
+    )
+    log_sink.start()
+    return log_sink
+
+
+async def close_log_sink():
+    global log_sink
+    if log_sink is not None:
+        await log_sink.stop()
+    log_sink = None
+
+
+def get_log_sink() -> LogSink | None:
+    """
+    the sink is optional, without it logs are written synchronously
+    """
+    return log_sink
+
+
+LogSinkDep = Annotated[LogSink | None, Depends(get_log_sink)]
@@ -0,0 +1,56 @@
+from datetime import date, datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import func, select
+
+from app.logs.db_logs import Logs
+from app.logs.log_crud import LogsRepository
+from app.logs.log_level import LogLevel
+from app.logs.log_partitions import LogPartitionsRepository, log_partition_name
+
+
+@pytest.mark.asyncio
+async def test_maintain_creates_upcoming_partitions(session):
+    repository = LogPartitionsRepository(session, retention_days=30, premake_days=3)
+    today = datetime.now(tz=timezone.utc).date()
+
+    await repository.maintain(today)
+    second_run = await repository.maintain(today)
+
+    partitions = await repository.list_partitions()
+    for offset in range(4):
+        assert log_partition_name(today + timedelta(days=offset)) in partitions
+    assert second_run.created == []
+
+
+@pytest.mark.asyncio
+async def test_maintain_drops_expired_partitions(session):
+    old_day = date(2000, 1, 1)
+    repository = LogPartitionsRepository(session, retention_days=1, premake_days=0)
+    await repository.maintain(old_day)
+    created_at = datetime(2000, 1, 1, 12, tzinfo=timezone.utc)
+    async with session() as db_session:
+        db_session.add(Logs(tag="expired", level=LogLevel.INFO, created_at=created_at))
+        await db_session.commit()
+
+    maintenance = await repository.maintain(old_day + timedelta(days=1))
+
+    assert maintenance.dropped == [log_partition_name(old_day)]
+    assert log_partition_name(old_day) not in await repository.list_partitions()
+    async with session() as db_session:
+        statement = select(func.count()).select_from(Logs).where(Logs.tag == "expired")
+        assert (await db_session.execute(statement)).scalar() == 0
+
+
+@pytest.mark.asyncio
+async def test_logs_are_written_to_their_day_partition(
+    session, logs_repository: LogsRepository
+):
+    await LogPartitionsRepository(session).maintain()
+    await logs_repository.log("partitioned", LogLevel.INFO, "message")
+
+    async with session() as db_session:
+        statement = (
+            select(func.count()).select_from(Logs).where(Logs.tag == "partitioned")
+        )
+        assert (await db_session.execute(statement)).scalar() >= 1
@@ -0,0 +1,66 @@
+import uuid
+
+import pytest
+from sqlalchemy import select, func
+
+from app.logs.db_logs import Logs
+from app.logs.log_crud import LogsRepository
+from app.logs.log_level import LogLevel
+from app.logs.log_overflow_policy import LogOverflowPolicy
+from app.logs.log_sink import LogSink
+
+
+async def count_logs(session, tag: str) -> int:
+    async with session() as local_session:
+        statement = select(func.count()).select_from(Logs).where(Logs.tag == tag)
+        return (await local_session.execute(statement)).scalar()
+
+
+@pytest.mark.asyncio
+async def test_log_sink_writes_logs_in_batches(session):
+    tag = f"test-{uuid.uuid4()}"
+    sink = LogSink(session, batch_size=3, flush_interval_seconds=0.05)
+    sink.start()
+    logs_repository = LogsRepository(session, sink)
+    for index in range(5):
+        await logs_repository.log(tag, LogLevel.INFO, "test log", {"index": index})
+    assert await count_logs(session, tag) < 5
+
+    await sink.stop()
+    assert await count_logs(session, tag) == 5
+
+
+@pytest.mark.asyncio
+async def test_log_sink_drops_logs_when_full(session):
+    tag = f"test-{uuid.uuid4()}"
+    sink = LogSink(session, max_queue_size=2)
+    logs_repository = LogsRepository(session, sink)
+    for _ in range(3):
+        await logs_repository.log(tag, LogLevel.INFO, "test log")
+    assert sink.dropped == 1
+
+    sink.start()
+    await sink.stop()
+    assert await count_logs(session, tag) == 2
+
+
+@pytest.mark.asyncio
+async def test_log_sink_spills_logs_when_full(session, tmp_path):
+    tag = f"test-{uuid.uuid4()}"
+    spill_path = tmp_path / "logs_spill.jsonl"
+    sink = LogSink(
+        session,
+        max_queue_size=1,
+        overflow_policy=LogOverflowPolicy.SPILL,
+        spill_path=spill_path,
+    )
+    logs_repository = LogsRepository(session, sink)
+    for index in range(3):
+        await logs_repository.log(tag, LogLevel.ERROR, "test log", {"index": index})
+    assert sink.spilled == 2
+    assert spill_path.exists()
+
+    sink.start()
+    await sink.stop()
+    assert await count_logs(session, tag) == 3
+    assert not spill_path.exists()
@@ -0,0 +1,61 @@
+import uuid
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import select, text
+from sqlalchemy.dialects import postgresql
+
+from app.logs.db_logs import Logs
+from app.logs.log_crud import LogsRepository, _extra_value
+from app.logs.log_level import LogLevel
+from app.logs.log_partitions import LogPartitionsRepository
+
+
+@pytest.mark.asyncio
+async def test_search_logs_by_media_id_with_keyset_pagination(
+    session, test_client: TestClient
+):
+    await LogPartitionsRepository(session).maintain()
+    logs_repository = LogsRepository(session)
+    media_id = uuid.uuid4()
+    for index in range(5):
+        await logs_repository.log(
+            "MediaGenerator",
+            LogLevel.ERROR,
+            f"failure {index}",
+            {"media_id": str(media_id), "exception_type": "builtins.ValueError"},
+        )
+    await logs_repository.log(
+        "MediaGenerator", LogLevel.ERROR, "other", {"media_id": str(uuid.uuid4())}
+    )
+
+    messages = []
+    params = {"media_id": str(media_id), "level": "ERROR", "limit": 2}
+    for _ in range(3):
+        response = test_client.get("/logs", params=params)
+        assert response.status_code == 200
+        page = response.json()
+        messages += [log["message"] for log in page["items"]]
+        params["cursor"] = page["next_cursor"]
+    assert params["cursor"] is None
+    assert messages == [f"failure {index}" for index in reversed(range(5))]
+
+
+def test_search_logs_rejects_invalid_cursor(test_client: TestClient):
+    response = test_client.get("/logs", params={"cursor": "not a cursor"})
+    assert response.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_search_by_exception_type_uses_expression_index(session):
+    statement = select(Logs.id).where(
+        _extra_value("exception_type") == "builtins.ValueError"
+    )
+    query = statement.compile(
+        dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}
+    )
+    async with session() as db_session:
+        await db_session.execute(text("set local enable_seqscan = off"))
+        plan = "\n".join((await db_session.execute(text(f"explain {query}"))).scalars())
+    assert "Seq Scan" not in plan
+    assert "Index Cond: ((extra ->> 'exception_type'::text)" in plan
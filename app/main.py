@@ -1,17 +1,49 @@
+import logging
 import time
 from contextlib import asynccontextmanager
 
 import sentry_sdk
 from fastapi import FastAPI
+from prometheus_client import CONTENT_TYPE_LATEST
+from redis.exceptions import RedisError
 from starlette import status
 from starlette.middleware.cors import CORSMiddleware
 
-from starlette.responses import RedirectResponse, JSONResponse
+from starlette.responses import RedirectResponse, JSONResponse, Response
 
 from app import api_router
 from app.core.config import settings
 from app.core.database import setup_database, get_engine
 from app.core.exceptions import ResourceNotFoundException, InvalidStateException
+from app.core.metrics import HTTP_REQUEST_DURATION, render_metrics
+from app.core.redis import setup_redis, close_redis, get_redis
+from app.logs.log_partitions import LogPartitionsRepository
+from app.logs.log_sink import setup_log_sink, close_log_sink
+from app.media.media_status_broadcaster import (
+    setup_media_status_broadcaster,
+    close_media_status_broadcaster,
+)
+from app.media.media_status_cache import (
+    setup_media_status_cache,
+    close_media_status_cache,
+)
+from app.media.media_status_notifier import (
+    setup_media_status_notifier,
+    close_media_status_notifier,
+)
+from app.media_generator.circuit_breaker import (
+    setup_circuit_breaker,
+    close_circuit_breaker,
+)
+from app.media_generator.media_url_cache import setup_media_url_cache
+from app.media_generator.prompt_result_cache import (
+    setup_prompt_result_cache,
+    close_prompt_result_cache,
+)
+from app.media_generator.storage import setup_storage, close_storage
+from app.tasks.celery import celery_queue_depths
+
+logger = logging.getLogger(__name__)
 
 if settings.SENTRY_DSN and settings.ENVIRONMENT != "local":
     sentry_sdk.init(dsn=str(settings.SENTRY_DSN), enable_tracing=True)
@@ -19,8 +51,26 @@ if settings.SENTRY_DSN and settings.ENVIRONMENT != "local":
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    setup_database()
+    async_session = setup_database()
+    # the maintenance task keeps partitions ahead of time, this covers a beat scheduler that isn't running yet
+    await LogPartitionsRepository(async_session).maintain()
+    setup_log_sink(async_session)
+    redis = setup_redis()
+    setup_media_status_cache(redis)
+    setup_media_status_notifier(redis)
+    setup_media_status_broadcaster(redis)
+    setup_prompt_result_cache(redis)
+    setup_circuit_breaker(redis)
+    await setup_storage(url_cache=setup_media_url_cache(redis))
     yield
+    await close_storage()
+    close_circuit_breaker()
+    close_prompt_result_cache()
+    await close_media_status_broadcaster()
+    close_media_status_notifier()
+    close_media_status_cache()
+    await close_redis()
+    await close_log_sink()
     await get_engine().dispose()
 
 
@@ -49,9 +99,27 @@ async def add_process_time_header(request, call_next):
     response = await call_next(request)
     process_time = time.perf_counter() - start_time
     response.headers["X-Process-Time"] = f"{process_time * 1000:.2f} ms"
+    # the route template rather than the path, so ids don't multiply the series
+    route = request.scope.get("route")
+    HTTP_REQUEST_DURATION.labels(
+        request.method,
+        route.path if route is not None else "unmatched",
+        response.status_code,
+    ).observe(process_time)
     return response
 
 
+@fastapi_app.get("/metrics", include_in_schema=False)
+async def metrics():
+    try:
+        queue_depths = await celery_queue_depths(get_redis())
+    except RedisError as error:
+        # the other metrics are still exported while redis is down
+        logger.warning("unable to read the celery queue depths", exc_info=error)
+        queue_depths = None
+    return Response(render_metrics(queue_depths), media_type=CONTENT_TYPE_LATEST)
+
+
 @fastapi_app.get("/", tags=["root"], include_in_schema=False)
 async def root_redirect():
     return RedirectResponse(url="/docs")
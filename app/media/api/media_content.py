@@ -0,0 +1,164 @@
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import AsyncIterator
+
+from starlette import status
+from starlette.datastructures import Headers
+from starlette.responses import Response, StreamingResponse
+
+from app.media.media import Media
+from app.media_generator.storage import Storage
+
+# the storage keys every media as a png
+MEDIA_CONTENT_TYPE = "image/png"
+
+
+@dataclass(frozen=True)
+class ByteRange:
+    first_byte: int
+    # included, like in the Range and Content-Range headers
+    last_byte: int
+
+    @property
+    def length(self) -> int:
+        return self.last_byte - self.first_byte + 1
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+def parse_range(header: str | None, size: int) -> ByteRange | None:
+    """
+    the byte range requested by a Range header, None for the whole media. servers may ignore a Range header, so
+    unsupported ones are: other units, multiple ranges and invalid syntax.
+    :raises RangeNotSatisfiable: when no byte of the range is in the media
+    """
+    if not header:
+        return None
+    unit, _, byte_range = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in byte_range:
+        return None
+    first, separator, last = byte_range.strip().partition("-")
+    if not separator or not (first or last):
+        return None
+    if (first and not first.isdigit()) or (last and not last.isdigit()):
+        return None
+    if not first:
+        # suffix range, the last bytes of the media
+        suffix_length = int(last)
+        if suffix_length == 0 or size == 0:
+            raise RangeNotSatisfiable()
+        return ByteRange(max(size - suffix_length, 0), size - 1)
+    first_byte = int(first)
+    if last and int(last) < first_byte:
+        return None
+    if first_byte >= size:
+        raise RangeNotSatisfiable()
+    last_byte = min(int(last), size - 1) if last else size - 1
+    return ByteRange(first_byte, last_byte)
+
+
+def _entity_tags(header: str) -> list[str]:
+    # If-None-Match uses the weak comparison, W/ prefixes are ignored
+    return [tag.strip().removeprefix("W/") for tag in header.split(",")]
+
+
+def _http_date(header: str) -> datetime | None:
+    try:
+        date = parsedate_to_datetime(header)
+    except (TypeError, ValueError):
+        return None
+    return date if date.tzinfo is not None else date.replace(tzinfo=timezone.utc)
+
+
+def is_not_modified(headers: Headers, etag: str, last_modified: datetime) -> bool:
+    """
+    If-None-Match takes precedence over If-Modified-Since, which is ignored when it's not a valid date
+    """
+    if_none_match = headers.get("if-none-match")
+    if if_none_match is not None:
+        return if_none_match.strip() == "*" or etag in _entity_tags(if_none_match)
+    if_modified_since = headers.get("if-modified-since")
+    if if_modified_since is None:
+        return False
+    since = _http_date(if_modified_since)
+    return since is not None and last_modified <= since
+
+
+def range_applies(headers: Headers, etag: str, last_modified: datetime) -> bool:
+    """
+    a Range is only served if the media still matches the If-Range validator, the whole media is sent otherwise
+    """
+    if_range = headers.get("if-range")
+    if if_range is None:
+        return True
+    if_range = if_range.strip()
+    if if_range.startswith('"'):
+        # strong comparison
+        return if_range == etag
+    return _http_date(if_range) == last_modified
+
+
+async def _prepend(
+    first_chunk: bytes, chunks: AsyncIterator[bytes]
+) -> AsyncIterator[bytes]:
+    yield first_chunk
+    async for chunk in chunks:
+        yield chunk
+
+
+async def media_content_response(
+    media: Media, storage: Storage, headers: Headers
+) -> Response:
+    """
+    streams the media from the storage, honoring Range, If-Range, If-None-Match and If-Modified-Since.
+    the etag is the sha256 of the media, its last modification is its completion.
+    """
+    if media.sha256 is not None and media.size_bytes is not None:
+        size, etag = media.size_bytes, f'"{media.sha256}"'
+    else:
+        # medias stored before their sha256 and size were recorded
+        size, etag = await storage.head_media(media.media_uri)
+    # http dates have a one second precision
+    last_modified = media.updated_at.astimezone(timezone.utc).replace(microsecond=0)
+    validators = {
+        "ETag": etag,
+        "Last-Modified": format_datetime(last_modified, usegmt=True),
+    }
+    if is_not_modified(headers, etag, last_modified):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=validators)
+
+    response_headers = validators | {"Accept-Ranges": "bytes"}
+    byte_range = None
+    if range_applies(headers, etag, last_modified):
+        try:
+            byte_range = parse_range(headers.get("range"), size)
+        except RangeNotSatisfiable:
+            return Response(
+                status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+                headers=response_headers | {"Content-Range": f"bytes */{size}"},
+            )
+
+    if byte_range is None:
+        status_code = status.HTTP_200_OK
+        chunks = storage.read_media(media.media_uri)
+        response_headers["Content-Length"] = str(size)
+    else:
+        status_code = status.HTTP_206_PARTIAL_CONTENT
+        chunks = storage.read_media(
+            media.media_uri, byte_range.first_byte, byte_range.last_byte
+        )
+        response_headers["Content-Length"] = str(byte_range.length)
+        response_headers["Content-Range"] = (
+            f"bytes {byte_range.first_byte}-{byte_range.last_byte}/{size}"
+        )
+    # the object is opened before the response starts, so a storage error isn't sent as a truncated body
+    first_chunk = await anext(chunks, b"")
+    return StreamingResponse(
+        _prepend(first_chunk, chunks),
+        status_code=status_code,
+        headers=response_headers,
+        media_type=MEDIA_CONTENT_TYPE,
+    )
@@ -1,25 +1,211 @@
-from fastapi import APIRouter
+import uuid
+from typing import Annotated
 
+from fastapi import APIRouter, HTTPException, Query, Request
+from starlette import status
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import settings
 from app.core.exceptions import InvalidStateException
+from app.core.keyset_cursor import KeysetCursor
+from app.media.api.media_content import media_content_response
+from app.media.api.media_status_stream import (
+    media_status_events,
+    media_status_stream_response,
+)
+from app.media_generator.prompt_result_cache import PromptResultCacheDep
 from app.media_generator.storage import StorageDep
-from app.media.api.schemas import MediaGenerationParams, MediaOut, MediaUrlOut
+from app.media.api.schemas import (
+    MediaGenerationParams,
+    MediaOut,
+    MediaUrlOut,
+    MediaBatchGenerationParams,
+    MediaBatchOut,
+    MediaBatchItemOut,
+    MediaBatchItemErrorOut,
+    MediaBulkStatusParams,
+    MediaBulkStatusOut,
+    MediaSearchParams,
+    MediasPageOut,
+)
 from app.media.job_id import JobId
 from app.media.media_id import MediaId
+from app.media.media_priority import MediaPriority
 from app.media.media_repository import MediaRepositoryDep
 from app.media.media_status import MediaStatus
-from app.tasks.celery_tasks import create_media
+from app.media.media_status_broadcaster import get_media_status_broadcaster
+from app.tasks.celery import media_queue
+from app.tasks.celery_tasks import create_media, publish_create_media_tasks
 
 media_router = APIRouter()
 
 
+@media_router.get("", response_model=MediasPageOut)
+async def search_medias(
+    params: Annotated[MediaSearchParams, Query()],
+    media_repository: MediaRepositoryDep,
+):
+    """
+    newest medias first, use next_cursor as cursor to get the next page
+    """
+    try:
+        after = KeysetCursor.decode(params.cursor) if params.cursor else None
+    except ValueError as error:
+        raise HTTPException(status.HTTP_400_BAD_REQUEST, str(error)) from error
+    medias = await media_repository.search(
+        status=params.status,
+        since=params.since,
+        until=params.until,
+        prompt_prefix=params.prompt_prefix,
+        after=after,
+        limit=params.limit + 1,
+    )
+    next_cursor = None
+    if len(medias) > params.limit:
+        medias = medias[: params.limit]
+        last_media = medias[-1]
+        next_cursor = KeysetCursor(
+            created_at=last_media.created_at, id=last_media.id
+        ).encode()
+    return MediasPageOut(items=medias, next_cursor=next_cursor)
+
+
 @media_router.post("/generate", response_model=MediaOut)
 async def generate(
     params: MediaGenerationParams,
     media_repository: MediaRepositoryDep,
+    result_cache: PromptResultCacheDep,
+):
+    priority = params.priority or MediaPriority.NORMAL
+    if result_cache is not None and not params.bypass_cache:
+        stored_media = await result_cache.get(params.prompt)
+        if stored_media is not None:
+            return await media_repository.create_completed_media(
+                prompt=params.prompt,
+                job_id=uuid.uuid4(),
+                stored_media=stored_media,
+                priority=priority,
+            )
+    # the job id is chosen up front so the media is created with it in a single transaction
+    media = await media_repository.create_media(
+        prompt=params.prompt, job_id=uuid.uuid4(), priority=priority
+    )
+    try:
+        await run_in_threadpool(
+            create_media.apply_async,
+            kwargs={"media_id": media.id},
+            task_id=str(media.job_id),
+            queue=media_queue(priority),
+        )
+    except Exception:
+        await media_repository.register_media_generation_error(
+            media.id, None, None, MediaStatus.ERROR
+        )
+        raise
+    return media
+
+
+@media_router.post("/generate/batch", response_model=MediaBatchOut)
+async def generate_batch(
+    params: MediaBatchGenerationParams,
+    media_repository: MediaRepositoryDep,
 ):
-    media = await media_repository.create_media(prompt=params.prompt)
-    task = create_media.apply_async(kwargs={"media_id": media.id})
-    return await media_repository.update_media_job_id(media.id, task.id)
+    """
+    creates every media with a single insert and publishes their tasks together.
+    items are returned in input order, a media whose task couldn't be published is returned with an error.
+    """
+    medias = await media_repository.create_medias_with_job_ids(
+        [
+            (item.prompt, uuid.uuid4(), item.priority or params.priority)
+            for item in params.items
+        ]
+    )
+    errors = await run_in_threadpool(publish_create_media_tasks, medias)
+    items = []
+    for media in medias:
+        error = errors.get(media.id)
+        if error is None:
+            items.append(MediaBatchItemOut(media=media))
+            continue
+        media = await media_repository.register_media_generation_error(
+            media.id, None, None, MediaStatus.ERROR
+        )
+        items.append(
+            MediaBatchItemOut(
+                media=media,
+                error=MediaBatchItemErrorOut(
+                    error_code="TASK_PUBLISH_FAILED", message=str(error)
+                ),
+            )
+        )
+    return MediaBatchOut(items=items)
+
+
+@media_router.post("/status/bulk", response_model=MediaBulkStatusOut)
+async def get_medias_status(
+    params: MediaBulkStatusParams,
+    media_repository: MediaRepositoryDep,
+):
+    """
+    resolves up to MEDIA_STATUS_BULK_MAX_IDS job ids and media ids at once, ids that don't exist are listed apart
+    """
+    medias = await media_repository.get_from_ids(params.job_ids, params.media_ids)
+    by_job_id = {media.job_id: media for media in medias}
+    by_media_id = {media.id: media for media in medias}
+    return MediaBulkStatusOut(
+        by_job_id={
+            job_id: by_job_id[job_id]
+            for job_id in params.job_ids
+            if job_id in by_job_id
+        },
+        by_media_id={
+            media_id: by_media_id[media_id]
+            for media_id in params.media_ids
+            if media_id in by_media_id
+        },
+        unknown_job_ids=[
+            job_id for job_id in params.job_ids if job_id not in by_job_id
+        ],
+        unknown_media_ids=[
+            media_id for media_id in params.media_ids if media_id not in by_media_id
+        ],
+    )
+
+
+@media_router.get("/status/stream")
+async def stream_medias_status(
+    job_ids: Annotated[
+        list[JobId],
+        Query(min_length=1, max_length=settings.MEDIA_STATUS_STREAM_MAX_JOBS),
+    ],
+    media_repository: MediaRepositoryDep,
+):
+    """
+    server-sent events with the changes of every given job, until all of them reach a terminal status
+    """
+    for job_id in job_ids:
+        await media_repository.get_from_job_id(job_id)
+    events = media_status_events(
+        list(dict.fromkeys(job_ids)),
+        media_repository,
+        get_media_status_broadcaster(),
+    )
+    return media_status_stream_response(events)
+
+
+@media_router.get("/status/{job_id}/stream")
+async def stream_media_status(
+    job_id: JobId,
+    media_repository: MediaRepositoryDep,
+):
+    """
+    server-sent events with the changes of the job, until it reaches a terminal status
+    """
+    await media_repository.get_from_job_id(job_id)
+    events = media_status_events(
+        [job_id], media_repository, get_media_status_broadcaster()
+    )
+    return media_status_stream_response(events)
 
 
 @media_router.get("/status/{job_id}", response_model=MediaOut)
@@ -41,3 +227,22 @@ async def get_media_url(
         )
     url = await storage.create_media_url(media.media_uri)
     return MediaUrlOut(url=url)
+
+
+@media_router.get("/content/{media_id}/raw")
+async def get_media_content(
+    media_id: MediaId,
+    request: Request,
+    storage: StorageDep,
+    media_repository: MediaRepositoryDep,
+):
+    """
+    streams the media through the api, for clients that can't reach the storage. supports Range requests, and
+    conditional requests with the ETag and Last-Modified validators
+    """
+    media = await media_repository.get_or_raise(media_id)
+    if media.status is not MediaStatus.COMPLETED:
+        raise InvalidStateException(
+            "media generation is not completed", extras=media.model_dump()
+        )
+    return await media_content_response(media, storage, request.headers)
@@ -0,0 +1,66 @@
+import asyncio
+from typing import AsyncIterator
+
+from starlette.responses import StreamingResponse
+
+from app.core.config import settings
+from app.media.api.schemas import MediaOut
+from app.media.job_id import JobId
+from app.media.media import Media
+from app.media.media_repository import MediaRepository
+from app.media.media_status_broadcaster import MediaStatusBroadcaster
+
+
+async def media_status_events(
+    job_ids: list[JobId],
+    media_repository: MediaRepository,
+    broadcaster: MediaStatusBroadcaster,
+    heartbeat_seconds: float = settings.MEDIA_STATUS_STREAM_HEARTBEAT_SECONDS,
+) -> AsyncIterator[str]:
+    """
+    yields a server-sent event with the current state of each media, then one per change, until every media reaches
+    a terminal status
+    """
+    pending = set(job_ids)
+    last_sent: dict[JobId, Media] = {}
+
+    def to_event(media: Media) -> str | None:
+        last = last_sent.get(media.job_id)
+        if media.job_id not in pending or (
+            last is not None and media.updated_at <= last.updated_at
+        ):
+            return None
+        last_sent[media.job_id] = media
+        if media.status.is_terminal:
+            pending.discard(media.job_id)
+        data = MediaOut.model_validate(media).model_dump_json()
+        return f"event: status\ndata: {data}\n\n"
+
+    # subscribing before reading the current state ensures no change is missed
+    async with broadcaster.subscribe(job_ids) as queue:
+        for job_id in job_ids:
+            event = to_event(await media_repository.get_from_job_id(job_id))
+            if event is not None:
+                yield event
+        while pending:
+            try:
+                media = await asyncio.wait_for(queue.get(), heartbeat_seconds)
+            except TimeoutError:
+                yield ": heartbeat\n\n"
+                # changes published while the broadcaster was reconnecting are lost, so pending medias are re-read
+                for job_id in list(pending):
+                    event = to_event(await media_repository.get_from_job_id(job_id))
+                    if event is not None:
+                        yield event
+                continue
+            event = to_event(media)
+            if event is not None:
+                yield event
+
+
+def media_status_stream_response(events: AsyncIterator[str]) -> StreamingResponse:
+    return StreamingResponse(
+        events,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
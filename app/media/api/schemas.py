@@ -1,11 +1,30 @@
-from pydantic import Field
+from datetime import datetime
 
+from pydantic import Field, model_validator
+
+from app.core.config import settings
 from app.core.model import BasicModel
+from app.media.job_id import JobId
 from app.media.media import Media
+from app.media.media_id import MediaId
+from app.media.media_priority import MediaPriority
+from app.media.media_status import MediaStatus
 
 
 class MediaGenerationParams(BasicModel):
     prompt: str
+    # generates the media even if the prompt result cache has one for this prompt
+    bypass_cache: bool = False
+    # defaults to NORMAL for a single generation, to the batch priority for a batch item
+    priority: MediaPriority | None = None
+
+
+class MediaBatchGenerationParams(BasicModel):
+    items: list[MediaGenerationParams] = Field(
+        min_length=1, max_length=settings.MEDIA_BATCH_MAX_SIZE
+    )
+    # bulk jobs shouldn't delay the interactive ones
+    priority: MediaPriority = MediaPriority.LOW
 
 
 class MediaOut(Media):
@@ -14,3 +33,58 @@ class MediaOut(Media):
 
 class MediaUrlOut(BasicModel):
     url: str
+
+
+class MediaBatchItemErrorOut(BasicModel):
+    error_code: str
+    message: str
+
+
+class MediaBatchItemOut(BasicModel):
+    media: MediaOut
+    error: MediaBatchItemErrorOut | None = None
+
+
+class MediaBatchOut(BasicModel):
+    items: list[MediaBatchItemOut]
+
+
+class MediaBulkStatusParams(BasicModel):
+    job_ids: list[JobId] = Field(default_factory=list)
+    media_ids: list[MediaId] = Field(default_factory=list)
+
+    @model_validator(mode="after")
+    def check_number_of_ids(self):
+        number_of_ids = len(self.job_ids) + len(self.media_ids)
+        if not 0 < number_of_ids <= settings.MEDIA_STATUS_BULK_MAX_IDS:
+            raise ValueError(
+                f"between 1 and {settings.MEDIA_STATUS_BULK_MAX_IDS} ids are required"
+            )
+        return self
+
+
+class MediaBulkStatusOut(BasicModel):
+    by_job_id: dict[JobId, MediaOut]
+    by_media_id: dict[MediaId, MediaOut]
+    unknown_job_ids: list[JobId]
+    unknown_media_ids: list[MediaId]
+
+
+class MediaSearchParams(BasicModel):
+    status: MediaStatus | None = None
+    since: datetime | None = None
+    until: datetime | None = None
+    prompt_prefix: str | None = None
+    cursor: str | None = None
+    limit: int = Field(100, ge=1, le=settings.MEDIA_SEARCH_MAX_LIMIT)
+
+
+class MediasPageOut(BasicModel):
+    items: list[MediaOut]
+    next_cursor: str | None = None
+
+
+class MediaQueueOut(BasicModel):
+    by_status: dict[MediaStatus, int]
+    overdue: list[MediaOut]
+    stuck: list[MediaOut]
@@ -6,14 +6,18 @@ from sqlalchemy import (
     String,
     Enum,
     UniqueConstraint,
+    Index,
     func,
     Integer,
+    BigInteger,
     ARRAY,
     TIMESTAMP,
+    text,
 )
 from sqlalchemy.orm import Mapped, mapped_column
 
 from app.core.database import Base
+from app.media.media_priority import MediaPriority
 from app.media.media_status import MediaStatus
 
 
@@ -24,13 +28,39 @@ class Medias(Base):
             "job_id",
             name="job_id_unique",
         ),
+        # keyset pagination of the medias listing, see MediaRepository.search
+        Index("ix_medias_created_at_id", "created_at", "id"),
+        Index("ix_medias_status_created_at_id", "status", "created_at", "id"),
+        # prompt prefix searches, text_pattern_ops supports LIKE 'prefix%' whatever the database collation
+        Index(
+            "ix_medias_prompt_pattern",
+            "prompt",
+            postgresql_ops={"prompt": "text_pattern_ops"},
+        ),
+        # the medias still to generate, a small fraction of the table: due retries (status, next_run) and their
+        # counts by status are index only scans
+        Index(
+            "ix_medias_active_status_next_run",
+            "status",
+            "next_run",
+            postgresql_where=text("status IN ('IN_QUEUE', 'PROCESSING')"),
+        ),
+        # generations stuck in PROCESSING, updated_at is the time they were claimed
+        Index(
+            "ix_medias_processing_updated_at",
+            "updated_at",
+            postgresql_where=text("status = 'PROCESSING'"),
+        ),
     )
 
     id: Mapped[uuid.UUID] = mapped_column(
-        UUID(as_uuid=True), primary_key=True, index=True, default=uuid.uuid4
+        UUID(as_uuid=True), primary_key=True, default=uuid.uuid4
     )
-    job_id: Mapped[uuid.UUID] = mapped_column(
-        UUID(as_uuid=True), index=True, nullable=True
+    # job_id lookups use the index of job_id_unique
+    job_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), nullable=True)
+    # without the index of Base, ix_medias_created_at_id serves the created_at ranges
+    created_at: Mapped[datetime] = mapped_column(
+        TIMESTAMP(timezone=True), server_default=func.now(), nullable=False
     )
     prompt: Mapped[str] = mapped_column(String, nullable=False)
     status: Mapped[MediaStatus] = mapped_column(
@@ -38,12 +68,25 @@ class Medias(Base):
         nullable=False,
         default=MediaStatus.IN_QUEUE,
     )
+    priority: Mapped[MediaPriority] = mapped_column(
+        Enum(MediaPriority, native_enum=False),
+        nullable=False,
+        default=MediaPriority.NORMAL,
+        server_default=MediaPriority.NORMAL.value,
+    )
     next_run: Mapped[datetime] = mapped_column(
         TIMESTAMP(timezone=True), nullable=True, server_default=func.now()
     )
     number_of_tries: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    # generations put back in queue without counting a try, see MediaGenerator.reschedule
+    number_of_reschedules: Mapped[int] = mapped_column(
+        Integer, nullable=False, default=0, server_default="0"
+    )
     celery_jobs: Mapped[list[str]] = mapped_column(
         ARRAY(String), nullable=False, default=list
     )
 
     media_uri: Mapped[str] = mapped_column(String, nullable=True)
+    # sha256 and size of the stored media bytes
+    sha256: Mapped[str] = mapped_column(String(64), nullable=True)
+    size_bytes: Mapped[int] = mapped_column(BigInteger, nullable=True)
@@ -3,6 +3,7 @@ from datetime import datetime
 from app.core.model import Model
 from app.media.job_id import JobId
 from app.media.media_id import MediaId
+from app.media.media_priority import MediaPriority
 from app.media.media_status import MediaStatus
 
 
@@ -13,6 +14,10 @@ class Media(Model):
     job_id: JobId | None = None
     prompt: str
     status: MediaStatus
+    priority: MediaPriority = MediaPriority.NORMAL
     media_uri: str | None = None
+    sha256: str | None = None
+    size_bytes: int | None = None
     next_run: datetime | None = None
     number_of_tries: int
+    number_of_reschedules: int = 0
@@ -0,0 +1,11 @@
+from enum import StrEnum
+
+
+class MediaPriority(StrEnum):
+    """
+    each priority has its own celery queue, see app.tasks.celery.media_queue
+    """
+
+    HIGH = "HIGH"
+    NORMAL = "NORMAL"
+    LOW = "LOW"
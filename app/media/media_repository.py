@@ -2,17 +2,48 @@ from datetime import datetime
 from typing import Annotated
 
 from fastapi import Depends
-from sqlalchemy import update, select
+from sqlalchemy import (
+    update,
+    select,
+    insert,
+    any_,
+    bindparam,
+    or_,
+    tuple_,
+    func,
+    UUID,
+    ARRAY,
+)
 
+from app.core.database import AsyncSessionDep
+from app.core.keyset_cursor import KeysetCursor
+from app.core.metrics import MEDIA_GENERATION_TRIES, MEDIA_STATUS_CHANGES
 from app.core.repository_base import BaseRepository
 from app.media.db_media import Medias
 from app.media.job_id import JobId
 from app.media.media import Media
 from app.media.media_id import MediaId
+from app.media.media_priority import MediaPriority
 from app.media.media_status import MediaStatus
+from app.media.media_status_cache import MediaStatusCacheDep
+from app.media.media_status_notifier import MediaStatusNotifierDep
+from app.media_generator.stored_media import StoredMedia
+
+# statuses of the medias still to generate, the predicate of the partial index ix_medias_active_status_next_run
+ACTIVE_STATUSES = (MediaStatus.IN_QUEUE, MediaStatus.PROCESSING)
 
 
 class MediaRepository(BaseRepository[Medias, Media]):
+    def __init__(
+        self,
+        async_session: AsyncSessionDep,
+        status_cache: MediaStatusCacheDep = None,
+        status_notifier: MediaStatusNotifierDep = None,
+    ):
+        super().__init__(async_session)
+        self.status_cache = status_cache
+        self.status_notifier = status_notifier
+
     async def update_media_job_id(self, media_id: MediaId, job_id: JobId):
         async with self._async_session() as session:
             statement = (
@@ -23,16 +54,137 @@ class MediaRepository(BaseRepository[Medias, Media]):
             )
             media = (await session.execute(statement)).fetchone()
             await session.commit()
-            return self._map_model(media)
+            return await self._media_changed(self._map_model(media))
 
     async def get_from_job_id(self, job_id: JobId) -> Media:
+        if self.status_cache is not None:
+            media = await self.status_cache.get(job_id)
+            if media is not None:
+                return media
         async with self._async_session() as session:
             statement = select(Medias).where(Medias.job_id == job_id)
             media = (await session.execute(statement)).fetchone()
-            return self._map_model(media)
+            return await self._cache_media(self._map_model(media))
+
+    async def get_from_ids(
+        self, job_ids: list[JobId], media_ids: list[MediaId]
+    ) -> list[Media]:
+        """
+        resolves medias by job id or media id with a single query, medias found in the status cache are not queried
+        """
+        medias = []
+        if self.status_cache is not None:
+            cached_medias = await self.status_cache.get_many(job_ids)
+            medias.extend(cached_medias.values())
+            job_ids = [job_id for job_id in job_ids if job_id not in cached_medias]
+        if not job_ids and not media_ids:
+            return medias
+        uuid_array = ARRAY(UUID(as_uuid=True))
+        statement = select(Medias).where(
+            or_(
+                Medias.job_id == any_(bindparam("job_ids", job_ids, uuid_array)),
+                Medias.id == any_(bindparam("media_ids", media_ids, uuid_array)),
+            )
+        )
+        async with self._async_session() as session:
+            queried_medias = [
+                self._map_model(media)
+                for media in (await session.scalars(statement)).all()
+            ]
+        if self.status_cache is not None:
+            await self.status_cache.set_many(queried_medias)
+        return medias + queried_medias
+
+    async def search(
+        self,
+        status: MediaStatus | None = None,
+        since: datetime | None = None,
+        until: datetime | None = None,
+        prompt_prefix: str | None = None,
+        after: KeysetCursor | None = None,
+        limit: int = 100,
+    ) -> list[Media]:
+        """
+        newest medias first, paged on (created_at, id) so any page is an index seek.
+        :param after: cursor of the last media of the previous page
+        """
+        statement = select(Medias)
+        if status is not None:
+            statement = statement.where(Medias.status == status)
+        if since is not None:
+            statement = statement.where(Medias.created_at >= since)
+        if until is not None:
+            statement = statement.where(Medias.created_at < until)
+        if prompt_prefix:
+            # a pattern without leading wildcard is an ix_medias_prompt_pattern range scan
+            statement = statement.where(
+                Medias.prompt.like(_prefix_pattern(prompt_prefix), escape="/")
+            )
+        if after is not None:
+            statement = statement.where(
+                tuple_(Medias.created_at, Medias.id)
+                < tuple_(after.created_at, after.id)
+            )
+        statement = statement.order_by(
+            Medias.created_at.desc(), Medias.id.desc()
+        ).limit(limit)
+        async with self._async_session() as session:
+            result = await session.execute(statement)
+            return [self._map_model(media) for media in result.scalars()]
+
+    async def count_active_by_status(self) -> dict[MediaStatus, int]:
+        """
+        medias IN_QUEUE and PROCESSING, counted on ix_medias_active_status_next_run. the terminal statuses grow with
+        the table, their counts are exported by the media_status_changes_total metric instead.
+        """
+        statement = (
+            select(Medias.status, func.count())
+            .where(Medias.status.in_(ACTIVE_STATUSES))
+            .group_by(Medias.status)
+        )
+        async with self._async_session() as session:
+            counts = dict((await session.execute(statement)).tuples().all())
+        return {status: counts.get(status, 0) for status in ACTIVE_STATUSES}
+
+    async def find_overdue(self, due_before: datetime, limit: int) -> list[Media]:
+        """
+        medias IN_QUEUE whose generation was due before due_before, oldest first: their celery task was lost or the
+        workers are behind
+        """
+        statement = (
+            select(Medias)
+            .where(Medias.status == MediaStatus.IN_QUEUE, Medias.next_run < due_before)
+            .order_by(Medias.next_run)
+            .limit(limit)
+        )
+        async with self._async_session() as session:
+            result = await session.execute(statement)
+            return [self._map_model(media) for media in result.scalars()]
+
+    async def find_stuck(self, claimed_before: datetime, limit: int) -> list[Media]:
+        """
+        medias PROCESSING since before claimed_before, oldest first: their worker likely died
+        """
+        statement = (
+            select(Medias)
+            .where(
+                Medias.status == MediaStatus.PROCESSING,
+                Medias.updated_at < claimed_before,
+            )
+            .order_by(Medias.updated_at)
+            .limit(limit)
+        )
+        async with self._async_session() as session:
+            result = await session.execute(statement)
+            return [self._map_model(media) for media in result.scalars()]
 
     async def finish_media_generation(
-        self, media_id: MediaId, media_uri: str, status: MediaStatus
+        self,
+        media_id: MediaId,
+        media_uri: str,
+        status: MediaStatus,
+        sha256: str | None = None,
+        size_bytes: int | None = None,
     ) -> Media:
         statement = (
             update(Medias)
@@ -40,6 +192,8 @@ class MediaRepository(BaseRepository[Medias, Media]):
             .values(
                 **{
                     Medias.media_uri.key: media_uri,
+                    Medias.sha256.key: sha256,
+                    Medias.size_bytes.key: size_bytes,
                     Medias.status.key: status,
                     Medias.number_of_tries.key: Medias.number_of_tries + 1,
                 }
@@ -49,14 +203,70 @@ class MediaRepository(BaseRepository[Medias, Media]):
         async with self._async_session() as session:
             media = (await session.execute(statement)).fetchone()
             await session.commit()
-            return self._map_model(media)
+            return await self._media_changed(self._map_model(media))
+
+    async def create_media(
+        self,
+        prompt: str,
+        job_id: JobId | None = None,
+        priority: MediaPriority = MediaPriority.NORMAL,
+    ) -> Media:
+        async with self._async_session() as session:
+            medias = Medias(prompt=prompt, priority=priority)
+            if job_id is not None:
+                medias.job_id = job_id
+                medias.celery_jobs = [str(job_id)]
+            session.add(medias)
+            await session.commit()
+            return await self._media_changed(self._map_model(medias))
 
-    async def create_media(self, prompt: str) -> Media:
+    async def create_completed_media(
+        self,
+        prompt: str,
+        job_id: JobId,
+        stored_media: StoredMedia,
+        priority: MediaPriority = MediaPriority.NORMAL,
+    ) -> Media:
+        """
+        creates a media completed with the result of a previous generation, no task is needed
+        """
         async with self._async_session() as session:
-            medias = Medias(prompt=prompt)
+            medias = Medias(
+                prompt=prompt,
+                job_id=job_id,
+                celery_jobs=[],
+                status=MediaStatus.COMPLETED,
+                priority=priority,
+                media_uri=stored_media.uri,
+                sha256=stored_media.sha256,
+                size_bytes=stored_media.size_bytes,
+            )
             session.add(medias)
             await session.commit()
-            return self._map_model(medias)
+            return await self._media_changed(self._map_model(medias))
+
+    async def create_medias_with_job_ids(
+        self, prompts_and_job_ids: list[tuple[str, JobId, MediaPriority]]
+    ) -> list[Media]:
+        """
+        inserts every media with a single multi-row insert, returning them in input order
+        """
+        statement = insert(Medias).returning(Medias, sort_by_parameter_order=True)
+        values = [
+            {
+                Medias.prompt.key: prompt,
+                Medias.job_id.key: job_id,
+                Medias.celery_jobs.key: [str(job_id)],
+                Medias.priority.key: priority,
+            }
+            for prompt, job_id, priority in prompts_and_job_ids
+        ]
+        async with self._async_session() as session:
+            medias = (await session.scalars(statement, values)).all()
+            await session.commit()
+            return [
+                await self._media_changed(self._map_model(media)) for media in medias
+            ]
 
     async def get_and_update_status(
         self,
@@ -73,7 +283,7 @@ class MediaRepository(BaseRepository[Medias, Media]):
         async with self._async_session() as session:
             media = (await session.execute(statement)).fetchone()
             await session.commit()
-            return self._map_model(media)
+            return await self._media_changed(self._map_model(media))
 
     async def register_media_generation_error(
         self,
@@ -97,7 +307,53 @@ class MediaRepository(BaseRepository[Medias, Media]):
         async with self._async_session() as session:
             media = (await session.execute(statement)).fetchone()
             await session.commit()
-            return self._map_model(media)
+            return await self._media_changed(self._map_model(media))
+
+    async def reschedule_media(
+        self, media_id: MediaId, next_run: datetime, new_job_id: JobId
+    ) -> Media:
+        """
+        puts the media back in queue without counting a try, for generations that didn't reach the model
+        """
+        values = {
+            Medias.status.key: MediaStatus.IN_QUEUE,
+            Medias.next_run.key: next_run,
+            Medias.number_of_reschedules.key: Medias.number_of_reschedules + 1,
+            Medias.celery_jobs.key: Medias.celery_jobs + [new_job_id],
+        }
+        statement = (
+            update(Medias)
+            .where(Medias.id == media_id)
+            .values(**values)
+            .returning(Medias)
+        )
+        async with self._async_session() as session:
+            media = (await session.execute(statement)).fetchone()
+            await session.commit()
+            return await self._media_changed(self._map_model(media))
+
+    async def _cache_media(self, media: Media) -> Media:
+        if self.status_cache is not None:
+            await self.status_cache.set(media)
+        return media
+
+    async def _media_changed(self, media: Media) -> Media:
+        """
+        writes through the status cache and notifies the status streams, every change of a media must go through this
+        method
+        """
+        await self._cache_media(media)
+        MEDIA_STATUS_CHANGES.labels(media.status).inc()
+        if media.status.is_terminal:
+            MEDIA_GENERATION_TRIES.labels(media.status).observe(media.number_of_tries)
+        if self.status_notifier is not None:
+            await self.status_notifier.publish(media)
+        return media
+
+
+def _prefix_pattern(prefix: str) -> str:
+    escaped = prefix.replace("/", "//").replace("%", "/%").replace("_", "/_")
+    return f"{escaped}%"
 
 
 MediaRepositoryDep = Annotated[MediaRepository, Depends()]
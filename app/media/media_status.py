@@ -6,3 +6,7 @@ class MediaStatus(StrEnum):
     IN_QUEUE = "IN_QUEUE"
     PROCESSING = "PROCESSING"
     COMPLETED = "COMPLETED"
+
+    @property
+    def is_terminal(self) -> bool:
+        return self in (MediaStatus.COMPLETED, MediaStatus.ERROR)
@@ -0,0 +1,129 @@
+import asyncio
+import contextlib
+import logging
+from collections import defaultdict
+from typing import AsyncIterator
+
+from pydantic import ValidationError
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+
+from app.core.config import settings
+from app.media.job_id import JobId
+from app.media.media import Media
+
+logger = logging.getLogger(__name__)
+
+
+class MediaStatusBroadcaster:
+    """
+    Fans out media changes published by MediaStatusNotifier to the status streams of this api worker.
+
+    A single redis subscription per process serves every open stream, each stream gets its own bounded queue.
+    """
+
+    def __init__(
+        self,
+        redis: Redis,
+        channel: str = settings.MEDIA_STATUS_CHANNEL,
+        queue_size: int = 100,
+        reconnect_delay_seconds: float = 1,
+    ):
+        self.redis = redis
+        self.channel = channel
+        self.queue_size = queue_size
+        self.reconnect_delay_seconds = reconnect_delay_seconds
+        self._subscribers: defaultdict[JobId, set[asyncio.Queue[Media]]] = defaultdict(
+            set
+        )
+        self._task: asyncio.Task | None = None
+
+    @property
+    def number_of_subscribers(self) -> int:
+        return sum(len(queues) for queues in self._subscribers.values())
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._listen())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await self._task
+        self._task = None
+
+    @contextlib.asynccontextmanager
+    async def subscribe(
+        self, job_ids: list[JobId]
+    ) -> AsyncIterator[asyncio.Queue[Media]]:
+        """
+        yields a queue receiving every change of the given jobs until the context exits
+        """
+        queue: asyncio.Queue[Media] = asyncio.Queue(self.queue_size)
+        for job_id in job_ids:
+            self._subscribers[job_id].add(queue)
+        try:
+            yield queue
+        finally:
+            for job_id in job_ids:
+                queues = self._subscribers.get(job_id)
+                if queues is None:
+                    continue
+                queues.discard(queue)
+                if not queues:
+                    del self._subscribers[job_id]
+
+    def _dispatch(self, media: Media):
+        for queue in self._subscribers.get(media.job_id, ()):
+            if queue.full():
+                # each message is a full snapshot of the media, the oldest one can be dropped safely
+                queue.get_nowait()
+            queue.put_nowait(media)
+
+    async def _listen(self):
+        while True:
+            try:
+                async with self.redis.pubsub() as pubsub:
+                    await pubsub.subscribe(self.channel)
+                    async for message in pubsub.listen():
+                        if message["type"] != "message":
+                            continue
+                        try:
+                            media = Media.model_validate_json(message["data"])
+                        except ValidationError as error:
+                            # a bad message mustn't stop the streams of the other medias
+                            logger.warning(
+                                "invalid media status message", exc_info=error
+                            )
+                            continue
+                        self._dispatch(media)
+            except RedisError as error:
+                logger.warning("media status subscription failed", exc_info=error)
+                await asyncio.sleep(self.reconnect_delay_seconds)
+
+
+media_status_broadcaster: MediaStatusBroadcaster | None = None
+
+
+def setup_media_status_broadcaster(redis: Redis) -> MediaStatusBroadcaster:
+    global media_status_broadcaster
+    media_status_broadcaster = MediaStatusBroadcaster(redis)
+    media_status_broadcaster.start()
+    return media_status_broadcaster
+
+
+async def close_media_status_broadcaster():
+    global media_status_broadcaster
+    if media_status_broadcaster is not None:
+        await media_status_broadcaster.stop()
+    media_status_broadcaster = None
+
+
+def get_media_status_broadcaster() -> MediaStatusBroadcaster:
+    if media_status_broadcaster is None:
+        raise ValueError(
+            "you must call setup_media_status_broadcaster function before streaming media status"
+        )
+    return media_status_broadcaster
@@ -0,0 +1,126 @@
+import logging
+from typing import Annotated
+
+from fastapi import Depends
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+
+from app.core.config import settings
+from app.media.job_id import JobId
+from app.media.media import Media
+
+logger = logging.getLogger(__name__)
+
+
+class MediaStatusCache:
+    """
+    Redis cache of medias keyed by job id, kept up to date by MediaRepository on every write.
+    Medias in a terminal status don't change anymore, so they are cached longer.
+    """
+
+    def __init__(
+        self,
+        redis: Redis,
+        ttl_seconds: int,
+        terminal_ttl_seconds: int,
+        key_prefix: str = "media_status:",
+    ):
+        self.redis = redis
+        self.ttl_seconds = ttl_seconds
+        self.terminal_ttl_seconds = terminal_ttl_seconds
+        self.key_prefix = key_prefix
+
+    async def get(self, job_id: JobId) -> Media | None:
+        try:
+            value = await self.redis.get(f"{self.key_prefix}{job_id}")
+        except RedisError as error:
+            logger.warning("unable to read media status from redis", exc_info=error)
+            return None
+        if value is None:
+            return None
+        return Media.model_validate_json(value)
+
+    async def get_many(self, job_ids: list[JobId]) -> dict[JobId, Media]:
+        if not job_ids:
+            return {}
+        try:
+            values = await self.redis.mget(
+                [f"{self.key_prefix}{job_id}" for job_id in job_ids]
+            )
+        except RedisError as error:
+            logger.warning("unable to read media status from redis", exc_info=error)
+            return {}
+        return {
+            job_id: Media.model_validate_json(value)
+            for job_id, value in zip(job_ids, values)
+            if value is not None
+        }
+
+    async def set(self, media: Media):
+        if media.job_id is None:
+            return
+        ttl = (
+            self.terminal_ttl_seconds if media.status.is_terminal else self.ttl_seconds
+        )
+        try:
+            await self.redis.set(
+                f"{self.key_prefix}{media.job_id}", media.model_dump_json(), ex=ttl
+            )
+        except RedisError as error:
+            logger.warning("unable to store media status in redis", exc_info=error)
+            await self.invalidate(media.job_id)
+
+    async def set_many(self, medias: list[Media]):
+        try:
+            async with self.redis.pipeline(transaction=False) as pipeline:
+                for media in medias:
+                    if media.job_id is not None:
+                        pipeline.set(
+                            f"{self.key_prefix}{media.job_id}",
+                            media.model_dump_json(),
+                            ex=self._ttl(media),
+                        )
+                await pipeline.execute()
+        except RedisError as error:
+            logger.warning("unable to store media status in redis", exc_info=error)
+
+    def _ttl(self, media: Media) -> int:
+        return (
+            self.terminal_ttl_seconds if media.status.is_terminal else self.ttl_seconds
+        )
+
+    async def invalidate(self, job_id: JobId):
+        try:
+            await self.redis.delete(f"{self.key_prefix}{job_id}")
+        except RedisError as error:
+            logger.warning("unable to invalidate media status in redis", exc_info=error)
+
+
+media_status_cache: MediaStatusCache | None = None
+
+
+def setup_media_status_cache(redis: Redis) -> MediaStatusCache:
+    global media_status_cache
+    media_status_cache = MediaStatusCache(
+        redis=redis,
+        ttl_seconds=settings.MEDIA_STATUS_CACHE_TTL_SECONDS,
+        terminal_ttl_seconds=settings.MEDIA_STATUS_CACHE_TERMINAL_TTL_SECONDS,
+    )
+    return media_status_cache
+
+
+def close_media_status_cache():
+    global media_status_cache
+    media_status_cache = None
+
+
+def get_media_status_cache() -> MediaStatusCache | None:
+    """
+    the cache is optional, repositories work without it
+    """
+    return media_status_cache
+
+
+MediaStatusCacheDep = Annotated[
+    MediaStatusCache | None, Depends(get_media_status_cache)
+]
@@ -0,0 +1,55 @@
+import logging
+from typing import Annotated
+
+from fastapi import Depends
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+
+from app.core.config import settings
+from app.media.media import Media
+
+logger = logging.getLogger(__name__)
+
+
+class MediaStatusNotifier:
+    """
+    Publishes every media change on a redis channel, consumed by MediaStatusBroadcaster.
+    """
+
+    def __init__(self, redis: Redis, channel: str = settings.MEDIA_STATUS_CHANNEL):
+        self.redis = redis
+        self.channel = channel
+
+    async def publish(self, media: Media):
+        if media.job_id is None:
+            return
+        try:
+            await self.redis.publish(self.channel, media.model_dump_json())
+        except RedisError as error:
+            logger.warning("unable to publish media status", exc_info=error)
+
+
+media_status_notifier: MediaStatusNotifier | None = None
+
+
+def setup_media_status_notifier(redis: Redis) -> MediaStatusNotifier:
+    global media_status_notifier
+    media_status_notifier = MediaStatusNotifier(redis)
+    return media_status_notifier
+
+
+def close_media_status_notifier():
+    global media_status_notifier
+    media_status_notifier = None
+
+
+def get_media_status_notifier() -> MediaStatusNotifier | None:
+    """
+    the notifier is optional, repositories work without it
+    """
+    return media_status_notifier
+
+
+MediaStatusNotifierDep = Annotated[
+    MediaStatusNotifier | None, Depends(get_media_status_notifier)
+]
@@ -0,0 +1,85 @@
+import uuid
+from datetime import datetime, timezone
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import func, select, text, update
+from sqlalchemy.dialects import postgresql
+
+from app.media.api.schemas import MediaQueueOut
+from app.media.db_media import Medias
+from app.media.media_repository import ACTIVE_STATUSES, MediaRepository
+from app.media.media_status import MediaStatus
+
+LONG_AGO = datetime(2000, 1, 1, tzinfo=timezone.utc)
+
+
+@pytest.mark.asyncio
+async def test_media_queue_reports_overdue_and_stuck_medias(
+    session, media_repository: MediaRepository, test_client: TestClient
+):
+    overdue_media = await media_repository.create_media("overdue", uuid.uuid4())
+    stuck_media = await media_repository.create_media("stuck", uuid.uuid4())
+    waiting_media = await media_repository.create_media("waiting", uuid.uuid4())
+    async with session() as db_session:
+        await db_session.execute(
+            update(Medias)
+            .where(Medias.id == overdue_media.id)
+            .values(next_run=LONG_AGO)
+        )
+        await db_session.execute(
+            update(Medias)
+            .where(Medias.id == stuck_media.id)
+            .values(status=MediaStatus.PROCESSING, updated_at=LONG_AGO)
+        )
+        await db_session.commit()
+
+    response = test_client.get("/tools/media_queue", params={"limit": 1000})
+    assert response.status_code == 200, response.text
+    media_queue = MediaQueueOut.model_validate_json(response.text)
+    assert set(media_queue.by_status) == set(ACTIVE_STATUSES)
+    assert all(count >= 1 for count in media_queue.by_status.values())
+    overdue_ids = [media.id for media in media_queue.overdue]
+    stuck_ids = [media.id for media in media_queue.stuck]
+    assert overdue_media.id in overdue_ids
+    assert stuck_media.id in stuck_ids
+    assert waiting_media.id not in overdue_ids + stuck_ids
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "statement, index",
+    [
+        (
+            select(Medias.id)
+            .where(Medias.status == MediaStatus.IN_QUEUE, Medias.next_run < LONG_AGO)
+            .order_by(Medias.next_run),
+            "ix_medias_active_status_next_run",
+        ),
+        (
+            select(Medias.id)
+            .where(
+                Medias.status == MediaStatus.PROCESSING,
+                Medias.updated_at < LONG_AGO,
+            )
+            .order_by(Medias.updated_at),
+            "ix_medias_processing_updated_at",
+        ),
+        (
+            select(Medias.status, func.count())
+            .where(Medias.status.in_(ACTIVE_STATUSES))
+            .group_by(Medias.status),
+            "ix_medias_active_status_next_run",
+        ),
+        (select(Medias.id).where(Medias.job_id == uuid.uuid4()), "job_id_unique"),
+    ],
+)
+async def test_media_queue_queries_use_partial_indexes(session, statement, index):
+    query = statement.compile(
+        dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}
+    )
+    async with session() as db_session:
+        await db_session.execute(text("set local enable_seqscan = off"))
+        plan = "\n".join((await db_session.execute(text(f"explain {query}"))).scalars())
+    assert "Seq Scan" not in plan
+    assert index in plan
@@ -1,7 +1,39 @@
+import os
+import threading
+import uuid
+
+import pytest
+from redis.client import Pipeline
+from redis.exceptions import ConnectionError as RedisConnectionError
+from sqlalchemy import select, text
+from sqlalchemy.dialects import postgresql
 from starlette.testclient import TestClient
 
-from app.media.api.schemas import MediaOut
+from app.core.database import get_db
+from app import main
+from app.core.redis import get_redis
+from app.main import fastapi_app
+from app.media.api.schemas import (
+    MediaOut,
+    MediaBatchOut,
+    MediaBulkStatusOut,
+    MediasPageOut,
+)
+from app.media.db_media import Medias
+from app.media.media_priority import MediaPriority
+from app.media.media import Media
+from app.media.media_repository import MediaRepository, _prefix_pattern
 from app.media.media_status import MediaStatus
+from app.media.media_status_cache import get_media_status_cache
+from app.media.media_status_notifier import get_media_status_notifier
+from app.media_generator.prompt_result_cache import (
+    PromptResultCache,
+    get_prompt_result_cache,
+)
+from app.media_generator.storage import get_storage
+from app.media_generator.stored_media import StoredMedia
+from app.tasks import celery_tasks
+from app.tasks.celery_tasks import create_media
 
 
 def test_create_media(test_client: TestClient):
@@ -28,3 +60,396 @@ def test_get_media_status(test_client: TestClient):
 
     media_response = MediaOut.model_validate_json(response.text)
     assert media_response == MediaOut.model_validate(media.model_dump())
+
+
+def test_create_media_batch(test_client: TestClient):
+    prompts = [f"test prompt {index}" for index in range(5)]
+    body = {"items": [{"prompt": prompt} for prompt in prompts]}
+    response = test_client.post("/media/generate/batch", json=body)
+    assert response.status_code == 200, response.text
+    items = MediaBatchOut.model_validate_json(response.text).items
+    assert [item.media.prompt for item in items] == prompts
+    assert all(item.error is None for item in items)
+    assert all(item.media.status == MediaStatus.IN_QUEUE for item in items)
+
+    for item in items:
+        response = test_client.get(f"/media/status/{item.media.job_id}")
+        assert response.status_code == 200, response.text
+        assert MediaOut.model_validate_json(response.text).id == item.media.id
+
+
+def test_create_media_batch_reports_publishing_errors(
+    test_client: TestClient, monkeypatch
+):
+    apply_async = create_media.apply_async
+    published = []
+
+    def failing_apply_async(*args, **kwargs):
+        published.append(kwargs["kwargs"]["media_id"])
+        if len(published) == 2:
+            raise ConnectionError("broker unavailable")
+        return apply_async(*args, **kwargs)
+
+    monkeypatch.setattr(create_media, "apply_async", failing_apply_async)
+
+    body = {"items": [{"prompt": "first"}, {"prompt": "second"}, {"prompt": "third"}]}
+    response = test_client.post("/media/generate/batch", json=body)
+    assert response.status_code == 200, response.text
+    items = MediaBatchOut.model_validate_json(response.text).items
+    assert [item.error is None for item in items] == [True, False, True]
+    assert items[1].error.error_code == "TASK_PUBLISH_FAILED"
+    assert items[1].media.status == MediaStatus.ERROR
+    assert items[2].media.status == MediaStatus.IN_QUEUE
+
+
+def test_create_media_batch_reports_a_failed_pipeline(
+    test_client: TestClient, monkeypatch
+):
+    def failing_execute(self, raise_on_error=True):
+        self.reset()
+        raise ConnectionError("broker unavailable")
+
+    # the tasks of the batch are published with a single pipeline
+    monkeypatch.setattr(Pipeline, "execute", failing_execute)
+
+    body = {"items": [{"prompt": "first"}, {"prompt": "second"}]}
+    response = test_client.post("/media/generate/batch", json=body)
+    assert response.status_code == 200, response.text
+    items = MediaBatchOut.model_validate_json(response.text).items
+    assert all(item.error.error_code == "TASK_PUBLISH_FAILED" for item in items)
+    assert all(item.media.status == MediaStatus.ERROR for item in items)
+
+
+def test_create_media_batch_without_the_pipelined_publish(
+    test_client: TestClient, monkeypatch
+):
+    def failing_execute(self, raise_on_error=True):
+        raise AssertionError("the batch mustn't be pipelined")
+
+    monkeypatch.setattr(Pipeline, "execute", failing_execute)
+    # a kombu version without the channel internals the pipeline relies on
+    monkeypatch.setattr(
+        celery_tasks,
+        "_PIPELINED_CHANNEL_ATTRIBUTES",
+        (*celery_tasks._PIPELINED_CHANNEL_ATTRIBUTES, "_removed_attribute"),
+    )
+
+    body = {"items": [{"prompt": "first"}, {"prompt": "second"}]}
+    response = test_client.post("/media/generate/batch", json=body)
+    assert response.status_code == 200, response.text
+    items = MediaBatchOut.model_validate_json(response.text).items
+    assert all(item.error is None for item in items)
+    assert all(item.media.status == MediaStatus.IN_QUEUE for item in items)
+
+
+def read_status_events(response) -> list[MediaOut]:
+    return [
+        MediaOut.model_validate_json(line.removeprefix("data: "))
+        for line in response.iter_lines()
+        if line.startswith("data: ")
+    ]
+
+
+def finish_media(test_client: TestClient, media: MediaOut):
+    async def finish():
+        media_repository = MediaRepository(
+            get_db(), get_media_status_cache(), get_media_status_notifier()
+        )
+        await media_repository.get_and_update_status(
+            media.id, MediaStatus.IN_QUEUE, MediaStatus.PROCESSING
+        )
+        await media_repository.finish_media_generation(
+            media.id, "s3://bucket/key.png", MediaStatus.COMPLETED
+        )
+
+    test_client.portal.call(finish)
+
+
+def test_stream_media_status(test_client: TestClient):
+    response = test_client.post("/media/generate", json={"prompt": "test prompt"})
+    media = MediaOut.model_validate_json(response.text)
+    threading.Timer(0.5, finish_media, (test_client, media)).start()
+
+    with test_client.stream("GET", f"/media/status/{media.job_id}/stream") as response:
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/event-stream")
+        events = read_status_events(response)
+
+    assert [event.status for event in events] == [
+        MediaStatus.IN_QUEUE,
+        MediaStatus.PROCESSING,
+        MediaStatus.COMPLETED,
+    ]
+    assert all(event.job_id == media.job_id for event in events)
+
+
+def test_stream_medias_status(test_client: TestClient):
+    medias = []
+    for _ in range(2):
+        response = test_client.post("/media/generate", json={"prompt": "test prompt"})
+        medias.append(MediaOut.model_validate_json(response.text))
+    finish_media(test_client, medias[0])
+    threading.Timer(0.5, finish_media, (test_client, medias[1])).start()
+
+    query = "&".join(f"job_ids={media.job_id}" for media in medias)
+    with test_client.stream("GET", f"/media/status/stream?{query}") as response:
+        assert response.status_code == 200
+        events = read_status_events(response)
+
+    assert [(event.job_id, event.status) for event in events] == [
+        (medias[0].job_id, MediaStatus.COMPLETED),
+        (medias[1].job_id, MediaStatus.IN_QUEUE),
+        (medias[1].job_id, MediaStatus.PROCESSING),
+        (medias[1].job_id, MediaStatus.COMPLETED),
+    ]
+
+
+def test_get_medias_status(test_client: TestClient):
+    medias = []
+    for _ in range(3):
+        response = test_client.post("/media/generate", json={"prompt": "test prompt"})
+        medias.append(MediaOut.model_validate_json(response.text))
+    unknown_id = str(uuid.uuid4())
+
+    body = {
+        "job_ids": [str(media.job_id) for media in medias[:2]] + [unknown_id],
+        "media_ids": [str(medias[2].id), unknown_id],
+    }
+    response = test_client.post("/media/status/bulk", json=body)
+    assert response.status_code == 200, response.text
+    bulk_status = MediaBulkStatusOut.model_validate_json(response.text)
+    assert bulk_status.by_job_id == {media.job_id: media for media in medias[:2]}
+    assert bulk_status.by_media_id == {medias[2].id: medias[2]}
+    assert [str(job_id) for job_id in bulk_status.unknown_job_ids] == [unknown_id]
+    assert [str(media_id) for media_id in bulk_status.unknown_media_ids] == [unknown_id]
+
+    response = test_client.post("/media/status/bulk", json={})
+    assert response.status_code == 422, response.text
+
+
+def test_create_media_reuses_prompt_result(test_client: TestClient, monkeypatch):
+    result_cache = PromptResultCache(
+        get_redis(), ttl_seconds=60, key_prefix=f"test:{uuid.uuid4()}:"
+    )
+    fastapi_app.dependency_overrides[get_prompt_result_cache] = lambda: result_cache
+    published = []
+    monkeypatch.setattr(
+        create_media, "apply_async", lambda *args, **kwargs: published.append(kwargs)
+    )
+    try:
+        stored_media = StoredMedia(
+            uri="s3://bucket/cached.png", sha256="0" * 64, size_bytes=10
+        )
+        test_client.portal.call(result_cache.set, "a cached  prompt", stored_media)
+
+        response = test_client.post(
+            "/media/generate", json={"prompt": " a cached prompt"}
+        )
+        assert response.status_code == 200, response.text
+        media = MediaOut.model_validate_json(response.text)
+        assert media.status == MediaStatus.COMPLETED
+        assert media.sha256 == stored_media.sha256
+        assert published == []
+
+        body = {"prompt": "a cached prompt", "bypass_cache": True}
+        response = test_client.post("/media/generate", json=body)
+        assert MediaOut.model_validate_json(response.text).status == (
+            MediaStatus.IN_QUEUE
+        )
+        assert len(published) == 1
+        stats = test_client.portal.call(result_cache.stats)
+        assert stats == {"hits": 1, "misses": 0, "hit_rate": 1.0}
+    finally:
+        fastapi_app.dependency_overrides.pop(get_prompt_result_cache)
+
+
+def test_create_media_routes_by_priority(test_client: TestClient, monkeypatch):
+    queues = []
+    apply_async = create_media.apply_async
+
+    def recording_apply_async(*args, **kwargs):
+        queues.append(kwargs["queue"])
+        return apply_async(*args, **kwargs)
+
+    monkeypatch.setattr(create_media, "apply_async", recording_apply_async)
+
+    response = test_client.post(
+        "/media/generate", json={"prompt": "urgent", "priority": "HIGH"}
+    )
+    assert MediaOut.model_validate_json(response.text).priority == MediaPriority.HIGH
+    body = {"items": [{"prompt": "bulk"}, {"prompt": "normal", "priority": "NORMAL"}]}
+    response = test_client.post("/media/generate/batch", json=body)
+    items = MediaBatchOut.model_validate_json(response.text).items
+    assert [item.media.priority for item in items] == [
+        MediaPriority.LOW,
+        MediaPriority.NORMAL,
+    ]
+    assert queues == ["media_high", "media_low", "media_normal"]
+
+
+def test_metrics(test_client: TestClient):
+    response = test_client.post("/media/generate", json={"prompt": "test prompt"})
+    media = MediaOut.model_validate_json(response.text)
+    test_client.get(f"/media/status/{media.job_id}")
+
+    response = test_client.get("/metrics")
+    assert response.status_code == 200
+    metrics = response.text
+    assert (
+        'http_request_duration_seconds_count{method="GET",'
+        'route="/media/status/{job_id}",status_code="200"}'
+    ) in metrics
+    assert 'media_status_changes_total{status="IN_QUEUE"}' in metrics
+    assert 'celery_queue_depth{queue="media_normal"}' in metrics
+    assert "db_pool_connections_in_use" in metrics
+
+
+def test_metrics_without_redis(test_client: TestClient, monkeypatch):
+    async def unavailable_queue_depths(redis):
+        raise RedisConnectionError("redis unavailable")
+
+    monkeypatch.setattr(main, "celery_queue_depths", unavailable_queue_depths)
+
+    response = test_client.get("/metrics")
+    assert response.status_code == 200
+    assert "http_request_duration_seconds_count" in response.text
+    assert "celery_queue_depth" not in response.text
+
+
+def test_search_medias_with_keyset_pagination(test_client: TestClient):
+    prefix = f"search {uuid.uuid4()} 100%_"
+    prompts = [f"{prefix} {index}" for index in range(5)]
+    for prompt in prompts:
+        response = test_client.post("/media/generate", json={"prompt": prompt})
+        assert response.status_code == 200, response.text
+    # % and _ of the prefix are matched literally
+    response = test_client.post(
+        "/media/generate", json={"prompt": prefix.replace("%_", "%x")}
+    )
+    assert response.status_code == 200, response.text
+
+    found = []
+    params = {"prompt_prefix": prefix, "status": "IN_QUEUE", "limit": 2}
+    for _ in range(3):
+        response = test_client.get("/media", params=params)
+        assert response.status_code == 200, response.text
+        page = MediasPageOut.model_validate_json(response.text)
+        found += [media.prompt for media in page.items]
+        params["cursor"] = page.next_cursor
+    assert params["cursor"] is None
+    assert found == list(reversed(prompts))
+
+
+def test_search_medias_rejects_invalid_cursor(test_client: TestClient):
+    response = test_client.get("/media", params={"cursor": "not a cursor"})
+    assert response.status_code == 400
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "condition, index",
+    [
+        (Medias.status == MediaStatus.ERROR, "ix_medias_status_created_at_id"),
+        (
+            Medias.prompt.like(_prefix_pattern("cat"), escape="/"),
+            "ix_medias_prompt_pattern",
+        ),
+    ],
+)
+async def test_search_medias_uses_indexes(session, condition, index):
+    statement = (
+        select(Medias.id)
+        .where(condition)
+        .order_by(Medias.created_at.desc(), Medias.id.desc())
+        .limit(100)
+    )
+    query = statement.compile(
+        dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}
+    )
+    # text() escapes the % of the like pattern again
+    query = str(query).replace("%%", "%")
+    async with session() as db_session:
+        await db_session.execute(text("set local enable_seqscan = off"))
+        plan = "\n".join((await db_session.execute(text(f"explain {query}"))).scalars())
+    assert "Seq Scan" not in plan
+    assert index in plan
+
+
+def completed_media(test_client: TestClient, content: bytes) -> Media:
+    async def create() -> Media:
+        async def stream():
+            yield content
+
+        stored_media = await get_storage().save_bytes(stream())
+        return await MediaRepository(get_db()).create_completed_media(
+            "test prompt", uuid.uuid4(), stored_media
+        )
+
+    return test_client.portal.call(create)
+
+
+def test_get_media_content(test_client: TestClient):
+    content = os.urandom(200_000)
+    media = completed_media(test_client, content)
+    url = f"/media/content/{media.id}/raw"
+
+    response = test_client.get(url)
+    assert response.status_code == 200, response.text
+    assert response.content == content
+    assert response.headers["content-length"] == str(len(content))
+    assert response.headers["accept-ranges"] == "bytes"
+    assert response.headers["etag"] == f'"{media.sha256}"'
+    assert response.headers["content-type"] == "image/png"
+
+    for range_header, first_byte, last_byte in [
+        ("bytes=10-19", 10, 19),
+        ("bytes=199990-", 199990, 199999),
+        ("bytes=-5", 199995, 199999),
+        ("bytes=100000-999999", 100000, 199999),
+    ]:
+        response = test_client.get(url, headers={"Range": range_header})
+        assert response.status_code == 206, range_header
+        assert response.content == content[first_byte : last_byte + 1]
+        assert response.headers["content-range"] == (
+            f"bytes {first_byte}-{last_byte}/{len(content)}"
+        )
+
+    response = test_client.get(url, headers={"Range": "bytes=200000-"})
+    assert response.status_code == 416
+    assert response.headers["content-range"] == f"bytes */{len(content)}"
+    # unsupported ranges are ignored
+    response = test_client.get(url, headers={"Range": "bytes=0-1,5-6"})
+    assert response.status_code == 200
+    assert response.content == content
+
+
+def test_get_media_content_conditional_requests(test_client: TestClient):
+    content = os.urandom(1000)
+    media = completed_media(test_client, content)
+    url = f"/media/content/{media.id}/raw"
+    response = test_client.get(url)
+    etag = response.headers["etag"]
+    last_modified = response.headers["last-modified"]
+
+    for headers in [
+        {"If-None-Match": etag},
+        {"If-None-Match": f'"other", W/{etag}'},
+        {"If-Modified-Since": last_modified},
+    ]:
+        response = test_client.get(url, headers=headers)
+        assert response.status_code == 304, headers
+        assert response.content == b""
+        assert response.headers["etag"] == etag
+    response = test_client.get(url, headers={"If-None-Match": '"other"'})
+    assert response.status_code == 200
+
+    range_headers = {"Range": "bytes=0-9"}
+    response = test_client.get(url, headers=range_headers | {"If-Range": etag})
+    assert response.status_code == 206
+    response = test_client.get(url, headers=range_headers | {"If-Range": '"stale"'})
+    assert response.status_code == 200
+    assert response.content == content
+
+    response = test_client.post("/media/generate", json={"prompt": "test prompt"})
+    media_id = MediaOut.model_validate_json(response.text).id
+    assert test_client.get(f"/media/content/{media_id}/raw").status_code == 409
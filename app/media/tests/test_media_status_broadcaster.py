@@ -0,0 +1,37 @@
+import asyncio
+import uuid
+
+import pytest
+from redis.asyncio import Redis
+
+from app.core.config import settings
+from app.media.media_repository import MediaRepository
+from app.media.media_status_broadcaster import MediaStatusBroadcaster
+
+
+async def wait_for_subscription(redis: Redis, channel: str):
+    async with asyncio.timeout(5):
+        while (await redis.pubsub_numsub(channel))[0][1] == 0:
+            await asyncio.sleep(0.01)
+
+
+@pytest.mark.asyncio
+async def test_invalid_message_does_not_stop_the_broadcast(
+    media_repository: MediaRepository,
+):
+    redis = Redis.from_url(str(settings.REDIS_URL))
+    channel = f"test_media_status:{uuid.uuid4()}"
+    broadcaster = MediaStatusBroadcaster(redis, channel)
+    broadcaster.start()
+    try:
+        media = await media_repository.create_media("test prompt", uuid.uuid4())
+        async with broadcaster.subscribe([media.job_id]) as queue:
+            await wait_for_subscription(redis, channel)
+            await redis.publish(channel, "not a media")
+            await redis.publish(channel, '{"id": "schema skew"}')
+            await redis.publish(channel, media.model_dump_json())
+            async with asyncio.timeout(5):
+                assert await queue.get() == media
+    finally:
+        await broadcaster.stop()
+        await redis.aclose()
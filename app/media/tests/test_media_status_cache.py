@@ -0,0 +1,54 @@
+import uuid
+
+import pytest
+from redis.asyncio import Redis
+
+from app.core.config import settings
+from app.media.media_repository import MediaRepository
+from app.media.media_status import MediaStatus
+from app.media.media_status_cache import MediaStatusCache
+
+
+@pytest.mark.asyncio
+async def test_media_status_cache_follows_status_transitions(session):
+    redis = Redis.from_url(str(settings.REDIS_URL))
+    status_cache = MediaStatusCache(
+        redis, 10, 3600, f"test_media_status:{uuid.uuid4()}:"
+    )
+    media_repository = MediaRepository(session, status_cache)
+    try:
+        media = await media_repository.create_media("test prompt", uuid.uuid4())
+        assert await status_cache.get(media.job_id) == media
+
+        media = await media_repository.get_and_update_status(
+            media.id, MediaStatus.IN_QUEUE, MediaStatus.PROCESSING
+        )
+        assert (await status_cache.get(media.job_id)).status is MediaStatus.PROCESSING
+
+        media = await media_repository.finish_media_generation(
+            media.id, "s3://bucket/key.png", MediaStatus.COMPLETED
+        )
+        cached_media = await media_repository.get_from_job_id(media.job_id)
+        assert cached_media == media
+        assert cached_media.status is MediaStatus.COMPLETED
+        ttl = await redis.ttl(f"{status_cache.key_prefix}{media.job_id}")
+        assert 10 < ttl <= 3600
+    finally:
+        await redis.aclose()
+
+
+@pytest.mark.asyncio
+async def test_media_status_cache_is_read_through(session):
+    redis = Redis.from_url(str(settings.REDIS_URL))
+    status_cache = MediaStatusCache(
+        redis, 10, 3600, f"test_media_status:{uuid.uuid4()}:"
+    )
+    try:
+        media = await MediaRepository(session).create_media("test prompt", uuid.uuid4())
+        assert await status_cache.get(media.job_id) is None
+
+        media_repository = MediaRepository(session, status_cache)
+        assert await media_repository.get_from_job_id(media.job_id) == media
+        assert await status_cache.get(media.job_id) == media
+    finally:
+        await redis.aclose()
@@ -0,0 +1 @@
+from .db_stage_durations import MediaStageDurations  # noqa
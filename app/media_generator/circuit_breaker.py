@@ -0,0 +1,202 @@
+import logging
+from datetime import datetime, timezone
+from enum import StrEnum
+from typing import Annotated
+
+from fastapi import Depends
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+
+from app.core.config import settings
+from app.core.model import BasicModel
+
+logger = logging.getLogger(__name__)
+
+# the breaker is closed while the state hash has no opened_until, open until opened_until and half-open after it,
+# when a single caller at a time takes the probe key to try the provider again.
+# returns 0 when the call is allowed, -1 when it's the probe, the epoch milliseconds at which to try again otherwise
+_ACQUIRE_SCRIPT = """
+local opened_until = tonumber(redis.call("hget", KEYS[1], "opened_until"))
+if not opened_until then
+    return 0
+end
+local time = redis.call("time")
+local now = tonumber(time[1]) * 1000 + math.floor(tonumber(time[2]) / 1000)
+if now < opened_until then
+    return opened_until
+end
+if redis.call("set", KEYS[2], "1", "nx", "px", ARGV[1]) then
+    return -1
+end
+return now + math.max(redis.call("pttl", KEYS[2]), 0)
+"""
+# opens the breaker after ARGV[1] consecutive failures, or again when the half-open probe fails
+_RECORD_FAILURE_SCRIPT = """
+local time = redis.call("time")
+local now = tonumber(time[1]) * 1000 + math.floor(tonumber(time[2]) / 1000)
+local failures = redis.call("hincrby", KEYS[1], "failures", 1)
+local opened_until = tonumber(redis.call("hget", KEYS[1], "opened_until"))
+if opened_until and now < opened_until then
+    return 0
+end
+if opened_until or failures >= tonumber(ARGV[1]) then
+    redis.call("hset", KEYS[1], "opened_until", now + tonumber(ARGV[2]))
+    redis.call("del", KEYS[2])
+    return 1
+end
+return 0
+"""
+
+
+class CircuitState(StrEnum):
+    CLOSED = "CLOSED"
+    OPEN = "OPEN"
+    HALF_OPEN = "HALF_OPEN"
+
+
+class CircuitBreakerState(BasicModel):
+    state: CircuitState
+    consecutive_failures: int
+    reopen_at: datetime | None = None
+
+
+class CircuitOpenError(Exception):
+    def __init__(self, reopen_at: datetime):
+        super().__init__(f"circuit breaker open until {reopen_at.isoformat()}")
+        self.reopen_at = reopen_at
+
+
+def _from_epoch_ms(epoch_ms: int) -> datetime:
+    return datetime.fromtimestamp(epoch_ms / 1000, tz=timezone.utc)
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker around the media generator model, shared by every worker through redis.
+
+    failure_threshold consecutive GenerateMediaServiceError open it for open_seconds, calls are then refused with
+    CircuitOpenError carrying the time at which to try again. Once that time has passed the breaker is half-open: a
+    single call probes the provider, closing the breaker if it succeeds and opening it again if it fails.
+    """
+
+    def __init__(
+        self,
+        redis: Redis,
+        failure_threshold: int,
+        open_seconds: float,
+        key_prefix: str = "circuit_breaker:",
+    ):
+        self.redis = redis
+        self.failure_threshold = failure_threshold
+        self.open_seconds = open_seconds
+        self.key = f"{key_prefix}state"
+        self.probe_key = f"{key_prefix}probe"
+        self._acquire = redis.register_script(_ACQUIRE_SCRIPT)
+        self._record_failure = redis.register_script(_RECORD_FAILURE_SCRIPT)
+
+    async def acquire(self) -> bool:
+        """
+        :return: whether the call is the half-open probe, which must end with record_success, record_failure or
+        release_probe so the next caller can probe the provider.
+        :raise CircuitOpenError: if the provider mustn't be called.
+        if redis is unavailable the call is let through.
+        """
+        try:
+            reopen_at_ms = await self._acquire(
+                keys=[self.key, self.probe_key], args=[self._open_ms]
+            )
+        except RedisError as error:
+            logger.warning("circuit breaker unavailable", exc_info=error)
+            return False
+        if reopen_at_ms > 0:
+            raise CircuitOpenError(_from_epoch_ms(reopen_at_ms))
+        return reopen_at_ms < 0
+
+    async def release_probe(self):
+        """
+        frees the probe of a call that didn't tell whether the provider is up, the breaker stays half-open
+        """
+        try:
+            await self.redis.delete(self.probe_key)
+        except RedisError as error:
+            logger.warning("unable to release circuit breaker probe", exc_info=error)
+
+    async def record_success(self):
+        try:
+            await self.redis.delete(self.key, self.probe_key)
+        except RedisError as error:
+            logger.warning("unable to close circuit breaker", exc_info=error)
+
+    async def record_failure(self):
+        try:
+            opened = await self._record_failure(
+                keys=[self.key, self.probe_key],
+                args=[self.failure_threshold, self._open_ms],
+            )
+        except RedisError as error:
+            logger.warning("unable to record circuit breaker failure", exc_info=error)
+            return
+        if opened:
+            logger.warning(f"circuit breaker opened for {self.open_seconds} seconds")
+
+    async def state(self) -> CircuitBreakerState | None:
+        """
+        None when redis is unavailable
+        """
+        try:
+            failures, opened_until = await self.redis.hmget(
+                self.key, "failures", "opened_until"
+            )
+            if opened_until is not None:
+                seconds, microseconds = await self.redis.time()
+        except RedisError as error:
+            logger.warning("unable to read circuit breaker state", exc_info=error)
+            return None
+        consecutive_failures = int(failures or 0)
+        if opened_until is None:
+            return CircuitBreakerState(
+                state=CircuitState.CLOSED, consecutive_failures=consecutive_failures
+            )
+        now_ms = seconds * 1000 + microseconds // 1000
+        reopen_at = _from_epoch_ms(int(opened_until))
+        return CircuitBreakerState(
+            state=CircuitState.OPEN
+            if now_ms < int(opened_until)
+            else CircuitState.HALF_OPEN,
+            consecutive_failures=consecutive_failures,
+            reopen_at=reopen_at,
+        )
+
+    @property
+    def _open_ms(self) -> int:
+        return int(self.open_seconds * 1000)
+
+
+circuit_breaker: CircuitBreaker | None = None
+
+
+def setup_circuit_breaker(redis: Redis) -> CircuitBreaker | None:
+    global circuit_breaker
+    if not settings.CIRCUIT_BREAKER_ENABLED:
+        return None
+    circuit_breaker = CircuitBreaker(
+        redis=redis,
+        failure_threshold=settings.CIRCUIT_BREAKER_FAILURE_THRESHOLD,
+        open_seconds=settings.CIRCUIT_BREAKER_OPEN_SECONDS,
+    )
+    return circuit_breaker
+
+
+def close_circuit_breaker():
+    global circuit_breaker
+    circuit_breaker = None
+
+
+def get_circuit_breaker() -> CircuitBreaker | None:
+    """
+    see CIRCUIT_BREAKER_ENABLED
+    """
+    return circuit_breaker
+
+
+CircuitBreakerDep = Annotated[CircuitBreaker | None, Depends(get_circuit_breaker)]
@@ -0,0 +1,23 @@
+from datetime import datetime
+
+from sqlalchemy import TIMESTAMP, BigInteger, Float, String
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.core.database import Basic
+
+
+class MediaStageDurations(Basic):
+    """
+    hourly histograms of the media generation stage durations, one row per bucket.
+    count and sum_seconds are those of the durations falling in the bucket, up to le_seconds included.
+    """
+
+    __tablename__ = "media_stage_durations"
+
+    period_start: Mapped[datetime] = mapped_column(
+        TIMESTAMP(timezone=True), primary_key=True
+    )
+    stage: Mapped[str] = mapped_column(String, primary_key=True)
+    le_seconds: Mapped[float] = mapped_column(Float, primary_key=True)
+    count: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    sum_seconds: Mapped[float] = mapped_column(Float, nullable=False)
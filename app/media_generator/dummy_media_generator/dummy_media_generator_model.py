@@ -22,7 +22,7 @@ class DummyMediaGeneratorModel(MediaGeneratorModel):
     def __init__(
         self,
         error_simulator: ErrorSimulator,
-        delay: int = 0,
+        delay: float = 0,
     ):
         self.error_simulator = error_simulator
         self.delay = delay
@@ -1,10 +1,23 @@
 import logging
+import time
 import traceback
 from datetime import datetime, timezone, timedelta
 
 from app.core.exceptions import ResourceNotFoundException
-from app.media_generator.media_generator_model import MediaGeneratorModel
+from app.core.metrics import MEDIA_GENERATION_RETRIES
+from app.media_generator.circuit_breaker import CircuitBreaker, CircuitOpenError
+from app.media_generator.media_generator_model import (
+    GenerateMediaServiceError,
+    MediaGeneratorModel,
+    RateLimitedMediaGeneratorError,
+)
+from app.media_generator.prompt_result_cache import PromptResultCache, prompt_hash
+from app.media_generator.rate_limiter import RateLimiter, RateLimitExceeded
+from app.media_generator.single_flight import SingleFlight
+from app.media_generator.stage_durations import StageDurationsRecorder
+from app.media_generator.stage_timer import StageTimer
 from app.media_generator.storage import Storage
+from app.media_generator.stored_media import StoredMedia
 from app.media_generator.task_scheduler import TaskScheduler
 from app.logs.log_crud import LogRepositoryDep
 from app.logs.log_level import LogLevel
@@ -26,7 +39,23 @@ class MediaGenerator:
         task_scheduler: TaskScheduler,
         retry_delay_seconds_start: int = 1,
         max_retries: int = 5,
+        result_cache: PromptResultCache | None = None,
+        single_flight: SingleFlight | None = None,
+        rate_limiter: RateLimiter | None = None,
+        rate_limit_wait_seconds: float = 5,
+        rate_limit_reschedule_seconds: int = 10,
+        max_reschedules: int = 20,
+        circuit_breaker: CircuitBreaker | None = None,
+        stage_durations_recorder: StageDurationsRecorder | None = None,
     ):
+        self.result_cache = result_cache
+        self.single_flight = single_flight
+        self.rate_limiter = rate_limiter
+        self.rate_limit_wait_seconds = rate_limit_wait_seconds
+        self.rate_limit_reschedule_seconds = rate_limit_reschedule_seconds
+        self.max_reschedules = max_reschedules
+        self.circuit_breaker = circuit_breaker
+        self.stage_durations_recorder = stage_durations_recorder
         self.logs_repository = logs_repository
         self.max_retries = max_retries
         self.retry_delay_seconds_start = retry_delay_seconds_start
@@ -35,24 +64,63 @@ class MediaGenerator:
         self.media_repository: MediaRepository = media_repository
         self.media_generator_model = media_generator_model
 
-    async def generate_media(self, media_id: MediaId) -> Media | None:
+    async def generate_media(
+        self, media_id: MediaId, timer: StageTimer | None = None
+    ) -> Media | None:
+        """
+        :param timer: receives the durations of the generation stages
+        """
+        if timer is None:
+            timer = StageTimer()
         media = None
         try:
-            media = await self.media_repository.get_and_update_status(
-                media_id, MediaStatus.IN_QUEUE, MediaStatus.PROCESSING
+            with timer.stage("claim"):
+                media = await self.media_repository.get_and_update_status(
+                    media_id, MediaStatus.IN_QUEUE, MediaStatus.PROCESSING
+                )
+            queued_since = media.next_run or media.created_at
+            timer.record(
+                "queued",
+                max((datetime.now(tz=timezone.utc) - queued_since).total_seconds(), 0),
             )
-            media_bytes_iter = self.media_generator_model.generate_media(media.prompt)
-            media_uri = await self.storage.save_bytes(media_bytes_iter)
+            stored_media = await self.generate_and_store(media.prompt, timer)
 
-            media = await self.media_repository.finish_media_generation(
-                media.id, media_uri, MediaStatus.COMPLETED
-            )
-            await self.log_run(media)
+            with timer.stage("finish"):
+                media = await self.media_repository.finish_media_generation(
+                    media.id,
+                    stored_media.uri,
+                    MediaStatus.COMPLETED,
+                    sha256=stored_media.sha256,
+                    size_bytes=stored_media.size_bytes,
+                )
+            if self.result_cache is not None:
+                await self.result_cache.set(media.prompt, stored_media)
+            with timer.stage("log_run"):
+                await self.log_run(media, timer)
             return media
         except ResourceNotFoundException as error:
             logger.warning(f"no media found with {media_id} id.", exc_info=error)
             await self.log_error(error)
             return None
+        except CircuitOpenError as error:
+            # the model wasn't called, it doesn't count as a try
+            logger.info(f"media {media_id} generation deferred: {error}")
+            return await self.reschedule(media, error.reopen_at, "circuit_open")
+        except RateLimitExceeded as error:
+            logger.info(f"media {media_id} generation rescheduled: {error}")
+            return await self.reschedule(
+                media,
+                _seconds_from_now(self.rate_limit_reschedule_seconds),
+                "rate_limit_wait",
+            )
+        except RateLimitedMediaGeneratorError as error:
+            await self.log_error(error, media)
+            delay_seconds = (
+                error.retry_after_seconds or self.rate_limit_reschedule_seconds
+            )
+            return await self.reschedule(
+                media, _seconds_from_now(delay_seconds), "rate_limited"
+            )
         except Exception as error:
             logger.warning("media generation failed", exc_info=error)
             # we can, if needed, differentiate the exceptions based on MediaGeneratorModel#generate_media documentation
@@ -63,6 +131,69 @@ class MediaGenerator:
             if media is not None:
                 return await self.handle_failure(media)
             raise error
+        finally:
+            self.record_stage_durations(timer)
+
+    def record_stage_durations(self, timer: StageTimer):
+        timer.observe()
+        if self.stage_durations_recorder is not None:
+            self.stage_durations_recorder.add(timer.durations)
+
+    async def generate_and_store(
+        self, prompt: str, timer: StageTimer | None = None
+    ) -> StoredMedia:
+        """
+        with single flight, concurrent generations of the same prompt run the model once and share its media.
+        the model stage is the time spent waiting for the media bytes, save_bytes the rest of the upload
+        """
+        if timer is None:
+            timer = StageTimer()
+
+        async def generate() -> StoredMedia:
+            # the call token is taken first, so a half-open probe isn't held while waiting for it
+            if self.rate_limiter is not None and not await self.rate_limiter.acquire(
+                self.rate_limit_wait_seconds
+            ):
+                raise RateLimitExceeded("no model call available")
+            probing = (
+                self.circuit_breaker is not None
+                and await self.circuit_breaker.acquire()
+            )
+            model_seconds = timer.durations.get("model", 0)
+            start = time.perf_counter()
+            try:
+                media_bytes_iter = self.media_generator_model.generate_media(prompt)
+                stored_media = await self.storage.save_bytes(
+                    timer.timed_stream("model", media_bytes_iter)
+                )
+            except RateLimitedMediaGeneratorError:
+                # the provider is up, only the rate has to adapt
+                if self.rate_limiter is not None:
+                    await self.rate_limiter.slow_down()
+                raise
+            except GenerateMediaServiceError:
+                # a failed probe opens the breaker again
+                probing = False
+                if self.circuit_breaker is not None:
+                    await self.circuit_breaker.record_failure()
+                raise
+            else:
+                model_seconds = timer.durations.get("model", 0) - model_seconds
+                timer.record("save_bytes", time.perf_counter() - start - model_seconds)
+                if self.rate_limiter is not None:
+                    await self.rate_limiter.speed_up()
+                if self.circuit_breaker is not None:
+                    await self.circuit_breaker.record_success()
+                    probing = False
+                return stored_media
+            finally:
+                # any other error doesn't tell whether the provider is up, the next caller probes it
+                if probing:
+                    await self.circuit_breaker.release_probe()
+
+        if self.single_flight is None:
+            return await generate()
+        return await self.single_flight.run(prompt_hash(prompt), generate)
 
     async def log_error(self, error: Exception, media: Media | None = None):
         obj_type = type(error)
@@ -86,8 +217,11 @@ class MediaGenerator:
 
     async def handle_failure(self, media: Media) -> Media:
         if media.number_of_tries < self.max_retries:
+            MEDIA_GENERATION_RETRIES.labels("error").inc()
             next_try = await self.calculate_next_try(media)
-            job_id = self.task_scheduler.schedule_media_generation(media.id, next_try)
+            job_id = self.task_scheduler.schedule_media_generation(
+                media.id, next_try, media.priority
+            )
             return await self.media_repository.register_media_generation_error(
                 media.id, next_try, job_id, MediaStatus.IN_QUEUE
             )
@@ -96,14 +230,37 @@ class MediaGenerator:
                 media.id, None, None, MediaStatus.ERROR
             )
 
+    async def reschedule(self, media: Media, next_run: datetime, reason: str) -> Media:
+        """
+        puts back in queue a generation that didn't reach the model, without counting a try. past max_reschedules, it
+        counts as a failure, so a provider that keeps rejecting the calls can't keep a media in queue forever.
+        """
+        if media.number_of_reschedules >= self.max_reschedules:
+            logger.warning(
+                f"media {media.id} rescheduled {media.number_of_reschedules} times"
+            )
+            return await self.handle_failure(media)
+        MEDIA_GENERATION_RETRIES.labels(reason).inc()
+        job_id = self.task_scheduler.schedule_media_generation(
+            media.id, next_run, media.priority
+        )
+        return await self.media_repository.reschedule_media(media.id, next_run, job_id)
+
     async def calculate_next_try(self, media: Media) -> datetime:
         next_delay = self.retry_delay_seconds_start * (2**media.number_of_tries)
         return datetime.now(tz=timezone.utc) + timedelta(seconds=next_delay)
 
-    async def log_run(self, media: Media):
+    async def log_run(self, media: Media, timer: StageTimer | None = None):
+        extras = media.model_dump() | {"media_id": str(media.id)}
+        if timer is not None:
+            extras["stage_durations_ms"] = timer.as_milliseconds()
         await self.logs_repository.log(
             "MediaGenerator",
             LogLevel.INFO,
             "Media generation completed",
-            media.model_dump(),
+            extras,
         )
+
+
+def _seconds_from_now(seconds: float) -> datetime:
+    return datetime.now(tz=timezone.utc) + timedelta(seconds=seconds)
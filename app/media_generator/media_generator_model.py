@@ -7,6 +7,16 @@ class GenerateMediaServiceError(Exception):
     pass
 
 
+class RateLimitedMediaGeneratorError(GenerateMediaServiceError):
+    """
+    the service rejected the call because of its rate limit (HTTP 429)
+    """
+
+    def __init__(self, message: str, retry_after_seconds: float | None = None):
+        super().__init__(message)
+        self.retry_after_seconds = retry_after_seconds
+
+
 class GenericMediaGeneratorError(Exception):
     pass
 
@@ -24,6 +34,7 @@ class MediaGeneratorModel(ABC):
             AsyncIterator[bytes]: The generated media as a byte stream iterator
 
         Raises:
+            RateLimitedMediaGeneratorError: If the service rate limit is exceeded
             GenerateMediaServiceError: If there's a problem related to the media generator service
             GenericMediaGeneratorError: For any other errors that occur during media generation
         """
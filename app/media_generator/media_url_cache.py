@@ -0,0 +1,122 @@
+import json
+import logging
+import time
+from collections import OrderedDict
+
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class MediaUrlCache:
+    """
+    Cache of presigned media urls keyed by media uri.
+
+    The first tier is a bounded, LRU evicted dict local to the process. The optional second tier is redis, shared by
+    every api worker. A url is only served while it's valid for at least safety_margin_seconds, so clients never get
+    a url that is about to expire.
+    """
+
+    def __init__(
+        self,
+        max_size: int,
+        safety_margin_seconds: int,
+        redis: Redis | None = None,
+        key_prefix: str = "media_url:",
+    ):
+        self.max_size = max_size
+        self.safety_margin_seconds = safety_margin_seconds
+        self.redis = redis
+        self.key_prefix = key_prefix
+        self._entries: OrderedDict[str, tuple[str, float]] = OrderedDict()
+        self.local_hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+
+    async def get(self, media_uri: str) -> str | None:
+        entry = self._entries.get(media_uri)
+        if entry is not None:
+            if self._is_fresh(entry[1]):
+                self._entries.move_to_end(media_uri)
+                self.local_hits += 1
+                return entry[0]
+            del self._entries[media_uri]
+
+        entry = await self._redis_get(media_uri)
+        if entry is not None and self._is_fresh(entry[1]):
+            self._store_local(media_uri, *entry)
+            self.redis_hits += 1
+            return entry[0]
+
+        self.misses += 1
+        return None
+
+    async def set(self, media_uri: str, url: str, expires_in: int):
+        expires_at = time.time() + expires_in
+        self._store_local(media_uri, url, expires_at)
+        ttl = expires_in - self.safety_margin_seconds
+        if self.redis is None or ttl <= 0:
+            return
+        try:
+            await self.redis.set(
+                self.key_prefix + media_uri,
+                json.dumps({"url": url, "expires_at": expires_at}),
+                ex=ttl,
+            )
+        except RedisError as error:
+            logger.warning("unable to store media url in redis", exc_info=error)
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "local_hits": self.local_hits,
+            "redis_hits": self.redis_hits,
+            "misses": self.misses,
+        }
+
+    def _is_fresh(self, expires_at: float) -> bool:
+        return time.time() < expires_at - self.safety_margin_seconds
+
+    def _store_local(self, media_uri: str, url: str, expires_at: float):
+        self._entries[media_uri] = (url, expires_at)
+        self._entries.move_to_end(media_uri)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    async def _redis_get(self, media_uri: str) -> tuple[str, float] | None:
+        if self.redis is None:
+            return None
+        try:
+            value = await self.redis.get(self.key_prefix + media_uri)
+        except RedisError as error:
+            logger.warning("unable to read media url from redis", exc_info=error)
+            return None
+        if value is None:
+            return None
+        entry = json.loads(value)
+        return entry["url"], entry["expires_at"]
+
+
+media_url_cache: MediaUrlCache | None = None
+
+
+def setup_media_url_cache(redis: Redis | None = None) -> MediaUrlCache:
+    global media_url_cache
+    media_url_cache = MediaUrlCache(
+        max_size=settings.MEDIA_URL_CACHE_MAX_SIZE,
+        safety_margin_seconds=settings.MEDIA_URL_CACHE_SAFETY_MARGIN_SECONDS,
+        redis=redis if settings.MEDIA_URL_CACHE_REDIS_ENABLED else None,
+    )
+    return media_url_cache
+
+
+def get_media_url_cache() -> MediaUrlCache:
+    if media_url_cache is None:
+        raise ValueError(
+            "you must call setup_media_url_cache function before using the media url cache"
+        )
+    return media_url_cache
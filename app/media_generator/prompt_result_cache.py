@@ -0,0 +1,127 @@
+import hashlib
+import json
+import logging
+import unicodedata
+from typing import Annotated, Any
+
+from fastapi import Depends
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+
+from app.core.config import settings
+from app.media_generator.stored_media import StoredMedia
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_prompt(prompt: str) -> str:
+    """
+    prompts differing only by unicode composition or whitespace generate the same media
+    """
+    return " ".join(unicodedata.normalize("NFC", prompt).split())
+
+
+def prompt_hash(prompt: str, parameters: dict[str, Any] | None = None) -> str:
+    payload = json.dumps(
+        {"prompt": normalize_prompt(prompt), "parameters": parameters or {}},
+        sort_keys=True,
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class PromptResultCache:
+    """
+    Redis cache of stored generated medias keyed by a hash of the normalized prompt and the generation parameters.
+    Hit and miss counters are kept in redis too, so they cover every api process.
+    """
+
+    def __init__(
+        self,
+        redis: Redis,
+        ttl_seconds: int,
+        key_prefix: str = "prompt_result:",
+    ):
+        self.redis = redis
+        self.ttl_seconds = ttl_seconds
+        self.key_prefix = key_prefix
+
+    def key(self, prompt: str, parameters: dict[str, Any] | None = None) -> str:
+        return self.key_prefix + prompt_hash(prompt, parameters)
+
+    async def get(
+        self, prompt: str, parameters: dict[str, Any] | None = None
+    ) -> StoredMedia | None:
+        try:
+            value = await self.redis.get(self.key(prompt, parameters))
+            counter = "hits" if value is not None else "misses"
+            await self.redis.incr(f"{self.key_prefix}stats:{counter}")
+        except RedisError as error:
+            logger.warning("unable to read prompt result from redis", exc_info=error)
+            return None
+        return StoredMedia.model_validate_json(value) if value is not None else None
+
+    async def set(
+        self,
+        prompt: str,
+        stored_media: StoredMedia,
+        parameters: dict[str, Any] | None = None,
+    ):
+        try:
+            await self.redis.set(
+                self.key(prompt, parameters),
+                stored_media.model_dump_json(),
+                ex=self.ttl_seconds,
+            )
+        except RedisError as error:
+            logger.warning("unable to store prompt result in redis", exc_info=error)
+
+    async def stats(self) -> dict[str, int | float] | None:
+        """
+        None when redis is unavailable
+        """
+        try:
+            hits, misses = await self.redis.mget(
+                f"{self.key_prefix}stats:hits", f"{self.key_prefix}stats:misses"
+            )
+        except RedisError as error:
+            logger.warning(
+                "unable to read prompt result stats from redis", exc_info=error
+            )
+            return None
+        hits, misses = int(hits or 0), int(misses or 0)
+        lookups = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / lookups if lookups else 0.0,
+        }
+
+
+prompt_result_cache: PromptResultCache | None = None
+
+
+def setup_prompt_result_cache(redis: Redis) -> PromptResultCache | None:
+    global prompt_result_cache
+    if not settings.PROMPT_RESULT_CACHE_ENABLED:
+        return None
+    prompt_result_cache = PromptResultCache(
+        redis=redis, ttl_seconds=settings.PROMPT_RESULT_CACHE_TTL_SECONDS
+    )
+    return prompt_result_cache
+
+
+def close_prompt_result_cache():
+    global prompt_result_cache
+    prompt_result_cache = None
+
+
+def get_prompt_result_cache() -> PromptResultCache | None:
+    """
+    the cache is opt-in, see PROMPT_RESULT_CACHE_ENABLED
+    """
+    return prompt_result_cache
+
+
+PromptResultCacheDep = Annotated[
+    PromptResultCache | None, Depends(get_prompt_result_cache)
+]
@@ -0,0 +1,143 @@
+import asyncio
+import logging
+
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# token bucket refilled at the current rate, with the redis clock so workers don't need synchronized clocks.
+# returns 0 when a token was taken, the milliseconds to wait for the next one otherwise
+_ACQUIRE_SCRIPT = """
+local max_rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local time = redis.call("time")
+local now = tonumber(time[1]) * 1000 + math.floor(tonumber(time[2]) / 1000)
+local bucket = redis.call("hmget", KEYS[1], "tokens", "updated_at", "rate")
+local rate = tonumber(bucket[3]) or max_rate
+local tokens = tonumber(bucket[1]) or burst
+local updated_at = tonumber(bucket[2]) or now
+tokens = math.min(burst, tokens + (now - updated_at) * rate / 1000)
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    wait = math.ceil((1 - tokens) * 1000 / rate)
+end
+redis.call("hset", KEYS[1], "tokens", tostring(tokens), "updated_at", now, "rate", tostring(rate))
+redis.call("pexpire", KEYS[1], 86400000)
+return wait
+"""
+# multiplies the current rate by ARGV[1] and adds ARGV[2], bounded by ARGV[3] and ARGV[4]
+_ADJUST_RATE_SCRIPT = """
+local rate = tonumber(redis.call("hget", KEYS[1], "rate")) or tonumber(ARGV[4])
+rate = rate * tonumber(ARGV[1]) + tonumber(ARGV[2])
+rate = math.max(tonumber(ARGV[3]), math.min(tonumber(ARGV[4]), rate))
+redis.call("hset", KEYS[1], "rate", tostring(rate))
+return tostring(rate)
+"""
+
+
+class RateLimitExceeded(Exception):
+    pass
+
+
+class RateLimiter:
+    """
+    Token bucket shared by every worker through redis, limiting the calls to a model provider.
+
+    The rate adapts to the provider, with an additive increase and a multiplicative decrease: it's halved every time the
+    provider rejects a call for exceeding its rate limit, and grows back by a tenth of the configured rate on every
+    successful call, never above it.
+    """
+
+    def __init__(
+        self,
+        redis: Redis,
+        name: str,
+        rate_per_second: float,
+        burst: int = 1,
+        min_rate_per_second: float | None = None,
+        key_prefix: str = "rate_limit:",
+    ):
+        self.redis = redis
+        self.key = f"{key_prefix}{name}"
+        self.rate_per_second = rate_per_second
+        self.burst = burst
+        self.min_rate_per_second = min_rate_per_second or rate_per_second / 100
+        self._acquire = redis.register_script(_ACQUIRE_SCRIPT)
+        self._adjust_rate = redis.register_script(_ADJUST_RATE_SCRIPT)
+
+    async def acquire(self, timeout_seconds: float) -> bool:
+        """
+        waits up to timeout_seconds for a token.
+        if redis is unavailable, the call is let through rather than blocking every generation.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout_seconds
+        while True:
+            try:
+                wait_ms = await self._acquire(
+                    keys=[self.key], args=[self.rate_per_second, self.burst]
+                )
+            except RedisError as error:
+                logger.warning("rate limiter unavailable", exc_info=error)
+                return True
+            if wait_ms == 0:
+                return True
+            wait_seconds = wait_ms / 1000
+            if loop.time() + wait_seconds > deadline:
+                return False
+            await asyncio.sleep(wait_seconds)
+
+    async def slow_down(self):
+        await self._adjust(factor=0.5)
+
+    async def speed_up(self):
+        await self._adjust(increment=self.rate_per_second / 10)
+
+    async def current_rate(self) -> float:
+        rate = await self.redis.hget(self.key, "rate")
+        return float(rate) if rate is not None else self.rate_per_second
+
+    async def _adjust(self, factor: float = 1, increment: float = 0):
+        try:
+            await self._adjust_rate(
+                keys=[self.key],
+                args=[
+                    factor,
+                    increment,
+                    self.min_rate_per_second,
+                    self.rate_per_second,
+                ],
+            )
+        except RedisError as error:
+            logger.warning("unable to adapt rate limit", exc_info=error)
+
+
+rate_limiters: dict[str, RateLimiter] = {}
+
+
+def setup_rate_limiters(redis: Redis) -> dict[str, RateLimiter]:
+    rate_limiters.clear()
+    for model_name, rate_limit in settings.MODEL_RATE_LIMITS.items():
+        rate_limiters[model_name] = RateLimiter(
+            redis,
+            name=model_name,
+            rate_per_second=rate_limit.rate_per_second,
+            burst=rate_limit.burst,
+        )
+    return rate_limiters
+
+
+def close_rate_limiters():
+    rate_limiters.clear()
+
+
+def get_rate_limiter(model_name: str) -> RateLimiter | None:
+    """
+    models without a configured rate limit aren't limited
+    """
+    return rate_limiters.get(model_name)
@@ -1,12 +1,13 @@
 from typing import AsyncIterator
 
 import replicate
-from replicate.exceptions import ModelError
+from replicate.exceptions import ModelError, ReplicateError
 
 from app.media_generator.media_generator_model import (
     MediaGeneratorModel,
     GenerateMediaServiceError,
     GenericMediaGeneratorError,
+    RateLimitedMediaGeneratorError,
 )
 
 
@@ -29,6 +30,10 @@ class ReplicateMediaGeneratorModel(MediaGeneratorModel):
 
             for chunk in file_output:
                 yield chunk
+        except ReplicateError as e:
+            if e.status == 429:
+                raise RateLimitedMediaGeneratorError(str(e)) from e
+            raise GenerateMediaServiceError(str(e)) from e
         except ModelError as e:
             raise GenerateMediaServiceError(str(e)) from e
         except BaseException as e:
@@ -0,0 +1,183 @@
+import asyncio
+import contextlib
+import logging
+import uuid
+from typing import Awaitable, Callable
+
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+
+from app.core.config import settings
+from app.media_generator.stored_media import StoredMedia
+
+logger = logging.getLogger(__name__)
+
+# returns the leader's media if it's published, 1 if the caller took the lease, 0 otherwise.
+# atomic, so the lease can't be taken right after a leader published its media and released the lease
+_ACQUIRE_SCRIPT = """
+local result = redis.call("get", KEYS[2])
+if result then
+    return result
+end
+if redis.call("set", KEYS[1], ARGV[1], "NX", "PX", ARGV[2]) then
+    return 1
+end
+return 0
+"""
+# deletes or extends the lease only if it's still held by the caller
+_RELEASE_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+_RENEW_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("pexpire", KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent generations of the same key across workers.
+
+    The first caller takes a redis lease on the key and becomes the leader: it generates the media, publishes it for
+    result_ttl_seconds and releases the lease. The lease is renewed while the leader runs, so it only expires if the
+    leader dies. The other callers are followers: they poll for the leader's media and, if the lease is released or
+    expires without one, one of them takes the lease and is promoted leader.
+    A follower waiting longer than wait_timeout_seconds generates on its own, as does every caller if redis fails.
+    """
+
+    def __init__(
+        self,
+        redis: Redis,
+        lease_seconds: float,
+        wait_timeout_seconds: float,
+        result_ttl_seconds: int,
+        poll_interval_seconds: float = 0.2,
+        key_prefix: str = "single_flight:",
+    ):
+        self.redis = redis
+        self.lease_seconds = lease_seconds
+        self.wait_timeout_seconds = wait_timeout_seconds
+        self.result_ttl_seconds = result_ttl_seconds
+        self.poll_interval_seconds = poll_interval_seconds
+        self.key_prefix = key_prefix
+        self._acquire = redis.register_script(_ACQUIRE_SCRIPT)
+        self._release = redis.register_script(_RELEASE_SCRIPT)
+        self._renew = redis.register_script(_RENEW_SCRIPT)
+
+    async def run(
+        self, key: str, generate: Callable[[], Awaitable[StoredMedia]]
+    ) -> StoredMedia:
+        lease_key = f"{self.key_prefix}lease:{key}"
+        result_key = f"{self.key_prefix}result:{key}"
+        token = uuid.uuid4().hex
+        try:
+            leader_media = await self._wait_for_lease(lease_key, result_key, token)
+        except RedisError as error:
+            logger.warning("single flight unavailable", exc_info=error)
+            return await generate()
+        if leader_media is not None:
+            return leader_media
+        if not await self._holds_lease(lease_key, token):
+            logger.warning(f"single flight leader of {key} is too slow")
+            return await generate()
+        return await self._lead(lease_key, result_key, token, generate)
+
+    async def _wait_for_lease(
+        self, lease_key: str, result_key: str, token: str
+    ) -> StoredMedia | None:
+        """
+        :return: the media of the leader, None once the lease is taken or the wait timed out
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.wait_timeout_seconds
+        lease_ms = int(self.lease_seconds * 1000)
+        while True:
+            result = await self._acquire(
+                keys=[lease_key, result_key], args=[token, lease_ms]
+            )
+            if isinstance(result, bytes):
+                return StoredMedia.model_validate_json(result)
+            if result == 1:
+                return None
+            if loop.time() >= deadline:
+                return None
+            await asyncio.sleep(self.poll_interval_seconds)
+
+    async def _holds_lease(self, lease_key: str, token: str) -> bool:
+        try:
+            return await self.redis.get(lease_key) == token.encode()
+        except RedisError:
+            return False
+
+    async def _lead(
+        self,
+        lease_key: str,
+        result_key: str,
+        token: str,
+        generate: Callable[[], Awaitable[StoredMedia]],
+    ) -> StoredMedia:
+        renewal = asyncio.create_task(self._renew_lease(lease_key, token))
+        try:
+            stored_media = await generate()
+            try:
+                await self.redis.set(
+                    result_key,
+                    stored_media.model_dump_json(),
+                    ex=self.result_ttl_seconds,
+                )
+            except RedisError as error:
+                # the followers will be promoted and generate it again
+                logger.warning("unable to share single flight media", exc_info=error)
+            return stored_media
+        finally:
+            renewal.cancel()
+            # the lease mustn't be renewed after its release
+            with contextlib.suppress(asyncio.CancelledError):
+                await renewal
+            try:
+                await self._release(keys=[lease_key], args=[token])
+            except RedisError as error:
+                # the lease expires on its own
+                logger.warning("unable to release single flight lease", exc_info=error)
+
+    async def _renew_lease(self, lease_key: str, token: str):
+        lease_ms = int(self.lease_seconds * 1000)
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            try:
+                await self._renew(keys=[lease_key], args=[token, lease_ms])
+            except RedisError as error:
+                logger.warning("unable to renew single flight lease", exc_info=error)
+
+
+single_flight: SingleFlight | None = None
+
+
+def setup_single_flight(redis: Redis) -> SingleFlight | None:
+    global single_flight
+    if not settings.SINGLE_FLIGHT_ENABLED:
+        return None
+    single_flight = SingleFlight(
+        redis=redis,
+        lease_seconds=settings.SINGLE_FLIGHT_LEASE_SECONDS,
+        wait_timeout_seconds=settings.SINGLE_FLIGHT_WAIT_TIMEOUT_SECONDS,
+        result_ttl_seconds=settings.SINGLE_FLIGHT_RESULT_TTL_SECONDS,
+    )
+    return single_flight
+
+
+def close_single_flight():
+    global single_flight
+    single_flight = None
+
+
+def get_single_flight() -> SingleFlight | None:
+    """
+    single flight is opt-in, see SINGLE_FLIGHT_ENABLED
+    """
+    return single_flight
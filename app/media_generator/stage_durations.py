@@ -0,0 +1,208 @@
+import asyncio
+import bisect
+import logging
+import math
+from collections import defaultdict
+from datetime import datetime, timezone
+
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.core.config import settings
+from app.core.metrics import STAGE_DURATION_BUCKETS_SECONDS
+from app.core.model import BasicModel
+from app.media_generator.db_stage_durations import MediaStageDurations
+
+logger = logging.getLogger(__name__)
+
+BUCKETS_SECONDS = (*STAGE_DURATION_BUCKETS_SECONDS, math.inf)
+
+
+class StageDurationsSummary(BasicModel):
+    """
+    percentiles are the upper bound of the bucket they fall in, None when they're above the last finite bucket
+    """
+
+    stage: str
+    count: int
+    mean_seconds: float
+    p50_seconds: float | None
+    p95_seconds: float | None
+    p99_seconds: float | None
+
+
+def _period_start(at: datetime) -> datetime:
+    return at.replace(minute=0, second=0, microsecond=0)
+
+
+def _percentile(buckets: list[tuple[float, int]], fraction: float) -> float | None:
+    target = fraction * sum(count for _, count in buckets)
+    seen = 0
+    le_seconds = buckets[-1][0]
+    for le_seconds, count in buckets:
+        seen += count
+        if seen >= target:
+            break
+    # the overflow bucket has no upper bound, and infinity isn't valid json
+    return le_seconds if math.isfinite(le_seconds) else None
+
+
+class StageDurationsRecorder:
+    """
+    Aggregates the stage durations of the generations in memory and adds them to the hourly histograms of postgres
+    from a background task every flush_interval_seconds, so recording them costs no database write per generation.
+    """
+
+    def __init__(
+        self,
+        async_session: async_sessionmaker[AsyncSession],
+        flush_interval_seconds: float = 60,
+    ):
+        self._async_session = async_session
+        self.flush_interval_seconds = flush_interval_seconds
+        # (period start, stage, le_seconds) -> [count, sum_seconds]
+        self._buckets: dict[tuple[datetime, str, float], list] = defaultdict(
+            lambda: [0, 0.0]
+        )
+        self._stopping = asyncio.Event()
+        self._task: asyncio.Task | None = None
+
+    def add(self, durations: dict[str, float], at: datetime | None = None):
+        period_start = _period_start(at or datetime.now(tz=timezone.utc))
+        for stage, seconds in durations.items():
+            le_seconds = BUCKETS_SECONDS[bisect.bisect_left(BUCKETS_SECONDS, seconds)]
+            bucket = self._buckets[(period_start, stage, le_seconds)]
+            bucket[0] += 1
+            bucket[1] += seconds
+
+    def start(self):
+        if self._task is None:
+            self._stopping.clear()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._stopping.set()
+            await self._task
+            self._task = None
+        await self.flush()
+
+    async def _run(self):
+        while not self._stopping.is_set():
+            try:
+                await asyncio.wait_for(
+                    self._stopping.wait(), self.flush_interval_seconds
+                )
+            except TimeoutError:
+                await self.flush()
+
+    async def flush(self):
+        if not self._buckets:
+            return
+        buckets, self._buckets = self._buckets, defaultdict(lambda: [0, 0.0])
+        rows = [
+            {
+                "period_start": period_start,
+                "stage": stage,
+                "le_seconds": le_seconds,
+                "count": count,
+                "sum_seconds": sum_seconds,
+            }
+            for (period_start, stage, le_seconds), (count, sum_seconds) in sorted(
+                buckets.items()
+            )
+        ]
+        statement = insert(MediaStageDurations)
+        statement = statement.on_conflict_do_update(
+            index_elements=[
+                MediaStageDurations.period_start,
+                MediaStageDurations.stage,
+                MediaStageDurations.le_seconds,
+            ],
+            set_={
+                "count": MediaStageDurations.count + statement.excluded.count,
+                "sum_seconds": MediaStageDurations.sum_seconds
+                + statement.excluded.sum_seconds,
+            },
+        )
+        try:
+            async with self._async_session() as session:
+                await session.execute(statement, rows)
+                await session.commit()
+        except Exception as error:
+            logger.error("unable to write media stage durations", exc_info=error)
+            # nothing was written, the next flush retries them with the durations added since
+            for key, (count, sum_seconds) in buckets.items():
+                bucket = self._buckets[key]
+                bucket[0] += count
+                bucket[1] += sum_seconds
+
+
+class StageDurationsRepository:
+    def __init__(self, async_session: async_sessionmaker[AsyncSession]):
+        self._async_session = async_session
+
+    async def summary(
+        self, since: datetime, until: datetime | None = None
+    ) -> list[StageDurationsSummary]:
+        statement = (
+            select(MediaStageDurations)
+            .where(MediaStageDurations.period_start >= _period_start(since))
+            .order_by(MediaStageDurations.stage, MediaStageDurations.le_seconds)
+        )
+        if until is not None:
+            statement = statement.where(MediaStageDurations.period_start < until)
+        async with self._async_session() as session:
+            rows = (await session.execute(statement)).scalars().all()
+        by_stage: dict[str, dict[float, list]] = defaultdict(
+            lambda: defaultdict(lambda: [0, 0.0])
+        )
+        for row in rows:
+            bucket = by_stage[row.stage][row.le_seconds]
+            bucket[0] += row.count
+            bucket[1] += row.sum_seconds
+        summaries = []
+        for stage, stage_buckets in by_stage.items():
+            buckets = [(le, count) for le, (count, _) in sorted(stage_buckets.items())]
+            count = sum(count for _, count in buckets)
+            summaries.append(
+                StageDurationsSummary(
+                    stage=stage,
+                    count=count,
+                    mean_seconds=sum(s for _, s in stage_buckets.values()) / count,
+                    p50_seconds=_percentile(buckets, 0.5),
+                    p95_seconds=_percentile(buckets, 0.95),
+                    p99_seconds=_percentile(buckets, 0.99),
+                )
+            )
+        return summaries
+
+
+stage_durations_recorder: StageDurationsRecorder | None = None
+
+
+def setup_stage_durations_recorder(
+    async_session: async_sessionmaker[AsyncSession],
+) -> StageDurationsRecorder:
+    """
+    must be called from the event loop the recorder will run on
+    """
+    global stage_durations_recorder
+    stage_durations_recorder = StageDurationsRecorder(
+        async_session,
+        flush_interval_seconds=settings.STAGE_DURATIONS_FLUSH_INTERVAL_SECONDS,
+    )
+    stage_durations_recorder.start()
+    return stage_durations_recorder
+
+
+async def close_stage_durations_recorder():
+    global stage_durations_recorder
+    if stage_durations_recorder is not None:
+        await stage_durations_recorder.stop()
+    stage_durations_recorder = None
+
+
+def get_stage_durations_recorder() -> StageDurationsRecorder | None:
+    return stage_durations_recorder
@@ -0,0 +1,51 @@
+import time
+from contextlib import contextmanager
+from typing import AsyncIterator
+
+from app.core.metrics import MEDIA_GENERATION_STAGE_DURATION
+
+
+class StageTimer:
+    """
+    Monotonic durations of the stages of a media generation, in seconds.
+    A stage timed more than once accumulates its durations.
+    """
+
+    __slots__ = ("durations",)
+
+    def __init__(self):
+        self.durations: dict[str, float] = {}
+
+    def record(self, stage: str, seconds: float):
+        self.durations[stage] = self.durations.get(stage, 0) + seconds
+
+    @contextmanager
+    def stage(self, stage: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - start)
+
+    async def timed_stream(
+        self, stage: str, stream: AsyncIterator[bytes]
+    ) -> AsyncIterator[bytes]:
+        """
+        times the waits on the stream only, not the work done by its consumer between chunks
+        """
+        while True:
+            start = time.perf_counter()
+            try:
+                chunk = await anext(stream)
+            except StopAsyncIteration:
+                return
+            finally:
+                self.record(stage, time.perf_counter() - start)
+            yield chunk
+
+    def observe(self):
+        for stage, seconds in self.durations.items():
+            MEDIA_GENERATION_STAGE_DURATION.labels(stage).observe(seconds)
+
+    def as_milliseconds(self) -> dict[str, float]:
+        return {stage: seconds * 1000 for stage, seconds in self.durations.items()}
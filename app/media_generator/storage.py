@@ -1,65 +1,359 @@
-import io
+import asyncio
+import contextlib
+import hashlib
 import uuid
-from typing import AsyncIterator, Annotated
+from typing import AsyncIterator, Annotated, Any
 
 import aioboto3
+from aiobotocore.config import AioConfig
+from botocore.endpoint import MAX_POOL_CONNECTIONS
+from botocore.exceptions import ClientError
 from fastapi import Depends
 from pydantic import AnyUrl
 
 from app.core.config import settings
+from app.core.metrics import S3_CLIENT_CONNECTIONS, S3_CLIENT_OPERATIONS_IN_FLIGHT
+from app.media_generator.media_url_cache import MediaUrlCache
+from app.media_generator.stored_media import StoredMedia
+
+
+# S3 rejects multipart uploads with non-final parts smaller than 5 MiB
+MIN_MULTIPART_PART_SIZE = 5 * 1024 * 1024
+
+
+class ContentDigest:
+    """
+    sha256 and size of a stream, updated while it passes through
+    """
+
+    def __init__(self):
+        self._sha256 = hashlib.sha256()
+        self.size_bytes = 0
+
+    def update(self, chunk: bytes):
+        self._sha256.update(chunk)
+        self.size_bytes += len(chunk)
+
+    @property
+    def sha256(self) -> str:
+        return self._sha256.hexdigest()
 
 
 class Storage:
-    def __init__(self, aio_session: aioboto3.Session, bucket_name: str, s3_url: AnyUrl):
+    def __init__(
+        self,
+        aio_session: aioboto3.Session,
+        bucket_name: str,
+        s3_url: AnyUrl,
+        multipart_part_size: int = settings.S3_MULTIPART_PART_SIZE,
+        url_cache: MediaUrlCache | None = None,
+        url_expiration_seconds: int = settings.MEDIA_URL_EXPIRATION_SECONDS,
+        client_config: AioConfig | None = None,
+        content_addressed: bool = settings.S3_CONTENT_ADDRESSED,
+    ):
+        if multipart_part_size < MIN_MULTIPART_PART_SIZE:
+            raise ValueError(
+                f"multipart part size must be at least {MIN_MULTIPART_PART_SIZE} bytes"
+            )
         self.s3_url = s3_url
         self.aio_session = aio_session
         self.bucket_name = bucket_name
+        self.multipart_part_size = multipart_part_size
+        self.url_cache = url_cache
+        self.url_expiration_seconds = url_expiration_seconds
+        self.client_config = client_config
+        self.content_addressed = content_addressed
+        # workaround for this to work with localhost through full docker compose
+        self.public_s3_url = str(s3_url)
+        if self.public_s3_url.startswith("http://localstack"):
+            self.public_s3_url = self.public_s3_url.replace(
+                "http://localstack", "http://localhost"
+            )
+        self._clients: contextlib.AsyncExitStack | None = None
+        self._client = None
+        self._public_client = None
+
+    @property
+    def is_started(self) -> bool:
+        return self._clients is not None
+
+    async def start(self):
+        """
+        opens the long-lived s3 clients, reused by every call until close is called.
+        clients are bound to the event loop they were started on.
+        """
+        if self._clients is not None:
+            return
+        clients = contextlib.AsyncExitStack()
+        self._client = await clients.enter_async_context(self._open_client(self.s3_url))
+        if self.public_s3_url == str(self.s3_url):
+            self._public_client = self._client
+        else:
+            self._public_client = await clients.enter_async_context(
+                self._open_client(self.public_s3_url)
+            )
+        self._clients = clients
+        S3_CLIENT_CONNECTIONS.inc(self._client_connections)
+
+    async def close(self):
+        if self._clients is None:
+            return
+        clients = self._clients
+        self._clients = self._client = self._public_client = None
+        await clients.aclose()
+        S3_CLIENT_CONNECTIONS.dec(self._client_connections)
+
+    @property
+    def _client_connections(self) -> int:
+        if (
+            self.client_config is None
+            or self.client_config.max_pool_connections is None
+        ):
+            return MAX_POOL_CONNECTIONS
+        return self.client_config.max_pool_connections
+
+    def _open_client(self, endpoint_url: str):
+        return self.aio_session.client(
+            "s3", endpoint_url=endpoint_url, config=self.client_config
+        )
+
+    @contextlib.asynccontextmanager
+    async def _s3_client(self, public: bool = False):
+        """
+        yields the long-lived client when the storage is started, a short-lived one otherwise
+        """
+        with S3_CLIENT_OPERATIONS_IN_FLIGHT.track_inprogress():
+            client = self._public_client if public else self._client
+            if client is not None:
+                yield client
+                return
+            async with self._open_client(
+                self.public_s3_url if public else self.s3_url
+            ) as client:
+                yield client
+
+    async def save_bytes(self, stream: AsyncIterator[bytes]) -> StoredMedia:
+        """
+        uploads the stream while it's being produced, holding at most two parts in memory: the one being uploaded and
+        the one being filled, besides the chunk of the stream being copied. streams smaller than a part are uploaded
+        with a single put.
+
+        in content addressed mode, the object is keyed by the sha256 of its bytes and identical medias are stored
+        once. a stream smaller than a part is hashed before its upload, which is skipped when its key already exists.
+        a larger one is uploaded to a temporary key, then copied to its content key if that one doesn't exist yet.
+        """
+        digest = ContentDigest()
+        parts = self._iter_parts(stream, digest)
+        async with self._s3_client() as s3:
+            first_part = await anext(parts, bytearray())
+            if len(first_part) < self.multipart_part_size:
+                file_key = self._file_key(digest)
+                if not self.content_addressed or not await self._exists(s3, file_key):
+                    await s3.put_object(
+                        Bucket=self.bucket_name, Key=file_key, Body=first_part
+                    )
+            else:
+                file_key = self._file_key()
+                await self._multipart_upload(s3, file_key, first_part, parts)
+                if self.content_addressed:
+                    file_key = await self._move_to_content_key(s3, file_key, digest)
+        return StoredMedia(
+            uri=f"s3://{self.bucket_name}/{file_key}",
+            sha256=digest.sha256,
+            size_bytes=digest.size_bytes,
+        )
 
-    async def save_bytes(self, stream: AsyncIterator[bytes]) -> str:
-        file_key = f"{uuid.uuid4()}.png"
-        bytes_data = io.BytesIO()
+    def _file_key(self, digest: ContentDigest | None = None) -> str:
+        if self.content_addressed and digest is not None:
+            return f"{digest.sha256}.png"
+        return f"{uuid.uuid4()}.png"
+
+    async def _exists(self, s3, file_key: str) -> bool:
+        try:
+            await s3.head_object(Bucket=self.bucket_name, Key=file_key)
+        except ClientError as error:
+            if error.response["Error"]["Code"] in ("404", "NoSuchKey", "NotFound"):
+                return False
+            raise
+        return True
+
+    async def _move_to_content_key(
+        self, s3, file_key: str, digest: ContentDigest
+    ) -> str:
+        content_key = self._file_key(digest)
+        if not await self._exists(s3, content_key):
+            # server side copy, the bytes aren't uploaded again
+            await s3.copy_object(
+                Bucket=self.bucket_name,
+                Key=content_key,
+                CopySource={"Bucket": self.bucket_name, "Key": file_key},
+            )
+        await s3.delete_object(Bucket=self.bucket_name, Key=file_key)
+        return content_key
+
+    async def _iter_parts(
+        self, stream: AsyncIterator[bytes], digest: ContentDigest
+    ) -> AsyncIterator[bytearray]:
+        buffer = bytearray()
         async for chunk in stream:
-            bytes_data.write(chunk)
-        bytes_data.seek(0)
-        async with self.aio_session.resource(
-            "s3",
-            endpoint_url=self.s3_url,
-        ) as s3:
-            bucket = await s3.Bucket(self.bucket_name)
-            await bucket.upload_fileobj(Fileobj=bytes_data, Key=file_key)
-        return f"s3://{self.bucket_name}/{file_key}"
+            digest.update(chunk)
+            remaining = memoryview(chunk)
+            while remaining:
+                free_bytes = self.multipart_part_size - len(buffer)
+                buffer += remaining[:free_bytes]
+                remaining = remaining[free_bytes:]
+                if len(buffer) == self.multipart_part_size:
+                    # the filled buffer is handed over without a copy, the next part gets a new one
+                    yield buffer
+                    buffer = bytearray()
+        if buffer:
+            yield buffer
+
+    async def _multipart_upload(
+        self,
+        s3,
+        file_key: str,
+        first_part: bytearray,
+        parts: AsyncIterator[bytearray],
+    ):
+        upload = await s3.create_multipart_upload(Bucket=self.bucket_name, Key=file_key)
+        upload_id = upload["UploadId"]
+        uploaded_parts = []
+        part_number = 1
+        upload_task = asyncio.create_task(
+            self._upload_part(s3, file_key, upload_id, part_number, first_part)
+        )
+        try:
+            # the next part is read from the stream while the previous one is uploading
+            async for part in parts:
+                uploaded_parts.append(await upload_task)
+                part_number += 1
+                upload_task = asyncio.create_task(
+                    self._upload_part(s3, file_key, upload_id, part_number, part)
+                )
+            uploaded_parts.append(await upload_task)
+            await s3.complete_multipart_upload(
+                Bucket=self.bucket_name,
+                Key=file_key,
+                UploadId=upload_id,
+                MultipartUpload={"Parts": uploaded_parts},
+            )
+        except BaseException:
+            upload_task.cancel()
+            # an upload_part still in flight could otherwise complete after the abort
+            with contextlib.suppress(asyncio.CancelledError, Exception):
+                await upload_task
+            await s3.abort_multipart_upload(
+                Bucket=self.bucket_name, Key=file_key, UploadId=upload_id
+            )
+            raise
+
+    async def _upload_part(
+        self, s3, file_key: str, upload_id: str, part_number: int, body: bytearray
+    ) -> dict[str, Any]:
+        response = await s3.upload_part(
+            Bucket=self.bucket_name,
+            Key=file_key,
+            UploadId=upload_id,
+            PartNumber=part_number,
+            Body=body,
+        )
+        return {"PartNumber": part_number, "ETag": response["ETag"]}
 
     async def create_media_url(self, uri: str) -> AnyUrl:
-        if not uri.startswith("s3://"):
-            raise ValueError("invalid S3 uri")
-        # workaround for this to work with localhost through full docker compose
-        s3_url = str(self.s3_url)
-        if s3_url.startswith("http://localstack"):
-            s3_url = s3_url.replace("http://localstack", "http://localhost")
-        bucket, key = uri[5:].split("/", 1)
-        async with self.aio_session.client(
-            "s3",
-            endpoint_url=s3_url,
-        ) as s3:
+        bucket, key = _split_uri(uri)
+        if self.url_cache is not None:
+            url = await self.url_cache.get(uri)
+            if url is not None:
+                return url
+        async with self._s3_client(public=True) as s3:
             url = await s3.generate_presigned_url(
                 "get_object",
                 Params={"Bucket": bucket, "Key": key},
-                ExpiresIn=3600,
+                ExpiresIn=self.url_expiration_seconds,
             )
+        if self.url_cache is not None:
+            await self.url_cache.set(uri, url, self.url_expiration_seconds)
         return url
 
+    async def read_media(
+        self,
+        uri: str,
+        first_byte: int = 0,
+        last_byte: int | None = None,
+        chunk_size: int = settings.MEDIA_CONTENT_CHUNK_SIZE,
+    ) -> AsyncIterator[bytes]:
+        """
+        streams the media bytes from first_byte to last_byte included, at most chunk_size bytes at a time: memory
+        stays flat whatever the media size
+        """
+        bucket, key = _split_uri(uri)
+        range_params = {}
+        if first_byte > 0 or last_byte is not None:
+            last = "" if last_byte is None else last_byte
+            range_params["Range"] = f"bytes={first_byte}-{last}"
+        async with self._s3_client() as s3:
+            response = await s3.get_object(Bucket=bucket, Key=key, **range_params)
+            body = response["Body"]
+            # releases the connection to the pool, even if the stream isn't read to its end
+            async with body:
+                async for chunk in body.iter_chunks(chunk_size):
+                    yield chunk
+
+    async def head_media(self, uri: str) -> tuple[int, str]:
+        """
+        :return: the size and the s3 etag of the media
+        """
+        bucket, key = _split_uri(uri)
+        async with self._s3_client() as s3:
+            response = await s3.head_object(Bucket=bucket, Key=key)
+        return response["ContentLength"], response["ETag"]
 
-def get_storage():
+
+def _split_uri(uri: str) -> tuple[str, str]:
+    if not uri.startswith("s3://"):
+        raise ValueError("invalid S3 uri")
+    bucket, key = uri[5:].split("/", 1)
+    return bucket, key
+
+
+storage: Storage | None = None
+
+
+async def setup_storage(url_cache: MediaUrlCache | None = None) -> Storage:
+    global storage
     session = aioboto3.Session(
         aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
         aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
         region_name=settings.AWS_DEFAULT_REGION,
     )
-    return Storage(
+    storage = Storage(
         aio_session=session,
         bucket_name=settings.BUCKET_NAME,
         s3_url=settings.S3_ENDPOINT_URL,
+        url_cache=url_cache,
+        client_config=AioConfig(
+            max_pool_connections=settings.S3_MAX_POOL_CONNECTIONS,
+            connect_timeout=settings.S3_CONNECT_TIMEOUT_SECONDS,
+            read_timeout=settings.S3_READ_TIMEOUT_SECONDS,
+            tcp_keepalive=True,
+        ),
     )
+    await storage.start()
+    return storage
+
+
+async def close_storage():
+    global storage
+    if storage is not None:
+        await storage.close()
+    storage = None
+
+
+def get_storage() -> Storage:
+    if storage is None:
+        raise ValueError("you must call setup_storage function before using storage")
+    return storage
 
 
 StorageDep = Annotated[Storage, Depends(get_storage)]
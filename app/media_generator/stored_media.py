@@ -0,0 +1,7 @@
+from app.core.model import BasicModel
+
+
+class StoredMedia(BasicModel):
+    uri: str
+    sha256: str
+    size_bytes: int
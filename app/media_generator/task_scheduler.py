@@ -3,9 +3,15 @@ from datetime import datetime
 
 from app.media.job_id import JobId
 from app.media.media_id import MediaId
+from app.media.media_priority import MediaPriority
 
 
 class TaskScheduler(ABC):
     @abstractmethod
-    def schedule_media_generation(self, media_id: MediaId, eta: datetime) -> JobId:
+    def schedule_media_generation(
+        self, media_id: MediaId, eta: datetime, priority: MediaPriority
+    ) -> JobId:
+        """
+        retries stay on the priority the media was created with
+        """
         raise NotImplementedError()
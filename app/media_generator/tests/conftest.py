@@ -10,10 +10,11 @@ from app.media_generator.dummy_media_generator.dummy_media_generator_model impor
 )
 from app.media_generator.media_generator import MediaGenerator
 from app.media_generator.task_scheduler import TaskScheduler
-from app.media_generator.storage import Storage
+from app.media_generator.storage import Storage, MIN_MULTIPART_PART_SIZE
 from app.logs.log_crud import LogsRepository
 from app.media.job_id import JobId
 from app.media.media_id import MediaId
+from app.media.media_priority import MediaPriority
 from app.media.media_repository import MediaRepository
 from tests.conftest import *  # noqa
 from app.media.tests.conftest import *  # noqa
@@ -24,7 +25,9 @@ from app.core.config import settings
 @pytest.fixture(scope="session")
 def task_scheduler() -> TaskScheduler:
     class DummyTaskScheduler(TaskScheduler):
-        def schedule_media_generation(self, media_id: MediaId, eta: datetime) -> JobId:
+        def schedule_media_generation(
+            self, media_id: MediaId, eta: datetime, priority: MediaPriority
+        ) -> JobId:
             return uuid.uuid4()
 
     return DummyTaskScheduler()
@@ -42,6 +45,7 @@ def storage():
         aio_session=session,
         bucket_name=settings.BUCKET_NAME,
         s3_url=settings.S3_ENDPOINT_URL,
+        multipart_part_size=MIN_MULTIPART_PART_SIZE,
     )
 
 
@@ -0,0 +1,193 @@
+import asyncio
+import uuid
+
+import pytest
+import pytest_asyncio
+from fastapi.testclient import TestClient
+from redis.asyncio import Redis
+
+from app.core.config import settings
+from app.core.redis import get_redis
+from app.main import fastapi_app
+from app.media.media_repository import MediaRepository
+from app.media.media_status import MediaStatus
+from app.media_generator.circuit_breaker import (
+    CircuitBreaker,
+    CircuitOpenError,
+    CircuitState,
+    get_circuit_breaker,
+)
+from app.media_generator.dummy_media_generator.dummy_media_generator_model import (
+    DummyMediaGeneratorModel,
+    ErrorSimulator,
+)
+from app.media_generator.media_generator import MediaGenerator
+from app.media_generator.media_generator_model import (
+    GenerateMediaServiceError,
+    RateLimitedMediaGeneratorError,
+)
+
+
+@pytest_asyncio.fixture
+async def circuit_breaker():
+    redis = Redis.from_url(str(settings.REDIS_URL))
+    yield CircuitBreaker(
+        redis,
+        failure_threshold=2,
+        open_seconds=0.2,
+        key_prefix=f"test:{uuid.uuid4()}:",
+    )
+    await redis.aclose()
+
+
+@pytest.mark.asyncio
+async def test_circuit_breaker_opens_after_consecutive_failures(
+    circuit_breaker: CircuitBreaker,
+):
+    await circuit_breaker.record_failure()
+    await circuit_breaker.record_success()
+    await circuit_breaker.record_failure()
+    await circuit_breaker.acquire()
+    await circuit_breaker.record_failure()
+
+    with pytest.raises(CircuitOpenError):
+        await circuit_breaker.acquire()
+    assert (await circuit_breaker.state()).state is CircuitState.OPEN
+
+
+@pytest.mark.asyncio
+async def test_circuit_breaker_half_open_probe(circuit_breaker: CircuitBreaker):
+    await circuit_breaker.record_failure()
+    await circuit_breaker.record_failure()
+    await asyncio.sleep(0.2)
+    assert (await circuit_breaker.state()).state is CircuitState.HALF_OPEN
+
+    # a single probe at a time, its failure opens the breaker again
+    assert await circuit_breaker.acquire()
+    with pytest.raises(CircuitOpenError):
+        await circuit_breaker.acquire()
+    await circuit_breaker.release_probe()
+    assert await circuit_breaker.acquire()
+    await circuit_breaker.record_failure()
+    assert (await circuit_breaker.state()).state is CircuitState.OPEN
+
+    await asyncio.sleep(0.2)
+    await circuit_breaker.acquire()
+    await circuit_breaker.record_success()
+    state = await circuit_breaker.state()
+    assert state.state is CircuitState.CLOSED
+    assert state.consecutive_failures == 0
+
+
+class ServiceDownErrorSimulator(ErrorSimulator):
+    calls = 0
+
+    def maybe_raise_error(self):
+        self.calls += 1
+        raise GenerateMediaServiceError("service unavailable")
+
+
+@pytest.mark.asyncio
+async def test_generation_is_deferred_while_the_circuit_breaker_is_open(
+    circuit_breaker: CircuitBreaker,
+    media_repository: MediaRepository,
+    logs_repository,
+    storage,
+    task_scheduler,
+):
+    simulator = ServiceDownErrorSimulator()
+    media_generator = MediaGenerator(
+        DummyMediaGeneratorModel(simulator, 0),
+        media_repository,
+        logs_repository,
+        storage,
+        task_scheduler,
+        circuit_breaker=circuit_breaker,
+    )
+    for _ in range(2):
+        media = await media_repository.create_media(prompt="provider is down")
+        await media_generator.generate_media(media.id)
+    assert simulator.calls == 2
+
+    media = await media_repository.create_media(prompt="provider is down")
+    deferred = await media_generator.generate_media(media.id)
+    assert simulator.calls == 2
+    assert deferred.status is MediaStatus.IN_QUEUE
+    assert deferred.number_of_tries == media.number_of_tries
+    assert deferred.next_run == (await circuit_breaker.state()).reopen_at
+
+
+class RateLimitedErrorSimulator(ErrorSimulator):
+    def maybe_raise_error(self):
+        raise RateLimitedMediaGeneratorError("too many requests")
+
+
+@pytest.mark.asyncio
+async def test_half_open_probe_rate_limited(
+    circuit_breaker: CircuitBreaker,
+    media_repository: MediaRepository,
+    logs_repository,
+    storage,
+    task_scheduler,
+):
+    await circuit_breaker.record_failure()
+    await circuit_breaker.record_failure()
+    await asyncio.sleep(0.2)
+    media_generator = MediaGenerator(
+        DummyMediaGeneratorModel(RateLimitedErrorSimulator(), 0),
+        media_repository,
+        logs_repository,
+        storage,
+        task_scheduler,
+        circuit_breaker=circuit_breaker,
+    )
+    media = await media_repository.create_media(prompt="provider is rate limited")
+    rescheduled = await media_generator.generate_media(media.id)
+    assert rescheduled.status is MediaStatus.IN_QUEUE
+
+    # the probe didn't tell whether the provider is up, the next caller probes it
+    assert (await circuit_breaker.state()).state is CircuitState.HALF_OPEN
+    assert await circuit_breaker.acquire()
+
+
+def test_circuit_breaker_state_endpoint(test_client: TestClient):
+    # created on the app event loop, with the app redis client
+    def circuit_breaker() -> CircuitBreaker:
+        return CircuitBreaker(
+            get_redis(),
+            failure_threshold=2,
+            open_seconds=30,
+            key_prefix=f"test:{uuid.uuid4()}:",
+        )
+
+    fastapi_app.dependency_overrides[get_circuit_breaker] = circuit_breaker
+    try:
+        response = test_client.get("/tools/circuit_breaker")
+    finally:
+        del fastapi_app.dependency_overrides[get_circuit_breaker]
+    assert response.status_code == 200
+    assert response.json() == {
+        "enabled": True,
+        "available": True,
+        "state": "CLOSED",
+        "consecutive_failures": 0,
+        "reopen_at": None,
+    }
+
+
+def test_circuit_breaker_state_endpoint_without_redis(test_client: TestClient):
+    def unavailable_circuit_breaker() -> CircuitBreaker:
+        # nothing listens on port 1
+        return CircuitBreaker(
+            Redis.from_url("redis://localhost:1"),
+            failure_threshold=2,
+            open_seconds=30,
+        )
+
+    fastapi_app.dependency_overrides[get_circuit_breaker] = unavailable_circuit_breaker
+    try:
+        response = test_client.get("/tools/circuit_breaker")
+    finally:
+        del fastapi_app.dependency_overrides[get_circuit_breaker]
+    assert response.status_code == 200
+    assert response.json() == {"enabled": True, "available": False}
@@ -20,6 +20,8 @@ async def test_generate_media(
     assert media.id == generated_media.id
     assert generated_media.status is MediaStatus.COMPLETED
     assert generated_media.media_uri is not None
+    assert generated_media.sha256 is not None
+    assert generated_media.size_bytes > 0
 
 
 class NoErrorErrorSimulator(ErrorSimulator):
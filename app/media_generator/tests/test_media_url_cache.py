@@ -0,0 +1,46 @@
+import uuid
+
+import pytest
+from redis.asyncio import Redis
+
+from app.core.config import settings
+from app.media_generator.media_url_cache import MediaUrlCache
+
+
+@pytest.mark.asyncio
+async def test_media_url_cache_evicts_least_recently_used():
+    cache = MediaUrlCache(max_size=2, safety_margin_seconds=10)
+    await cache.set("s3://bucket/a.png", "url-a", 3600)
+    await cache.set("s3://bucket/b.png", "url-b", 3600)
+    assert await cache.get("s3://bucket/a.png") == "url-a"
+    await cache.set("s3://bucket/c.png", "url-c", 3600)
+
+    assert await cache.get("s3://bucket/b.png") is None
+    assert await cache.get("s3://bucket/a.png") == "url-a"
+    assert await cache.get("s3://bucket/c.png") == "url-c"
+    assert cache.local_hits == 3
+    assert cache.misses == 1
+
+
+@pytest.mark.asyncio
+async def test_media_url_cache_ignores_urls_close_to_expiration():
+    cache = MediaUrlCache(max_size=2, safety_margin_seconds=300)
+    await cache.set("s3://bucket/a.png", "url-a", 299)
+    assert await cache.get("s3://bucket/a.png") is None
+
+
+@pytest.mark.asyncio
+async def test_media_url_cache_is_shared_through_redis():
+    redis = Redis.from_url(str(settings.REDIS_URL))
+    key_prefix = f"test_media_url:{uuid.uuid4()}:"
+    try:
+        first_worker_cache = MediaUrlCache(10, 300, redis, key_prefix)
+        second_worker_cache = MediaUrlCache(10, 300, redis, key_prefix)
+        await first_worker_cache.set("s3://bucket/a.png", "url-a", 3600)
+
+        assert await second_worker_cache.get("s3://bucket/a.png") == "url-a"
+        assert await second_worker_cache.get("s3://bucket/a.png") == "url-a"
+        assert second_worker_cache.redis_hits == 1
+        assert second_worker_cache.local_hits == 1
+    finally:
+        await redis.aclose()
@@ -0,0 +1,65 @@
+import uuid
+
+import pytest
+from fastapi.testclient import TestClient
+from redis.asyncio import Redis
+
+from app.core.config import settings
+from app.main import fastapi_app
+from app.media.media_repository import MediaRepository
+from app.media_generator.media_generator import MediaGenerator
+from app.media_generator.prompt_result_cache import (
+    PromptResultCache,
+    get_prompt_result_cache,
+)
+from app.media_generator.stored_media import StoredMedia
+
+# nothing listens on port 1
+UNAVAILABLE_REDIS_URL = "redis://localhost:1"
+
+
+@pytest.mark.asyncio
+async def test_prompt_result_cache_normalizes_prompts():
+    redis = Redis.from_url(str(settings.REDIS_URL))
+    cache = PromptResultCache(redis, ttl_seconds=60, key_prefix=f"test:{uuid.uuid4()}:")
+    try:
+        stored_media = StoredMedia(
+            uri="s3://bucket/car.png", sha256="0" * 64, size_bytes=10
+        )
+        await cache.set("a  red\tcar ", stored_media)
+        assert await cache.get("a red car") == stored_media
+        assert await cache.get("a red car", {"width": 512}) is None
+        assert await cache.stats() == {"hits": 1, "misses": 1, "hit_rate": 0.5}
+    finally:
+        await redis.aclose()
+
+
+@pytest.mark.asyncio
+async def test_generated_media_is_stored_in_prompt_result_cache(
+    media_generator: MediaGenerator, media_repository: MediaRepository
+):
+    redis = Redis.from_url(str(settings.REDIS_URL))
+    cache = PromptResultCache(redis, ttl_seconds=60, key_prefix=f"test:{uuid.uuid4()}:")
+    media_generator.result_cache = cache
+    try:
+        media = await media_repository.create_media(prompt="a cached prompt")
+        media = await media_generator.generate_media(media.id)
+        stored_media = await cache.get("a cached prompt")
+        assert stored_media.uri == media.media_uri
+        assert stored_media.sha256 == media.sha256
+    finally:
+        media_generator.result_cache = None
+        await redis.aclose()
+
+
+def test_prompt_result_cache_stats_without_redis(test_client: TestClient):
+    def unavailable_cache() -> PromptResultCache:
+        return PromptResultCache(Redis.from_url(UNAVAILABLE_REDIS_URL), ttl_seconds=60)
+
+    fastapi_app.dependency_overrides[get_prompt_result_cache] = unavailable_cache
+    try:
+        response = test_client.get("/tools/prompt_result_cache")
+    finally:
+        del fastapi_app.dependency_overrides[get_prompt_result_cache]
+    assert response.status_code == 200
+    assert response.json() == {"enabled": True, "available": False}
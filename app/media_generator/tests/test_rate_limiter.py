@@ -0,0 +1,123 @@
+import uuid
+
+import pytest
+import pytest_asyncio
+from redis.asyncio import Redis
+
+from app.core.config import settings
+from app.media.media_repository import MediaRepository
+from app.media.media_status import MediaStatus
+from app.media_generator.dummy_media_generator.dummy_media_generator_model import (
+    DummyMediaGeneratorModel,
+    ErrorSimulator,
+)
+from app.media_generator.media_generator import MediaGenerator
+from app.media_generator.media_generator_model import RateLimitedMediaGeneratorError
+from app.media_generator.rate_limiter import RateLimiter
+
+
+@pytest_asyncio.fixture
+async def redis():
+    redis = Redis.from_url(str(settings.REDIS_URL))
+    yield redis
+    await redis.aclose()
+
+
+def rate_limiter(redis: Redis, rate_per_second: float, burst: int) -> RateLimiter:
+    return RateLimiter(
+        redis,
+        name="model",
+        rate_per_second=rate_per_second,
+        burst=burst,
+        key_prefix=f"test:{uuid.uuid4()}:",
+    )
+
+
+@pytest.mark.asyncio
+async def test_rate_limiter_allows_the_burst_then_the_rate(redis: Redis):
+    limiter = rate_limiter(redis, rate_per_second=20, burst=2)
+    assert await limiter.acquire(0)
+    assert await limiter.acquire(0)
+    assert not await limiter.acquire(0)
+    assert await limiter.acquire(1)
+
+
+@pytest.mark.asyncio
+async def test_rate_limiter_adapts_to_the_provider(redis: Redis):
+    limiter = rate_limiter(redis, rate_per_second=10, burst=1)
+    await limiter.slow_down()
+    await limiter.slow_down()
+    assert await limiter.current_rate() == pytest.approx(2.5)
+    # grows back linearly, by a tenth of the configured rate
+    await limiter.speed_up()
+    assert await limiter.current_rate() == pytest.approx(3.5)
+    for _ in range(20):
+        await limiter.speed_up()
+    assert await limiter.current_rate() == pytest.approx(10)
+
+
+class RateLimitedErrorSimulator(ErrorSimulator):
+    def maybe_raise_error(self):
+        raise RateLimitedMediaGeneratorError("too many requests", retry_after_seconds=3)
+
+
+@pytest.mark.asyncio
+async def test_rate_limited_generation_is_rescheduled_without_counting_a_try(
+    redis: Redis,
+    media_repository: MediaRepository,
+    logs_repository,
+    storage,
+    task_scheduler,
+):
+    limiter = rate_limiter(redis, rate_per_second=10, burst=1)
+    media_generator = MediaGenerator(
+        DummyMediaGeneratorModel(RateLimitedErrorSimulator(), 0),
+        media_repository,
+        logs_repository,
+        storage,
+        task_scheduler,
+        rate_limiter=limiter,
+        rate_limit_wait_seconds=0,
+    )
+
+    media = await media_repository.create_media(prompt="a rate limited prompt")
+    rescheduled = await media_generator.generate_media(media.id)
+    assert rescheduled.status is MediaStatus.IN_QUEUE
+    assert rescheduled.number_of_tries == media.number_of_tries
+    assert rescheduled.next_run is not None
+    assert await limiter.current_rate() == pytest.approx(5)
+
+    # the bucket is empty, the model isn't called
+    media = await media_repository.create_media(prompt="a throttled prompt")
+    rescheduled = await media_generator.generate_media(media.id)
+    assert rescheduled.status is MediaStatus.IN_QUEUE
+    assert rescheduled.number_of_tries == media.number_of_tries
+
+
+@pytest.mark.asyncio
+async def test_rate_limited_generation_counts_a_try_past_max_reschedules(
+    redis: Redis,
+    media_repository: MediaRepository,
+    logs_repository,
+    storage,
+    task_scheduler,
+):
+    media_generator = MediaGenerator(
+        DummyMediaGeneratorModel(RateLimitedErrorSimulator(), 0),
+        media_repository,
+        logs_repository,
+        storage,
+        task_scheduler,
+        rate_limiter=rate_limiter(redis, rate_per_second=1000, burst=10),
+        rate_limit_wait_seconds=0,
+        max_reschedules=2,
+    )
+
+    media = await media_repository.create_media(prompt="an always rate limited prompt")
+    for number_of_reschedules in (1, 2):
+        media = await media_generator.generate_media(media.id)
+        assert media.number_of_reschedules == number_of_reschedules
+        assert media.number_of_tries == 0
+    media = await media_generator.generate_media(media.id)
+    assert media.status is MediaStatus.IN_QUEUE
+    assert media.number_of_tries == 1
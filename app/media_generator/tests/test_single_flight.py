@@ -0,0 +1,101 @@
+import asyncio
+import uuid
+
+import pytest
+import pytest_asyncio
+from redis.asyncio import Redis
+
+from app.core.config import settings
+from app.media_generator.single_flight import SingleFlight
+from app.media_generator.stored_media import StoredMedia
+
+
+def stored_media(name: str) -> StoredMedia:
+    return StoredMedia(uri=f"s3://bucket/{name}.png", sha256="0" * 64, size_bytes=10)
+
+
+@pytest_asyncio.fixture
+async def single_flight():
+    redis = Redis.from_url(str(settings.REDIS_URL))
+    yield SingleFlight(
+        redis,
+        lease_seconds=1,
+        wait_timeout_seconds=5,
+        result_ttl_seconds=60,
+        poll_interval_seconds=0.01,
+        key_prefix=f"test:{uuid.uuid4()}:",
+    )
+    await redis.aclose()
+
+
+@pytest.mark.asyncio
+async def test_followers_complete_from_the_leader_media(single_flight: SingleFlight):
+    generations = 0
+
+    async def generate() -> StoredMedia:
+        nonlocal generations
+        generations += 1
+        await asyncio.sleep(0.1)
+        return stored_media(f"generation-{generations}")
+
+    results = await asyncio.gather(
+        *[single_flight.run("prompt", generate) for _ in range(5)]
+    )
+
+    assert generations == 1
+    assert results == [stored_media("generation-1")] * 5
+
+
+@pytest.mark.asyncio
+async def test_follower_is_promoted_when_the_leader_fails(single_flight: SingleFlight):
+    leader_started = asyncio.Event()
+
+    async def failing_generate() -> StoredMedia:
+        leader_started.set()
+        await asyncio.sleep(0.05)
+        raise ValueError("model failed")
+
+    async def generate() -> StoredMedia:
+        return stored_media("follower")
+
+    leader = asyncio.create_task(single_flight.run("prompt", failing_generate))
+    await leader_started.wait()
+    follower = asyncio.create_task(single_flight.run("prompt", generate))
+
+    with pytest.raises(ValueError):
+        await leader
+    assert await follower == stored_media("follower")
+
+
+@pytest.mark.asyncio
+async def test_follower_is_promoted_when_the_lease_expires(
+    single_flight: SingleFlight,
+):
+    # a leader that died without releasing its lease
+    await single_flight.redis.set(
+        f"{single_flight.key_prefix}lease:prompt", "dead leader", px=200
+    )
+
+    async def generate() -> StoredMedia:
+        return stored_media("follower")
+
+    assert await single_flight.run("prompt", generate) == stored_media("follower")
+
+
+@pytest.mark.asyncio
+async def test_published_media_is_reused_after_the_lease_release(
+    single_flight: SingleFlight,
+):
+    # the leader published its media and released its lease between two polls of a follower
+    await single_flight.redis.set(
+        f"{single_flight.key_prefix}result:prompt",
+        stored_media("leader").model_dump_json(),
+    )
+
+    async def generate() -> StoredMedia:
+        raise AssertionError("the model must not run again")
+
+    assert await single_flight.run("prompt", generate) == stored_media("leader")
+    assert not await single_flight.redis.exists(
+        f"{single_flight.key_prefix}lease:prompt"
+    )
@@ -0,0 +1,121 @@
+import random
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.media.media_repository import MediaRepository
+from app.media_generator.dummy_media_generator.dummy_media_generator_model import (
+    DummyMediaGeneratorModel,
+    ErrorSimulator,
+)
+from app.media_generator.media_generator import MediaGenerator
+from app.media_generator.stage_durations import (
+    StageDurationsRecorder,
+    StageDurationsRepository,
+)
+from app.media_generator.stage_timer import StageTimer
+
+
+class NoErrorSimulator(ErrorSimulator):
+    def maybe_raise_error(self):
+        pass
+
+
+@pytest.mark.asyncio
+async def test_generate_media_times_every_stage(
+    media_repository: MediaRepository,
+    logs_repository,
+    storage,
+    task_scheduler,
+):
+    media_generator = MediaGenerator(
+        DummyMediaGeneratorModel(NoErrorSimulator(), 0.1),
+        media_repository,
+        logs_repository,
+        storage,
+        task_scheduler,
+    )
+    media = await media_repository.create_media(prompt="a timed prompt")
+    timer = StageTimer()
+    await media_generator.generate_media(media.id, timer)
+
+    assert set(timer.durations) == {
+        "claim",
+        "queued",
+        "model",
+        "save_bytes",
+        "finish",
+        "log_run",
+    }
+    # the model waits aren't counted in save_bytes, which consumes its stream
+    assert 0.1 <= timer.durations["model"] < 0.2
+    assert timer.durations["save_bytes"] > 0
+
+
+@pytest.mark.asyncio
+async def test_stage_durations_are_aggregated_in_hourly_histograms(session):
+    # a period of its own, so the rows of other runs aren't summarized
+    period_start = datetime(2000, 1, 1, tzinfo=timezone.utc) + timedelta(
+        hours=random.randint(0, 100_000)
+    )
+    recorder = StageDurationsRecorder(session)
+    for index in range(100):
+        recorder.add({"model": 0.04, "claim": 0.002}, at=period_start)
+    recorder.add({"model": 7}, at=period_start + timedelta(minutes=30))
+    await recorder.flush()
+    # added to the existing rows
+    recorder.add({"claim": 0.002}, at=period_start)
+    await recorder.flush()
+
+    summaries = await StageDurationsRepository(session).summary(
+        period_start, period_start + timedelta(hours=1)
+    )
+    by_stage = {summary.stage: summary for summary in summaries}
+    assert by_stage["claim"].count == 101
+    assert by_stage["claim"].p99_seconds == 0.005
+    model = by_stage["model"]
+    assert model.count == 101
+    assert model.mean_seconds == pytest.approx((100 * 0.04 + 7) / 101)
+    assert model.p50_seconds == 0.05
+    assert model.p99_seconds == 0.05
+
+
+@pytest.mark.asyncio
+async def test_stage_durations_are_kept_when_the_flush_fails(session):
+    period_start = datetime(2000, 1, 1, tzinfo=timezone.utc) + timedelta(
+        hours=random.randint(0, 100_000)
+    )
+
+    def unavailable_session():
+        raise ConnectionError("database unavailable")
+
+    recorder = StageDurationsRecorder(unavailable_session)
+    recorder.add({"model": 0.04}, at=period_start)
+    await recorder.flush()
+    recorder.add({"model": 0.04}, at=period_start)
+    # the database is back
+    recorder._async_session = session
+    await recorder.flush()
+
+    summaries = await StageDurationsRepository(session).summary(
+        period_start, period_start + timedelta(hours=1)
+    )
+    assert [(summary.stage, summary.count) for summary in summaries] == [("model", 2)]
+
+
+@pytest.mark.asyncio
+async def test_stage_durations_above_the_last_bucket(session, test_client: TestClient):
+    stage = f"slow_{uuid.uuid4().hex}"
+    recorder = StageDurationsRecorder(session)
+    recorder.add({stage: 1})
+    recorder.add({stage: 500})
+    await recorder.flush()
+
+    response = test_client.get("/tools/media_generation_stages", params={"hours": 1})
+    assert response.status_code == 200, response.text
+    (summary,) = [item for item in response.json() if item["stage"] == stage]
+    assert summary["count"] == 2
+    assert summary["p50_seconds"] == 1
+    assert summary["p99_seconds"] is None
@@ -0,0 +1,175 @@
+from typing import AsyncIterator
+
+import hashlib
+import os
+
+import pytest
+from botocore.exceptions import ClientError
+
+from app.media_generator.storage import Storage, MIN_MULTIPART_PART_SIZE
+
+
+async def stream_bytes(
+    size: int, chunk_size: int = 1024 * 1024
+) -> AsyncIterator[bytes]:
+    for offset in range(0, size, chunk_size):
+        yield bytes([offset % 256]) * min(chunk_size, size - offset)
+
+
+async def read_object(storage: Storage, uri: str) -> bytes:
+    bucket, key = uri[5:].split("/", 1)
+    async with storage.aio_session.client("s3", endpoint_url=storage.s3_url) as s3:
+        response = await s3.get_object(Bucket=bucket, Key=key)
+        return await response["Body"].read()
+
+
+@pytest.mark.asyncio
+async def test_save_small_stream(storage: Storage):
+    stored_media = await storage.save_bytes(stream_bytes(1000, chunk_size=100))
+    assert await read_object(storage, stored_media.uri) == b"".join(
+        [chunk async for chunk in stream_bytes(1000, chunk_size=100)]
+    )
+
+
+@pytest.mark.asyncio
+async def test_save_large_stream_with_multipart_upload(storage: Storage):
+    size = 2 * MIN_MULTIPART_PART_SIZE + 1234
+    stored_media = await storage.save_bytes(stream_bytes(size))
+    data = await read_object(storage, stored_media.uri)
+    assert len(data) == size
+    assert data == b"".join([chunk async for chunk in stream_bytes(size)])
+    assert stored_media.size_bytes == size
+    assert stored_media.sha256 == hashlib.sha256(data).hexdigest()
+
+
+@pytest.mark.asyncio
+async def test_failed_multipart_upload_is_aborted(storage: Storage):
+    async def failing_stream() -> AsyncIterator[bytes]:
+        async for chunk in stream_bytes(2 * MIN_MULTIPART_PART_SIZE):
+            yield chunk
+        raise ValueError("model stream failed")
+
+    with pytest.raises(ValueError):
+        await storage.save_bytes(failing_stream())
+
+    async with storage.aio_session.client("s3", endpoint_url=storage.s3_url) as s3:
+        uploads = await s3.list_multipart_uploads(Bucket=storage.bucket_name)
+    assert uploads.get("Uploads", []) == []
+
+
+@pytest.mark.asyncio
+async def test_started_storage_reuses_its_client(storage: Storage):
+    started_storage = Storage(
+        aio_session=storage.aio_session,
+        bucket_name=storage.bucket_name,
+        s3_url=storage.s3_url,
+    )
+    await started_storage.start()
+    try:
+        client = started_storage._client
+        first_media = await started_storage.save_bytes(stream_bytes(1000))
+        second_media = await started_storage.save_bytes(stream_bytes(2000))
+        assert started_storage._client is client
+        assert await read_object(started_storage, first_media.uri) == bytes(1000)
+        assert await read_object(started_storage, second_media.uri) == bytes(2000)
+    finally:
+        await started_storage.close()
+    assert not started_storage.is_started
+
+
+async def head_object(storage: Storage, key: str) -> dict | None:
+    async with storage.aio_session.client("s3", endpoint_url=storage.s3_url) as s3:
+        try:
+            return await s3.head_object(Bucket=storage.bucket_name, Key=key)
+        except ClientError as error:
+            if error.response["Error"]["Code"] in ("404", "NoSuchKey", "NotFound"):
+                return None
+            raise
+
+
+async def mark_object(storage: Storage, key: str):
+    # an upload or a copy to the key would replace the metadata
+    async with storage.aio_session.client("s3", endpoint_url=storage.s3_url) as s3:
+        await s3.copy_object(
+            Bucket=storage.bucket_name,
+            Key=key,
+            CopySource={"Bucket": storage.bucket_name, "Key": key},
+            Metadata={"marker": "first"},
+            MetadataDirective="REPLACE",
+        )
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("size", [1000, MIN_MULTIPART_PART_SIZE + 1000])
+async def test_identical_medias_are_stored_once(
+    storage: Storage, size: int, monkeypatch
+):
+    storage = Storage(
+        aio_session=storage.aio_session,
+        bucket_name=storage.bucket_name,
+        s3_url=storage.s3_url,
+        multipart_part_size=storage.multipart_part_size,
+        content_addressed=True,
+    )
+    file_key = storage._file_key
+    file_keys = []
+
+    def recorded_file_key(*args):
+        file_keys.append(file_key(*args))
+        return file_keys[-1]
+
+    monkeypatch.setattr(storage, "_file_key", recorded_file_key)
+    content = os.urandom(size)
+    content_key = f"{hashlib.sha256(content).hexdigest()}.png"
+
+    async def stream() -> AsyncIterator[bytes]:
+        yield content
+
+    first_media = await storage.save_bytes(stream())
+    await mark_object(storage, content_key)
+    second_media = await storage.save_bytes(stream())
+
+    assert first_media == second_media
+    assert first_media.uri == f"s3://{storage.bucket_name}/{content_key}"
+    assert (await head_object(storage, content_key))["Metadata"] == {"marker": "first"}
+    # the temporary keys of the multipart uploads are deleted
+    for key in set(file_keys) - {content_key}:
+        assert await head_object(storage, key) is None
+    assert await read_object(storage, first_media.uri) == content
+
+
+@pytest.mark.asyncio
+async def test_identical_medias_have_their_own_keys_by_default(storage: Storage):
+    content = os.urandom(1000)
+
+    async def stream() -> AsyncIterator[bytes]:
+        yield content
+
+    first_media = await storage.save_bytes(stream())
+    second_media = await storage.save_bytes(stream())
+
+    assert first_media.uri != second_media.uri
+    assert first_media.sha256 == second_media.sha256
+    assert await read_object(storage, second_media.uri) == content
+
+
+@pytest.mark.asyncio
+async def test_read_media_in_bounded_chunks(storage: Storage):
+    content = os.urandom(100_000)
+
+    async def stream() -> AsyncIterator[bytes]:
+        yield content
+
+    stored_media = await storage.save_bytes(stream())
+    chunks = [
+        chunk async for chunk in storage.read_media(stored_media.uri, chunk_size=4096)
+    ]
+    assert b"".join(chunks) == content
+    assert max(len(chunk) for chunk in chunks) <= 4096
+
+    chunks = [chunk async for chunk in storage.read_media(stored_media.uri, 10, 20_009)]
+    assert b"".join(chunks) == content[10:20_010]
+    assert await storage.head_media(stored_media.uri) == (
+        len(content),
+        f'"{hashlib.md5(content).hexdigest()}"',
+    )
@@ -1,6 +1,10 @@
 from celery import Celery
+from kombu import Queue
+from kombu.transport.redis import PRIORITY_STEPS, Channel
+from redis.asyncio import Redis
 
 from app.core.config import settings
+from app.media.media_priority import MediaPriority
 
 celery_app = Celery(
     "media_processing",
@@ -10,4 +14,44 @@ celery_app = Celery(
     timezone="UTC",
 )
 
+
+def media_queue(priority: MediaPriority) -> str:
+    return f"media_{priority.lower()}"
+
+
+# the default queue keeps the maintenance and health check tasks
+celery_app.conf.task_default_queue = "celery"
+celery_app.conf.task_queues = [
+    Queue("celery"),
+    *[Queue(media_queue(priority)) for priority in MediaPriority],
+]
+# a worker only reserves the task it's about to run, so a backlog in one queue doesn't sit in front of the others
+celery_app.conf.worker_prefetch_multiplier = 1
+
+
+async def celery_queue_depths(redis: Redis) -> dict[str, int]:
+    """
+    tasks waiting in each queue, the redis broker keeps a list per queue and task priority step
+    """
+    async with redis.pipeline(transaction=False) as pipeline:
+        for queue in celery_app.conf.task_queues:
+            for step in PRIORITY_STEPS:
+                pipeline.llen(
+                    f"{queue.name}{Channel.sep}{step}" if step else queue.name
+                )
+        lengths = await pipeline.execute()
+    steps = len(PRIORITY_STEPS)
+    return {
+        queue.name: sum(lengths[index * steps : (index + 1) * steps])
+        for index, queue in enumerate(celery_app.conf.task_queues)
+    }
+
+
+celery_app.conf.beat_schedule = {
+    "maintain-log-partitions": {
+        "task": "app.tasks.celery_tasks.maintain_log_partitions",
+        "schedule": settings.LOG_PARTITIONS_MAINTENANCE_INTERVAL_SECONDS,
+    },
+}
+
 celery_app.autodiscover_tasks(["app.tasks.celery_tasks"], force=True)
@@ -2,15 +2,30 @@ import contextlib
 import logging
 import random
 from datetime import datetime
-from typing import AsyncGenerator
+from typing import Iterator
 
-import aioboto3
 import sentry_sdk
-from asgiref.sync import async_to_sync
+from celery.signals import (
+    worker_init,
+    worker_process_init,
+    worker_process_shutdown,
+    worker_shutdown,
+)
+from kombu import Producer
+from kombu.transport.redis import Channel as RedisChannel
+from kombu.utils.json import dumps
+from redis.client import Pipeline
 from sentry_sdk.integrations.celery import CeleryIntegration
-from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 
 from app.core.config import settings
+from app.core.database import setup_database, get_db, get_engine
+from app.core.metrics import start_metrics_server, mark_process_dead
+from app.core.redis import setup_redis, close_redis
+from app.media_generator.circuit_breaker import (
+    setup_circuit_breaker,
+    close_circuit_breaker,
+    get_circuit_breaker,
+)
 from app.media_generator.dummy_media_generator.dummy_media_generator_model import (
     ErrorSimulator,
     DummyMediaGeneratorModel,
@@ -20,13 +35,49 @@ from app.media_generator.media_generator_model import (
     GenericMediaGeneratorError,
     GenerateMediaServiceError,
 )
+from app.media_generator.prompt_result_cache import (
+    setup_prompt_result_cache,
+    close_prompt_result_cache,
+    get_prompt_result_cache,
+)
+from app.media_generator.rate_limiter import (
+    setup_rate_limiters,
+    close_rate_limiters,
+    get_rate_limiter,
+)
+from app.media_generator.single_flight import (
+    setup_single_flight,
+    close_single_flight,
+    get_single_flight,
+)
+from app.media_generator.stage_durations import (
+    setup_stage_durations_recorder,
+    close_stage_durations_recorder,
+    get_stage_durations_recorder,
+)
+from app.media_generator.stage_timer import StageTimer
 from app.media_generator.task_scheduler import TaskScheduler
-from app.media_generator.storage import Storage
+from app.media_generator.storage import setup_storage, close_storage, get_storage
 from app.logs.log_crud import LogsRepository
+from app.logs.log_partitions import LogPartitionsRepository
+from app.logs.log_sink import setup_log_sink, close_log_sink, get_log_sink
 from app.media.job_id import JobId
+from app.media.media import Media
 from app.media.media_id import MediaId
+from app.media.media_priority import MediaPriority
 from app.media.media_repository import MediaRepository
-from app.tasks.celery import celery_app
+from app.media.media_status_cache import (
+    setup_media_status_cache,
+    close_media_status_cache,
+    get_media_status_cache,
+)
+from app.media.media_status_notifier import (
+    setup_media_status_notifier,
+    close_media_status_notifier,
+    get_media_status_notifier,
+)
+from app.tasks.celery import celery_app, media_queue
+from app.tasks.worker_event_loop import worker_event_loop
 
 logger = logging.getLogger(__name__)
 
@@ -49,71 +100,245 @@ def celery_health_check(*, message: str):
     return {"statusCode": 200, "message": message}
 
 
-@contextlib.asynccontextmanager
-async def get_db_session_maker() -> AsyncGenerator:
-    async_engine = create_async_engine(f"{settings.ASYNC_SQLALCHEMY_DATABASE_URI}")
-    try:
-        db = async_sessionmaker(
-            async_engine,
-            expire_on_commit=False,
-            autoflush=False,
-            autocommit=False,
+@worker_init.connect
+def start_worker_metrics_server(**kwargs):
+    """
+    the worker main process exports the metrics of the processes it forks, see app.core.metrics
+    """
+    if settings.WORKER_METRICS_PORT is not None:
+        start_metrics_server(settings.WORKER_METRICS_PORT)
+
+
+@worker_process_shutdown.connect
+def mark_worker_metrics_process_dead(pid: int, **kwargs):
+    mark_process_dead(pid)
+
+
+@worker_process_init.connect
+def init_worker_resources(**kwargs):
+    """
+    creates the resources shared by every task of a worker process: the event loop, the database pool, the log sink,
+    the redis client and the s3 client.
+    pools that don't fork (solo, threads) never send worker_process_init, in that case this is called lazily by the
+    first task.
+    """
+    if worker_event_loop.start():
+        async_session = setup_database(
+            pool_size=settings.WORKER_DB_POOL_SIZE,
+            max_overflow=settings.WORKER_DB_MAX_OVERFLOW,
         )
-        yield db
+        worker_event_loop.run(_setup_log_sink(async_session))
+        worker_event_loop.run(_setup_stage_durations_recorder(async_session))
+        redis = setup_redis()
+        setup_media_status_cache(redis)
+        setup_media_status_notifier(redis)
+        setup_prompt_result_cache(redis)
+        setup_single_flight(redis)
+        setup_rate_limiters(redis)
+        setup_circuit_breaker(redis)
+        worker_event_loop.run(setup_storage())
+
+
+async def _setup_log_sink(async_session):
+    # the sink background task must run on the worker event loop
+    setup_log_sink(async_session)
+
+
+async def _setup_stage_durations_recorder(async_session):
+    # as the log sink, its background task must run on the worker event loop
+    setup_stage_durations_recorder(async_session)
+
+
+@worker_process_shutdown.connect
+@worker_shutdown.connect
+def shutdown_worker_resources(**kwargs):
+    if not worker_event_loop.is_running:
+        return
+    try:
+        if not worker_event_loop.drain(settings.WORKER_SHUTDOWN_TIMEOUT_SECONDS):
+            logger.warning(
+                f"{worker_event_loop.in_flight} media generations still running on shutdown"
+            )
+        worker_event_loop.run(close_storage())
+        close_circuit_breaker()
+        close_rate_limiters()
+        close_single_flight()
+        close_prompt_result_cache()
+        close_media_status_notifier()
+        close_media_status_cache()
+        worker_event_loop.run(close_redis())
+        worker_event_loop.run(close_stage_durations_recorder())
+        worker_event_loop.run(close_log_sink())
+        worker_event_loop.run(get_engine().dispose())
     finally:
-        await async_engine.dispose()
+        worker_event_loop.stop()
 
 
 async def _generate_media(media_id: MediaId):
     class ServiceErrorSimulator(ErrorSimulator):
         def maybe_raise_error(self):
-            if random.randint(1, 100) > 70:
+            if random.random() < settings.DUMMY_MODEL_ERROR_RATE:
                 if random.randint(1, 100) > 80:
                     raise GenerateMediaServiceError("test service error")
                 else:
                     raise GenericMediaGeneratorError("test generic error")
 
-    media_generator_model = DummyMediaGeneratorModel(ServiceErrorSimulator(), 5)
-    async with get_db_session_maker() as db_session:
-        media_repository = MediaRepository(db_session)
-        session = aioboto3.Session(
-            aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
-            aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
-            region_name=settings.AWS_DEFAULT_REGION,
-        )
+    media_generator_model = DummyMediaGeneratorModel(
+        ServiceErrorSimulator(), settings.DUMMY_MODEL_DELAY_SECONDS
+    )
+    db_session = get_db()
+    media_repository = MediaRepository(
+        db_session, get_media_status_cache(), get_media_status_notifier()
+    )
 
-        storage = Storage(
-            aio_session=session,
-            bucket_name=settings.BUCKET_NAME,
-            s3_url=settings.S3_ENDPOINT_URL,
-        )
+    class CeleryTaskScheduler(TaskScheduler):
+        def schedule_media_generation(
+            self, media_id: MediaId, eta: datetime, priority: MediaPriority
+        ) -> JobId:
+            return create_media.apply_async(
+                kwargs={"media_id": str(media_id)},
+                eta=eta,
+                queue=media_queue(priority),
+            ).id
 
-        class CeleryTaskScheduler(TaskScheduler):
-            def schedule_media_generation(
-                self, media_id: MediaId, eta: datetime
-            ) -> JobId:
-                return create_media.apply_async(
-                    kwargs={"media_id": str(media_id)}, eta=eta
-                ).id
-
-        log_repository = LogsRepository(db_session)
-        media_generator = MediaGenerator(
-            media_generator_model,
-            media_repository,
-            storage=storage,
-            task_scheduler=CeleryTaskScheduler(),
-            logs_repository=log_repository,
-        )
-        media = await media_generator.generate_media(media_id)
-        if media is None:
-            return None
-        else:
-            return media.model_dump_json()
+    log_repository = LogsRepository(db_session, get_log_sink())
+    media_generator = MediaGenerator(
+        media_generator_model,
+        media_repository,
+        storage=get_storage(),
+        task_scheduler=CeleryTaskScheduler(),
+        logs_repository=log_repository,
+        result_cache=get_prompt_result_cache(),
+        single_flight=get_single_flight(),
+        rate_limiter=get_rate_limiter(type(media_generator_model).__name__),
+        rate_limit_wait_seconds=settings.MODEL_RATE_LIMIT_WAIT_SECONDS,
+        rate_limit_reschedule_seconds=settings.MODEL_RATE_LIMIT_RESCHEDULE_SECONDS,
+        max_reschedules=settings.MEDIA_MAX_RESCHEDULES,
+        circuit_breaker=get_circuit_breaker(),
+        stage_durations_recorder=get_stage_durations_recorder(),
+    )
+    timer = StageTimer()
+    media = await media_generator.generate_media(media_id, timer)
+    if media is None:
+        return None
+    else:
+        return {
+            "media": media.model_dump(mode="json"),
+            "stage_durations_ms": timer.as_milliseconds(),
+        }
 
 
 @celery_app.task(bind=True)
 def create_media(self, media_id: MediaId):
+    """
+    in asyncio execution mode the generation runs concurrently with others on the process event loop and the task
+    returns as soon as it's dispatched, so there is no task result: the media status is the source of truth.
+    """
     try:
-        return async_to_sync(_generate_media)(media_id)
+        init_worker_resources()
+        if settings.WORKER_EXECUTION_MODE == "asyncio":
+            worker_event_loop.dispatch(_generate_media(media_id))
+            return None
+        return worker_event_loop.run(_generate_media(media_id))
     except Exception as error:
         logging.error(f"task: {self.request.id} error", exc_info=error)
+
+
+@celery_app.task
+def maintain_log_partitions():
+    """
+    scheduled by celery beat, creates the upcoming logs partitions and drops the expired ones
+    """
+    init_worker_resources()
+    maintenance = worker_event_loop.run(LogPartitionsRepository(get_db()).maintain())
+    return {"created": maintenance.created, "dropped": maintenance.dropped}
+
+
+# internals of kombu's redis channel the pipelined publish relies on, kombu is pinned to the minor version it was
+# tested with in pyproject.toml
+_PIPELINED_CHANNEL_ATTRIBUTES = (
+    "_put",
+    "_q_for_pri",
+    "_get_message_priority",
+    "conn_or_acquire",
+)
+
+
+@contextlib.contextmanager
+def _pipelined_publish(producer: Producer) -> Iterator[Pipeline | None]:
+    """
+    queues the messages published by the producer on a redis pipeline, that the caller sends in one round trip.
+    kombu's redis channel pushes every message with its own command, during the batch they go to the pipeline.
+    yields None for the other brokers, or a redis channel without these internals, which publish every message on
+    its own.
+    """
+    channel = producer.channel
+    if not isinstance(channel, RedisChannel) or not all(
+        hasattr(channel, name) for name in _PIPELINED_CHANNEL_ATTRIBUTES
+    ):
+        yield None
+        return
+    with channel.conn_or_acquire() as client:
+        pipeline = client.pipeline(transaction=False)
+
+    def put(queue: str, message: dict, **kwargs):
+        priority = channel._get_message_priority(message, reverse=False)
+        pipeline.lpush(channel._q_for_pri(queue, priority), dumps(message))
+
+    channel._put = put
+    try:
+        yield pipeline
+    finally:
+        # the channel goes back to the pool of the producer
+        del channel._put
+        pipeline.reset()
+
+
+def publish_create_media_tasks(medias: list[Media]) -> dict[MediaId, Exception]:
+    """
+    publishes a create_media task for every media, using its job id as task id.
+    with the redis broker, the messages of the whole batch are sent in a single pipelined round trip.
+    :return: the publishing errors by media id
+    """
+    errors = {}
+    # the pipeline commands of every published media
+    commands: dict[MediaId, range] = {}
+    with (
+        celery_app.producer_or_acquire() as producer,
+        _pipelined_publish(producer) as pipeline,
+    ):
+        for media in medias:
+            first_command = len(pipeline) if pipeline is not None else 0
+            try:
+                create_media.apply_async(
+                    kwargs={"media_id": media.id},
+                    task_id=str(media.job_id),
+                    queue=media_queue(media.priority),
+                    producer=producer,
+                    # the results are read from the medias, subscribing to them costs a round trip per task
+                    ignore_result=True,
+                )
+            except Exception as error:
+                logger.error(f"unable to publish media {media.id} task", exc_info=error)
+                errors[media.id] = error
+            else:
+                if pipeline is not None:
+                    commands[media.id] = range(first_command, len(pipeline))
+        if pipeline is not None and commands:
+            number_of_commands = len(pipeline)
+            try:
+                results = pipeline.execute(raise_on_error=False)
+            except Exception as error:
+                # nothing was published, the error is reported for every media
+                results = [error] * number_of_commands
+            for media_id, indexes in commands.items():
+                error = next(
+                    (results[i] for i in indexes if isinstance(results[i], Exception)),
+                    None,
+                )
+                if error is not None:
+                    logger.error(
+                        f"unable to publish media {media_id} task", exc_info=error
+                    )
+                    errors[media_id] = error
+    return errors
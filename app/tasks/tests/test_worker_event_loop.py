@@ -0,0 +1,52 @@
+import asyncio
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.core.config import settings
+from app.tasks.worker_event_loop import WorkerEventLoop
+
+
+def test_worker_event_loop_reuses_pooled_connections():
+    worker_event_loop = WorkerEventLoop()
+    assert worker_event_loop.start()
+    assert not worker_event_loop.start()
+    engine = create_async_engine(
+        f"{settings.ASYNC_SQLALCHEMY_DATABASE_URI}", pool_size=1, max_overflow=0
+    )
+
+    async def backend_pid() -> int:
+        async with engine.connect() as connection:
+            return (await connection.execute(text("select pg_backend_pid()"))).scalar()
+
+    try:
+        first_task_pid = worker_event_loop.run(backend_pid())
+        second_task_pid = worker_event_loop.run(backend_pid())
+        assert first_task_pid == second_task_pid
+    finally:
+        worker_event_loop.run(engine.dispose())
+        worker_event_loop.stop()
+    assert not worker_event_loop.is_running
+
+
+def test_worker_event_loop_limits_dispatched_coroutines():
+    worker_event_loop = WorkerEventLoop(max_in_flight=2)
+    worker_event_loop.start()
+    running = 0
+    max_running = 0
+
+    async def generation():
+        nonlocal running, max_running
+        running += 1
+        max_running = max(max_running, running)
+        await asyncio.sleep(0.05)
+        running -= 1
+
+    try:
+        futures = [worker_event_loop.dispatch(generation()) for _ in range(6)]
+        assert worker_event_loop.drain(timeout=5)
+    finally:
+        worker_event_loop.stop()
+    assert all(future.done() for future in futures)
+    assert max_running == 2
+    assert worker_event_loop.in_flight == 0
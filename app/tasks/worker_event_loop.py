@@ -0,0 +1,114 @@
+import asyncio
+import concurrent.futures
+import logging
+import threading
+from concurrent.futures import Future
+from typing import Any, Coroutine, TypeVar
+
+from app.core.config import settings
+from app.core.exceptions import InvalidStateException
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class WorkerEventLoop:
+    """
+    Long-lived event loop owned by a celery worker process.
+
+    Resources bound to an event loop (like the database connection pool) must be created and used on the same loop, so
+    every task of the process runs its coroutines here instead of spinning up a new loop per task.
+    """
+
+    def __init__(self, name: str = "worker-event-loop", max_in_flight: int = 1):
+        self.name = name
+        self.max_in_flight = max_in_flight
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._thread: threading.Thread | None = None
+        self._lock = threading.Lock()
+        self._in_flight_slots = threading.BoundedSemaphore(max_in_flight)
+        self._in_flight: set[Future] = set()
+        self._in_flight_lock = threading.Lock()
+
+    @property
+    def is_running(self) -> bool:
+        return self._loop is not None and self._loop.is_running()
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._in_flight)
+
+    def start(self) -> bool:
+        """
+        starts the loop in a background thread.
+        :return: True if the loop was started by this call, False if it was already running
+        """
+        with self._lock:
+            if self._loop is not None:
+                return False
+            self._loop = asyncio.new_event_loop()
+            started = threading.Event()
+            self._loop.call_soon(started.set)
+            self._thread = threading.Thread(
+                target=self._loop.run_forever, name=self.name, daemon=True
+            )
+            self._thread.start()
+            started.wait()
+            return True
+
+    def submit(self, coroutine: Coroutine[Any, Any, T]) -> Future[T]:
+        if self._loop is None:
+            coroutine.close()
+            raise InvalidStateException("worker event loop is not running")
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop)
+
+    def run(self, coroutine: Coroutine[Any, Any, T]) -> T:
+        return self.submit(coroutine).result()
+
+    def dispatch(self, coroutine: Coroutine[Any, Any, T]) -> Future[T]:
+        """
+        schedules the coroutine without waiting for its result.
+        blocks the calling thread only while max_in_flight dispatched coroutines are still running, which gives
+        backpressure to the celery pool: the process stops taking messages until a slot is free.
+        """
+        self._in_flight_slots.acquire()
+        try:
+            future = self.submit(coroutine)
+        except BaseException:
+            self._in_flight_slots.release()
+            raise
+        with self._in_flight_lock:
+            self._in_flight.add(future)
+        future.add_done_callback(self._on_dispatched_done)
+        return future
+
+    def _on_dispatched_done(self, future: Future):
+        with self._in_flight_lock:
+            self._in_flight.discard(future)
+        self._in_flight_slots.release()
+        if not future.cancelled() and future.exception() is not None:
+            logger.error("dispatched coroutine failed", exc_info=future.exception())
+
+    def drain(self, timeout: float | None = None) -> bool:
+        """
+        waits for the dispatched coroutines to finish.
+        :return: True if every dispatched coroutine finished before the timeout
+        """
+        with self._in_flight_lock:
+            in_flight = list(self._in_flight)
+        _, not_done = concurrent.futures.wait(in_flight, timeout=timeout)
+        return not not_done
+
+    def stop(self):
+        with self._lock:
+            if self._loop is None:
+                return
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._loop.close()
+            self._loop = None
+            self._thread = None
+
+
+worker_event_loop = WorkerEventLoop(max_in_flight=settings.WORKER_MAX_IN_FLIGHT)
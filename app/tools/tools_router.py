@@ -1,11 +1,22 @@
 import logging
+from datetime import datetime, timedelta, timezone
+from typing import Annotated
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query
 from fastapi.encoders import jsonable_encoder
 from sqlalchemy import text
 from starlette import status
 
 from app.core.database import AsyncSessionDep
+from app.media.api.schemas import MediaQueueOut
+from app.media.media_repository import MediaRepositoryDep
+from app.media_generator.circuit_breaker import CircuitBreakerDep
+from app.media_generator.media_url_cache import get_media_url_cache
+from app.media_generator.prompt_result_cache import PromptResultCacheDep
+from app.media_generator.stage_durations import (
+    StageDurationsRepository,
+    StageDurationsSummary,
+)
 from app.tasks.celery_tasks import celery_health_check
 
 tools_router = APIRouter()
@@ -46,3 +57,72 @@ def celery_status(message: str | None = None):
             {"message": "celery not working", "response": response},
         )
     return response
+
+
+@tools_router.get("/media_url_cache")
+def media_url_cache_stats():
+    """
+    hit and miss counters of the presigned media url cache of this api worker
+    """
+    return get_media_url_cache().stats()
+
+
+@tools_router.get("/prompt_result_cache")
+async def prompt_result_cache_stats(result_cache: PromptResultCacheDep):
+    """
+    hit rate of the prompt result cache, across every api process
+    """
+    if result_cache is None:
+        return {"enabled": False}
+    stats = await result_cache.stats()
+    if stats is None:
+        return {"enabled": True, "available": False}
+    return {"enabled": True, "available": True} | stats
+
+
+@tools_router.get("/circuit_breaker")
+async def circuit_breaker_state(circuit_breaker: CircuitBreakerDep):
+    """
+    state of the circuit breaker around the media generator model, shared by every worker
+    """
+    if circuit_breaker is None:
+        return {"enabled": False}
+    state = await circuit_breaker.state()
+    if state is None:
+        return {"enabled": True, "available": False}
+    return {"enabled": True, "available": True} | state.model_dump()
+
+
+@tools_router.get("/media_generation_stages")
+async def media_generation_stages(
+    db_session: AsyncSessionDep,
+    hours: Annotated[int, Query(ge=1, le=24 * 31)] = 24,
+) -> list[StageDurationsSummary]:
+    """
+    durations of the media generation stages over the last hours, across every worker
+    """
+    since = datetime.now(tz=timezone.utc) - timedelta(hours=hours)
+    return await StageDurationsRepository(db_session).summary(since)
+
+
+@tools_router.get("/media_queue", response_model=MediaQueueOut)
+async def media_queue_state(
+    media_repository: MediaRepositoryDep,
+    overdue_seconds: Annotated[int, Query(ge=0)] = 300,
+    stuck_seconds: Annotated[int, Query(ge=0)] = 900,
+    limit: Annotated[int, Query(ge=1, le=1000)] = 100,
+):
+    """
+    medias still to generate by status, with the oldest ones overdue for more than overdue_seconds and the oldest
+    ones processing for more than stuck_seconds
+    """
+    now = datetime.now(tz=timezone.utc)
+    return MediaQueueOut(
+        by_status=await media_repository.count_active_by_status(),
+        overdue=await media_repository.find_overdue(
+            now - timedelta(seconds=overdue_seconds), limit
+        ),
+        stuck=await media_repository.find_stuck(
+            now - timedelta(seconds=stuck_seconds), limit
+        ),
+    )
@@ -0,0 +1,82 @@
+"""
+Measures the database setup cost paid by every celery task.
+
+- per_task_engine: the previous behaviour, a new engine is created and disposed for every task
+- worker_pool: the engine is created once per worker process and every task checks out a pooled connection
+
+usage: python -m benchmarks.db_session_setup --iterations 200
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+from typing import Awaitable, Callable
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
+    async_sessionmaker,
+    create_async_engine,
+)
+
+from app.core.config import settings
+
+
+async def per_task_engine():
+    engine = create_async_engine(f"{settings.ASYNC_SQLALCHEMY_DATABASE_URI}")
+    try:
+        session_maker = async_sessionmaker(engine, expire_on_commit=False)
+        async with session_maker() as session:
+            await session.execute(text("select 1"))
+    finally:
+        await engine.dispose()
+
+
+def worker_pool_factory(engine: AsyncEngine) -> Callable[[], Awaitable[None]]:
+    session_maker = async_sessionmaker(engine, expire_on_commit=False)
+
+    async def worker_pool():
+        async with session_maker() as session:
+            await session.execute(text("select 1"))
+
+    return worker_pool
+
+
+async def measure(task: Callable[[], Awaitable[None]], iterations: int) -> list[float]:
+    await task()  # warm up
+    durations = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        await task()
+        durations.append((time.perf_counter() - start) * 1000)
+    return durations
+
+
+def report(name: str, durations: list[float]):
+    quantiles = statistics.quantiles(durations, n=100)
+    print(
+        f"{name:>16}: mean {statistics.mean(durations):7.2f} ms"
+        f" | p50 {quantiles[49]:7.2f} ms | p95 {quantiles[94]:7.2f} ms"
+        f" | {1000 / statistics.mean(durations):8.1f} tasks/s"
+    )
+
+
+async def main(iterations: int):
+    report("per_task_engine", await measure(per_task_engine, iterations))
+    engine = create_async_engine(
+        f"{settings.ASYNC_SQLALCHEMY_DATABASE_URI}",
+        pool_size=settings.WORKER_DB_POOL_SIZE,
+        max_overflow=settings.WORKER_DB_MAX_OVERFLOW,
+        pool_pre_ping=True,
+    )
+    try:
+        report("worker_pool", await measure(worker_pool_factory(engine), iterations))
+    finally:
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=200)
+    asyncio.run(main(parser.parse_args().iterations))
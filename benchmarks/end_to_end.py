@@ -0,0 +1,221 @@
+"""
+End-to-end load test: jobs are created through POST /media/generate, generated by a celery worker running the dummy
+model and followed through GET /media/status/{job_id} until they complete.
+
+The api runs in process, a worker is started for the run with the dummy model latency and error rate given on the
+command line. Prompts are unique, so the prompt result cache and single flight don't shortcut any generation.
+
+Reports requests/s of both endpoints, jobs/s and the p50/p95/p99 of the request latencies, of the end-to-end job
+latency and of its stages:
+- create: POST /media/generate
+- processing: media creation to completion, as recorded by the database
+- observed: completion to its observation by the status polling
+
+The results are written as json, to be diffed between releases.
+
+usage: python -m benchmarks.end_to_end --jobs 200 --concurrency 20 --model-delay 0.05 --output end_to_end.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import uuid
+from datetime import datetime, timezone
+
+import httpx
+
+from app.main import fastapi_app, lifespan
+from app.media.media_status import MediaStatus
+from app.tasks.celery import celery_app
+
+WORKER_NAME = f"benchmark-{uuid.uuid4().hex[:8]}"
+
+
+def percentiles(values: list[float]) -> dict[str, float | None]:
+    if len(values) < 2:
+        value = values[0] if values else None
+        return {"p50": value, "p95": value, "p99": value}
+    quantiles = statistics.quantiles(values, n=100, method="inclusive")
+    return {"p50": quantiles[49], "p95": quantiles[94], "p99": quantiles[98]}
+
+
+def requests_report(durations_ms: list[float], elapsed: float) -> dict:
+    return {
+        "count": len(durations_ms),
+        "per_second": len(durations_ms) / elapsed,
+        "latency_ms": percentiles(durations_ms),
+    }
+
+
+def start_worker(concurrency: int, model_delay: float, error_rate: float):
+    environment = os.environ | {
+        "DUMMY_MODEL_DELAY_SECONDS": str(model_delay),
+        "DUMMY_MODEL_ERROR_RATE": str(error_rate),
+    }
+    return subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "celery",
+            "-A",
+            "app.tasks.celery",
+            "worker",
+            "-l",
+            "WARNING",
+            "-n",
+            f"{WORKER_NAME}@%h",
+            "--concurrency",
+            str(concurrency),
+            "-Q",
+            "media_high,media_normal,media_low",
+        ],
+        env=environment,
+    )
+
+
+def wait_for_worker(timeout_seconds: float = 60):
+    deadline = time.monotonic() + timeout_seconds
+    while time.monotonic() < deadline:
+        replies = celery_app.control.ping(timeout=1)
+        if any(name.startswith(f"{WORKER_NAME}@") for r in replies for name in r):
+            return
+    raise TimeoutError("benchmark worker didn't start")
+
+
+class Run:
+    def __init__(self, client: httpx.AsyncClient, poll_interval_seconds: float):
+        self.client = client
+        self.poll_interval_seconds = poll_interval_seconds
+        self.generate_ms: list[float] = []
+        self.status_ms: list[float] = []
+        self.job_ms: list[float] = []
+        self.stages_ms: dict[str, list[float]] = {
+            "create": [],
+            "processing": [],
+            "observed": [],
+        }
+        self.statuses: dict[str, int] = {}
+
+    async def job(self, semaphore: asyncio.Semaphore, timeout_seconds: float):
+        async with semaphore:
+            start = time.perf_counter()
+            response = await self.client.post(
+                "/media/generate", json={"prompt": f"benchmark {uuid.uuid4()}"}
+            )
+            response.raise_for_status()
+            created = time.perf_counter()
+            self.generate_ms.append((created - start) * 1000)
+            self.stages_ms["create"].append((created - start) * 1000)
+            job_id = response.json()["job_id"]
+
+        deadline = created + timeout_seconds
+        while True:
+            await asyncio.sleep(self.poll_interval_seconds)
+            request_start = time.perf_counter()
+            response = await self.client.get(f"/media/status/{job_id}")
+            response.raise_for_status()
+            observed = time.perf_counter()
+            self.status_ms.append((observed - request_start) * 1000)
+            media = response.json()
+            if MediaStatus(media["status"]).is_terminal or observed > deadline:
+                break
+        self.statuses[media["status"]] = self.statuses.get(media["status"], 0) + 1
+        if media["status"] != MediaStatus.COMPLETED:
+            return
+        self.job_ms.append((observed - start) * 1000)
+        created_at = datetime.fromisoformat(media["created_at"])
+        completed_at = datetime.fromisoformat(media["updated_at"])
+        processing_ms = (completed_at - created_at).total_seconds() * 1000
+        self.stages_ms["processing"].append(processing_ms)
+        # the api and database clocks may differ slightly
+        observed_ms = max((observed - created) * 1000 - processing_ms, 0)
+        self.stages_ms["observed"].append(observed_ms)
+
+
+async def main(arguments: argparse.Namespace) -> dict:
+    async with lifespan(fastapi_app):
+        transport = httpx.ASGITransport(app=fastapi_app)
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://benchmark"
+        ) as client:
+            run = Run(client, arguments.poll_interval)
+            semaphore = asyncio.Semaphore(arguments.concurrency)
+            start = time.perf_counter()
+            await asyncio.gather(
+                *[run.job(semaphore, arguments.timeout) for _ in range(arguments.jobs)]
+            )
+            elapsed = time.perf_counter() - start
+    return {
+        "date": datetime.now(tz=timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "config": {
+            key: value for key, value in vars(arguments).items() if key != "output"
+        },
+        "elapsed_seconds": elapsed,
+        "requests": {
+            "generate": requests_report(run.generate_ms, elapsed),
+            "status": requests_report(run.status_ms, elapsed),
+        },
+        "jobs": {
+            "statuses": run.statuses,
+            "per_second": len(run.job_ms) / elapsed,
+            "latency_ms": percentiles(run.job_ms),
+            "stages_ms": {
+                stage: percentiles(durations)
+                for stage, durations in run.stages_ms.items()
+            },
+        },
+    }
+
+
+def report(results: dict):
+    for name, requests in results["requests"].items():
+        latency = requests["latency_ms"]
+        print(
+            f"{name:>10}: {requests['per_second']:7.1f} req/s"
+            f" | p50 {latency['p50']:7.2f} ms | p95 {latency['p95']:7.2f} ms"
+            f" | p99 {latency['p99']:7.2f} ms"
+        )
+    jobs = results["jobs"]
+    print(f"{'jobs':>10}: {jobs['per_second']:7.1f} jobs/s | {jobs['statuses']}")
+    stages = {"total": jobs["latency_ms"]} | jobs["stages_ms"]
+    for stage, latency in stages.items():
+        if latency["p50"] is None:
+            continue
+        print(
+            f"{stage:>10}: p50 {latency['p50']:8.2f} ms | p95 {latency['p95']:8.2f} ms"
+            f" | p99 {latency['p99']:8.2f} ms"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--jobs", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--worker-concurrency", type=int, default=4)
+    parser.add_argument("--model-delay", type=float, default=0.05)
+    parser.add_argument("--model-error-rate", type=float, default=0)
+    parser.add_argument("--poll-interval", type=float, default=0.05)
+    parser.add_argument("--timeout", type=float, default=120)
+    parser.add_argument("--output", default="end_to_end.json")
+    arguments = parser.parse_args()
+
+    worker = start_worker(
+        arguments.worker_concurrency, arguments.model_delay, arguments.model_error_rate
+    )
+    try:
+        wait_for_worker()
+        results = asyncio.run(main(arguments))
+    finally:
+        worker.terminate()
+        worker.wait()
+    report(results)
+    with open(arguments.output, "w") as file:
+        json.dump(results, file, indent=2)
+    print(f"results written to {arguments.output}")
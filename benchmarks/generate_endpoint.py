@@ -0,0 +1,101 @@
+"""
+Load test of the POST /media/generate job creation flow.
+
+- two_transactions: the previous flow, insert the media, publish the task, then update the media with the task id
+- single_transaction: the job id is chosen up front, the media is inserted with it and the task is published
+
+Tasks are published to a dedicated queue that is purged at the end, so no worker picks them up.
+
+usage: python -m benchmarks.generate_endpoint --requests 500 --concurrency 20
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+import uuid
+
+from sqlalchemy import text
+
+from app.core.database import setup_database, get_engine
+from app.media.media_repository import MediaRepository
+from app.tasks.celery import celery_app
+from app.tasks.celery_tasks import create_media
+
+BENCHMARK_QUEUE = "benchmark"
+
+
+async def two_transactions(media_repository: MediaRepository):
+    media = await media_repository.create_media(prompt="benchmark")
+    task = create_media.apply_async(
+        kwargs={"media_id": media.id}, queue=BENCHMARK_QUEUE
+    )
+    await media_repository.update_media_job_id(media.id, task.id)
+
+
+async def single_transaction(media_repository: MediaRepository):
+    media = await media_repository.create_media(prompt="benchmark", job_id=uuid.uuid4())
+    create_media.apply_async(
+        kwargs={"media_id": media.id},
+        task_id=str(media.job_id),
+        queue=BENCHMARK_QUEUE,
+    )
+
+
+async def database_stats() -> dict[str, int]:
+    statement = text(
+        "select xact_commit, tup_inserted, tup_updated from pg_stat_database"
+        " where datname = current_database()"
+    )
+    async with get_engine().connect() as connection:
+        row = (await connection.execute(statement)).one()
+    return row._asdict()
+
+
+async def measure(
+    flow, media_repository: MediaRepository, requests: int, concurrency: int
+):
+    semaphore = asyncio.Semaphore(concurrency)
+    durations = []
+
+    async def request():
+        async with semaphore:
+            start = time.perf_counter()
+            await flow(media_repository)
+            durations.append((time.perf_counter() - start) * 1000)
+
+    stats_before = await database_stats()
+    start = time.perf_counter()
+    await asyncio.gather(*[request() for _ in range(requests)])
+    elapsed = time.perf_counter() - start
+    # pg_stat_database is updated asynchronously by postgres
+    await asyncio.sleep(1)
+    stats_after = await database_stats()
+    quantiles = statistics.quantiles(durations, n=100)
+    print(
+        f"{flow.__name__:>18}: {requests / elapsed:7.1f} req/s"
+        f" | p50 {quantiles[49]:6.2f} ms | p95 {quantiles[94]:6.2f} ms"
+        + "".join(
+            f" | {key} {(stats_after[key] - stats_before[key]) / requests:4.2f}/req"
+            for key in stats_before
+        )
+    )
+
+
+async def main(requests: int, concurrency: int):
+    media_repository = MediaRepository(setup_database())
+    try:
+        for flow in [two_transactions, single_transaction]:
+            await measure(flow, media_repository, requests, concurrency)
+    finally:
+        await get_engine().dispose()
+        with celery_app.connection_for_write() as connection:
+            connection.default_channel.queue_purge(BENCHMARK_QUEUE)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=20)
+    arguments = parser.parse_args()
+    asyncio.run(main(arguments.requests, arguments.concurrency))
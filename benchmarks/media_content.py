@@ -0,0 +1,145 @@
+"""
+Throughput of the media content streamed through a single api worker by GET /media/content/{media_id}/raw, compared
+with the direct download of the same object from its presigned url.
+
+A media of --size-mb is stored once, then downloaded --downloads times at each concurrency. Reports MB/s and the peak
+resident memory of the worker, which stays flat whatever the media size as the content goes through fixed size
+buffers (MEDIA_CONTENT_CHUNK_SIZE).
+
+usage: python -m benchmarks.media_content --size-mb 64 --downloads 20 --concurrency 1 4 16
+"""
+
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import time
+import uuid
+from typing import AsyncIterator
+
+import httpx
+
+from app.core.database import get_engine, setup_database
+from app.media.media_repository import MediaRepository
+from app.media_generator.storage import close_storage, setup_storage
+
+MB = 1024 * 1024
+
+
+async def random_stream(size: int) -> AsyncIterator[bytes]:
+    # random bytes, so content addressed storage stores a new object
+    for offset in range(0, size, MB):
+        yield os.urandom(min(MB, size - offset))
+
+
+async def create_media(size: int) -> tuple[uuid.UUID, str]:
+    """
+    :return: the id and the presigned url of a completed media of size bytes
+    """
+    storage = await setup_storage()
+    try:
+        stored_media = await storage.save_bytes(random_stream(size))
+        media = await MediaRepository(setup_database()).create_completed_media(
+            "benchmark media content", uuid.uuid4(), stored_media
+        )
+        return media.id, str(await storage.create_media_url(stored_media.uri))
+    finally:
+        await close_storage()
+        await get_engine().dispose()
+
+
+def start_api(port: int) -> subprocess.Popen:
+    return subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "uvicorn",
+            "app.main:fastapi_app",
+            "--port",
+            str(port),
+            "--log-level",
+            "warning",
+        ]
+    )
+
+
+async def wait_for_api(base_url: str, timeout_seconds: float = 60):
+    deadline = time.monotonic() + timeout_seconds
+    async with httpx.AsyncClient(base_url=base_url) as client:
+        while time.monotonic() < deadline:
+            try:
+                if (await client.get("/tools/status")).status_code == 200:
+                    return
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(0.2)
+    raise TimeoutError("benchmark api didn't start")
+
+
+def peak_memory_mb(pid: int) -> float | None:
+    try:
+        with open(f"/proc/{pid}/status") as file:
+            for line in file:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+async def measure(url: str, size: int, downloads: int, concurrency: int) -> float:
+    """
+    :return: the MB/s downloaded
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(limits=limits, timeout=None) as client:
+
+        async def download():
+            async with semaphore, client.stream("GET", url) as response:
+                response.raise_for_status()
+                received = 0
+                async for chunk in response.aiter_raw():
+                    received += len(chunk)
+            if received != size:
+                raise ValueError(f"received {received} bytes instead of {size}")
+
+        start = time.perf_counter()
+        await asyncio.gather(*[download() for _ in range(downloads)])
+        elapsed = time.perf_counter() - start
+    return downloads * size / MB / elapsed
+
+
+async def main(arguments: argparse.Namespace, api: subprocess.Popen):
+    size = arguments.size_mb * MB
+    base_url = f"http://127.0.0.1:{arguments.port}"
+    media_id, presigned_url = await create_media(size)
+    await wait_for_api(base_url)
+    print(f"{'baseline':>10}: worker peak memory {peak_memory_mb(api.pid):7.1f} MB")
+    for concurrency in arguments.concurrency:
+        for name, url in [
+            ("direct", presigned_url),
+            ("proxied", f"{base_url}/media/content/{media_id}/raw"),
+        ]:
+            mb_per_second = await measure(url, size, arguments.downloads, concurrency)
+            print(
+                f"{name:>10}: concurrency {concurrency:3d} | {mb_per_second:8.1f} MB/s"
+                f" | worker peak memory {peak_memory_mb(api.pid):7.1f} MB"
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size-mb", type=int, default=64)
+    parser.add_argument("--downloads", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--port", type=int, default=8765)
+    arguments = parser.parse_args()
+
+    api = start_api(arguments.port)
+    try:
+        asyncio.run(main(arguments, api))
+    finally:
+        api.terminate()
+        api.wait()
@@ -0,0 +1,164 @@
+"""
+Insert throughput and query plans of the medias table with its indexes before and after the index audit.
+
+- before: the indexes of revision b446d06baed5, with ix_medias_id, ix_medias_job_id and ix_medias_created_at that
+  duplicate medias_pkey, job_id_unique and ix_medias_created_at_id
+- after: the indexes declared on Medias, with the partial indexes of the due retries and stuck generations
+
+Each configuration is built on a temporary medias table, which shadows the real one for this connection only.
+The inserts are measured on the empty table, then it's filled with --rows medias, mostly COMPLETED, and the plans of
+the key queries are run with explain analyze.
+
+usage: python -m benchmarks.medias_indexes --inserts 50000 --rows 500000
+"""
+
+import argparse
+import asyncio
+import time
+
+from sqlalchemy import text
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.ext.asyncio import AsyncConnection, create_async_engine
+from sqlalchemy.schema import CreateIndex
+
+from app.core.config import settings
+from app.media.db_media import Medias
+
+REMOVED_INDEXES = [
+    "CREATE INDEX ix_medias_id ON medias (id)",
+    "CREATE INDEX ix_medias_job_id ON medias (job_id)",
+    "CREATE INDEX ix_medias_created_at ON medias (created_at)",
+]
+ADDED_INDEXES = {"ix_medias_active_status_next_run", "ix_medias_processing_updated_at"}
+
+
+def configurations() -> dict[str, list[str]]:
+    dialect = postgresql.dialect()
+    indexes = {
+        index.name: str(CreateIndex(index).compile(dialect=dialect))
+        for index in Medias.__table__.indexes
+    }
+    before = [
+        statement for name, statement in indexes.items() if name not in ADDED_INDEXES
+    ]
+    return {"before": before + REMOVED_INDEXES, "after": list(indexes.values())}
+
+
+# status distribution of a table where most medias are done, rows are spread over the last 30 days.
+# the lateral subquery refers to the row, so its random draw isn't computed once for every row
+INSERT_STATEMENT = """
+INSERT INTO medias (id, job_id, prompt, status, priority, number_of_tries, celery_jobs, created_at, updated_at,
+                    next_run)
+SELECT gen_random_uuid(), gen_random_uuid(), 'benchmark prompt ' || i,
+       CASE WHEN draw < active_ratio / 2 THEN 'IN_QUEUE'
+            WHEN draw < active_ratio THEN 'PROCESSING'
+            WHEN draw < active_ratio + 0.05 THEN 'ERROR'
+            ELSE 'COMPLETED' END,
+       'NORMAL', 0, '{}', now() - random() * interval '30 days', now() - random() * interval '2 hours',
+       now() + (random() - 0.5) * interval '2 hours'
+FROM generate_series(1, :rows) AS i,
+     LATERAL (SELECT random() AS draw, CAST(:active_ratio AS float8) AS active_ratio, i AS row) AS draws
+"""
+
+QUERIES = {
+    "job_id lookup": "SELECT * FROM medias WHERE job_id = '{job_id}'",
+    "due retries": "SELECT * FROM medias WHERE status = 'IN_QUEUE' AND next_run < now() ORDER BY next_run LIMIT 100",
+    "stuck processing": (
+        "SELECT * FROM medias WHERE status = 'PROCESSING' AND updated_at < now() - interval '15 minutes'"
+        " ORDER BY updated_at LIMIT 100"
+    ),
+    "active counts": (
+        "SELECT status, count(*) FROM medias WHERE status IN ('IN_QUEUE', 'PROCESSING') GROUP BY status"
+    ),
+    "listing page": "SELECT * FROM medias ORDER BY created_at DESC, id DESC LIMIT 100",
+}
+
+
+async def create_table(connection: AsyncConnection, indexes: list[str]):
+    await connection.execute(text("DROP TABLE IF EXISTS pg_temp.medias"))
+    # temporary tables come first in the search path, so the statements of the model apply to this one
+    await connection.execute(
+        text("CREATE TEMPORARY TABLE medias (LIKE public.medias INCLUDING DEFAULTS)")
+    )
+    await connection.execute(
+        text(
+            "ALTER TABLE medias ADD CONSTRAINT medias_pkey PRIMARY KEY (id),"
+            " ADD CONSTRAINT job_id_unique UNIQUE (job_id)"
+        )
+    )
+    for statement in indexes:
+        await connection.execute(text(statement))
+
+
+async def insert(
+    connection: AsyncConnection, rows: int, batch_size: int, active_ratio: float
+) -> float:
+    """
+    :return: the rows inserted per second
+    """
+    start = time.perf_counter()
+    for offset in range(0, rows, batch_size):
+        await connection.execute(
+            text(INSERT_STATEMENT),
+            {"rows": min(batch_size, rows - offset), "active_ratio": active_ratio},
+        )
+    return rows / (time.perf_counter() - start)
+
+
+async def explain(connection: AsyncConnection, query: str) -> list[str]:
+    result = await connection.execute(
+        text(f"EXPLAIN (ANALYZE, BUFFERS, COSTS OFF) {query}")
+    )
+    return list(result.scalars())
+
+
+async def main(arguments: argparse.Namespace):
+    engine = create_async_engine(f"{settings.ASYNC_SQLALCHEMY_DATABASE_URI}")
+    try:
+        async with engine.connect() as connection:
+            # every batch of inserts is committed, and vacuum can't run in a transaction
+            await connection.execution_options(isolation_level="AUTOCOMMIT")
+            for name, indexes in configurations().items():
+                await create_table(connection, indexes)
+                rows_per_second = await insert(
+                    connection,
+                    arguments.inserts,
+                    arguments.batch_size,
+                    arguments.active_ratio,
+                )
+                print(
+                    f"{name:>6}: {len(indexes) + 2} indexes"
+                    f" | {rows_per_second:9.0f} inserted rows/s"
+                )
+                await insert(
+                    connection,
+                    max(arguments.rows - arguments.inserts, 0),
+                    arguments.batch_size,
+                    arguments.active_ratio,
+                )
+                # sets the visibility map as autovacuum would, for index only scans
+                await connection.execute(text("VACUUM ANALYZE medias"))
+                job_id = await connection.scalar(
+                    text("SELECT job_id FROM medias LIMIT 1")
+                )
+                for query_name, query in QUERIES.items():
+                    plan = await explain(connection, query.format(job_id=job_id))
+                    print(f"  {query_name}: {plan[-1].strip()}")
+                    if arguments.verbose:
+                        print("\n".join(f"    {line}" for line in plan[:-2]))
+                    else:
+                        scans = [line.strip() for line in plan if "Scan" in line]
+                        print("\n".join(f"    {scan}" for scan in scans))
+            await connection.execute(text("DROP TABLE IF EXISTS pg_temp.medias"))
+    finally:
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--inserts", type=int, default=50_000)
+    parser.add_argument("--rows", type=int, default=500_000)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--active-ratio", type=float, default=0.01)
+    parser.add_argument("--verbose", action="store_true", help="print the full plans")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,84 @@
+"""
+Publishing time of the create_media tasks of a POST /media/generate/batch request.
+
+- one_by_one: the previous publishing, every task is sent on the shared producer with its own round trip to redis
+- pipelined: publish_create_media_tasks, the tasks of the batch are sent with a single pipelined round trip
+
+Tasks are published to a dedicated queue that is purged after every batch, so no worker picks them up.
+
+usage: python -m benchmarks.publish_batch --batch-sizes 1 10 100 500 --repeats 20
+"""
+
+import argparse
+import statistics
+import time
+import uuid
+
+from app.media.media import Media
+from app.media.media_priority import MediaPriority
+from app.tasks import celery_tasks
+from app.tasks.celery import celery_app
+from app.tasks.celery_tasks import create_media, publish_create_media_tasks
+
+BENCHMARK_QUEUE = "benchmark"
+
+
+def one_by_one(medias: list[Media]):
+    with celery_app.producer_or_acquire() as producer:
+        for media in medias:
+            create_media.apply_async(
+                kwargs={"media_id": media.id},
+                task_id=str(media.job_id),
+                queue=BENCHMARK_QUEUE,
+                producer=producer,
+            )
+
+
+def pipelined(medias: list[Media]):
+    errors = publish_create_media_tasks(medias)
+    if errors:
+        raise next(iter(errors.values()))
+
+
+def measure(publish, batch_size: int, repeats: int) -> list[float]:
+    """
+    :return: the publishing durations of the batches, in ms
+    """
+    durations = []
+    with celery_app.connection_for_write() as connection:
+        for _ in range(repeats):
+            medias = [
+                Media.model_construct(
+                    id=uuid.uuid4(), job_id=uuid.uuid4(), priority=MediaPriority.NORMAL
+                )
+                for _ in range(batch_size)
+            ]
+            start = time.perf_counter()
+            publish(medias)
+            durations.append((time.perf_counter() - start) * 1000)
+            published = connection.default_channel.queue_purge(BENCHMARK_QUEUE)
+            if published != batch_size:
+                raise ValueError(f"{published} tasks published instead of {batch_size}")
+    return durations
+
+
+def main(arguments: argparse.Namespace):
+    # publish_create_media_tasks sends the tasks to the queue of the benchmark
+    celery_tasks.media_queue = lambda priority: BENCHMARK_QUEUE
+    # warms up the producer pool and the broker connection
+    measure(pipelined, 1, 1)
+    for batch_size in arguments.batch_sizes:
+        for publish in [one_by_one, pipelined]:
+            durations = measure(publish, batch_size, arguments.repeats)
+            print(
+                f"{publish.__name__:>10}: {batch_size:4d} medias"
+                f" | p50 {statistics.median(durations):8.2f} ms"
+                f" | {statistics.median(durations) * 1000 / batch_size:7.1f} us/media"
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 10, 100, 500])
+    parser.add_argument("--repeats", type=int, default=20)
+    main(parser.parse_args())
@@ -0,0 +1,71 @@
+"""
+Measures storage calls per second with a client opened per call vs the long-lived pooled client.
+
+usage: python -m benchmarks.s3_client --iterations 200 --concurrency 10
+"""
+
+import argparse
+import asyncio
+import os
+import time
+from typing import AsyncIterator
+
+from app.media_generator.storage import Storage, setup_storage, close_storage
+
+
+async def small_stream() -> AsyncIterator[bytes]:
+    # random bytes, so content addressed storage doesn't skip the upload
+    yield os.urandom(1024)
+
+
+async def measure(storage: Storage, iterations: int, concurrency: int) -> dict:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def call(operation):
+        async with semaphore:
+            await operation()
+
+    results = {}
+    for name, operation in [
+        ("save_bytes", lambda: storage.save_bytes(small_stream())),
+        (
+            "create_media_url",
+            lambda: storage.create_media_url(f"s3://{storage.bucket_name}/key.png"),
+        ),
+    ]:
+        start = time.perf_counter()
+        await asyncio.gather(*[call(operation) for _ in range(iterations)])
+        results[name] = iterations / (time.perf_counter() - start)
+    return results
+
+
+def report(name: str, results: dict):
+    print(
+        f"{name:>15}: "
+        + " | ".join(f"{key} {value:8.1f} calls/s" for key, value in results.items())
+    )
+
+
+async def main(iterations: int, concurrency: int):
+    storage = await setup_storage()
+    try:
+        pooled = await measure(storage, iterations, concurrency)
+        per_call_storage = Storage(
+            aio_session=storage.aio_session,
+            bucket_name=storage.bucket_name,
+            s3_url=storage.s3_url,
+        )
+        report(
+            "client_per_call", await measure(per_call_storage, iterations, concurrency)
+        )
+        report("pooled_client", pooled)
+    finally:
+        await close_storage()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=10)
+    arguments = parser.parse_args()
+    asyncio.run(main(arguments.iterations, arguments.concurrency))